@@ -0,0 +1,248 @@
+__author__ = "Stefan Mavrodiev"
+__copyright__ = "Copyright 2015, Olimex LTD"
+__credits__ = ["Stefan Mavrodiev"]
+__license__ = "GPL"
+__version__ = "2.0"
+__maintainer__ = __author__
+__email__ = "support@olimex.com"
+
+import mmap
+import os
+import struct
+import time
+import zlib
+
+import Errors
+import Finger
+import Mirror
+
+# Archive layout, all numbers little-endian:
+#   header  64 bytes, see _header
+#   index   count entries of page id, flags and CRC-32 of the record, sorted by page id
+#   records count templates of record_size bytes, in the order of the index
+MAGIC = b"FPARCHV1"
+VERSION = 1
+
+# magic, version, record size, count, system id, database size, security level,
+# packet size, baud rate, device address, creation time
+_header = struct.Struct("<8sHHIHHHHIIQ24x")
+_index_entry = struct.Struct("<HHI")
+
+
+class ArchiveWriter:
+
+    def __init__(self, file, pages, params=None):
+
+        """
+        Write archive record by record. The page ids must be known in advance.
+        Records go to file.tmp, which replaces the file only when the archive
+        is complete, so a failed export doesn't leave an archive behind.
+
+        :param file: Output file name
+        :param pages: Page ids of all records
+        :param params: Finger.SystemParameters stored in the header, or None
+        """
+        self.pages = sorted(pages)
+        self._slots = {page: slot for slot, page in enumerate(self.pages)}
+        self._written = set()
+        self._records = _header.size + _index_entry.size * len(self.pages)
+
+        self.file = file
+        self._temp = file + ".tmp"
+        self._file = open(self._temp, "w+b")
+        self._file.write(_header.pack(MAGIC, VERSION, Finger.TEMPLATE_SIZE, len(self.pages),
+                                      params.system_id if params else 0,
+                                      params.database_size if params else 0,
+                                      params.security_level if params else 0,
+                                      params.packet_size if params else 0,
+                                      params.baud_rate if params else 0,
+                                      params.device_address if params else 0,
+                                      int(time.time())))
+        self._file.truncate(self._records + Finger.TEMPLATE_SIZE * len(self.pages))
+
+    def add(self, page, data):
+        """
+        Write record and its index entry
+
+        :param page: Page id, one of the pages given to the constructor
+        :param data: Template bytes
+        """
+        if len(data) != Finger.TEMPLATE_SIZE:
+            raise ValueError("Invalid template size")
+
+        slot = self._slots[page]
+        self._file.seek(_header.size + _index_entry.size * slot)
+        self._file.write(_index_entry.pack(page, 0, zlib.crc32(data)))
+        self._file.seek(self._records + Finger.TEMPLATE_SIZE * slot)
+        self._file.write(data)
+        self._written.add(page)
+
+    def close(self):
+        """
+        Finish the archive
+        :raise ValueError: If not all records are written
+        """
+        if len(self._written) != len(self.pages):
+            self.discard()
+            raise ValueError("Archive is incomplete")
+
+        self._file.close()
+        os.replace(self._temp, self.file)
+
+    def discard(self):
+        """
+        Drop unfinished archive
+        """
+        if not self._file.closed:
+            self._file.close()
+            try:
+                os.remove(self._temp)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.discard()
+
+
+class Archive:
+
+    def __init__(self, file):
+
+        """
+        Memory-mapped read access to archive.
+        Records are returned as memoryview slices of the mapping without copying.
+
+        :param file: Archive file name
+        :raise ValueError: If the file is not a valid archive
+        """
+        with open(file, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+
+        (magic, version, self.record_size, count, system_id, database_size, security_level,
+         packet_size, baud_rate, device_address, self.created) = _header.unpack_from(self._view)
+
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError("Not a template archive")
+
+        self.params = Finger.SystemParameters(0, system_id, database_size, security_level, device_address,
+                                              packet_size, baud_rate)
+
+        self._records = _header.size + _index_entry.size * count
+        if len(self._view) < self._records + self.record_size * count:
+            self.close()
+            raise ValueError("Archive is truncated")
+
+        self._index = list(_index_entry.iter_unpack(self._view[_header.size:self._records]))
+        self._slots = {entry[0]: slot for slot, entry in enumerate(self._index)}
+
+        if any(previous[0] >= entry[0] for previous, entry in zip(self._index, self._index[1:])):
+            self.close()
+            raise ValueError("Archive index is damaged")
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def pages(self):
+        """
+        Get page ids of all records in ascending order
+        """
+        return [entry[0] for entry in self._index]
+
+    def record(self, page, verify=True):
+        """
+        Get record of page
+
+        :param page: Page id
+        :param verify: Check the CRC-32 of the record
+        :return: Memoryview of the template
+        :raise ValueError: If the checksum doesn't match
+        """
+        slot = self._slots[page]
+        start = self._records + self.record_size * slot
+        data = self._view[start:start + self.record_size]
+        if verify and zlib.crc32(data) != self._index[slot][2]:
+            raise ValueError("Checksum of page %d doesn't match" % page)
+        return data
+
+    def __iter__(self):
+        for page in self.pages:
+            yield page, self.record(page)
+
+    def close(self):
+        """
+        Release the mapping. If records returned earlier are still
+        referenced, the mapping is closed when they are garbage collected
+        """
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+            try:
+                self._map.close()
+            except BufferError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def export_database(session, file, buffer_id=1):
+    """
+    Stream all used pages of the sensor into archive
+
+    :param session: Session.Session of the sensor
+    :param file: Output file name
+    :param buffer_id: CharBuffer used for loading templates. Its content is lost
+    :return: Number of exported templates
+    :raise Errors.Error: If there is problem with the communication
+    """
+    session.parameters()
+
+    models = session.models
+    pages = Mirror.read_occupancy(session)
+
+    with ArchiveWriter(file, pages, session.params) as writer:
+        for page in writer.pages:
+            if models.load_model(buffer_id, page):
+                raise models.last_error
+            writer.add(page, models.read_model(buffer_id))
+        writer.close()
+
+    return len(pages)
+
+
+def import_database(session, file, buffer_id=1):
+    """
+    Store all records of archive on the sensor at their page ids
+
+    :param session: Session.Session of the sensor
+    :param file: Archive file name
+    :param buffer_id: CharBuffer used for transferring templates. Its content is lost
+    :return: Number of imported templates
+    :raise Errors.Error: If there is problem with the communication
+    :raise ValueError: If the archive is damaged
+    """
+    session.parameters()
+
+    models = session.models
+
+    with Archive(file) as archive:
+        if archive.record_size != Finger.TEMPLATE_SIZE:
+            raise ValueError("Unsupported record size")
+
+        for page, data in archive:
+            if page >= session.params.database_size:
+                raise Errors.StatusError("Page %d is beyond the database size" % page)
+            models.write_model(buffer_id, data)
+            if models.store_model(buffer_id, page):
+                raise models.last_error
+
+        return len(archive)
@@ -0,0 +1,418 @@
+__author__ = "Stefan Mavrodiev"
+__copyright__ = "Copyright 2015, Olimex LTD"
+__credits__ = ["Stefan Mavrodiev"]
+__license__ = "GPL"
+__version__ = "2.0"
+__maintainer__ = __author__
+__email__ = "support@olimex.com"
+
+import asyncio
+import collections
+import serial
+
+import Codec
+import Errors
+import Finger
+import StatusCodes
+
+
+class AsyncCommunication:
+
+    def __init__(self, port, device_address, baud_rate=57600, timeout=1.0):
+
+        """
+        Non-blocking communication driven by the asyncio event loop.
+        The port is watched with loop.add_reader, so no thread is needed per port.
+
+        :param port: Communication port or pyserial URL
+        :param device_address: Sensor address
+        :param baud_rate: Communication speed
+        :param timeout: Time in seconds to wait for every frame
+        """
+        self.ser = serial.serial_for_url(port, baudrate=baud_rate, timeout=0)
+        self.timeout = timeout
+
+        # Only one operation may use the half-duplex line at a time
+        self.lock = asyncio.Lock()
+
+        self._device_address = device_address
+        self._encoder = Codec.FrameEncoder(device_address)
+        self._decoder = Codec.FrameDecoder()
+
+        self._frames = collections.deque()
+        self._waiter = None
+        self._error = None
+        self._loop = None
+
+    @property
+    def device_address(self):
+        """
+        Get current address
+        """
+        return self._device_address
+
+    @device_address.setter
+    def device_address(self, new_address):
+        """
+        Set new address for the sensor
+        :raise: ValueError on invalid address
+        """
+        if new_address > 0xffffffff or new_address < 0:
+            raise ValueError("Invalid device address")
+        self._device_address = new_address
+        self._encoder.address = new_address
+
+    @property
+    def decoder(self):
+        """
+        Get the frame decoder with its statistics
+        """
+        return self._decoder
+
+    def _attach(self):
+        # Watch the port from the currently running loop
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._detach()
+            loop.add_reader(self.ser.fileno(), self._on_readable)
+            self._loop = loop
+        return loop
+
+    def _detach(self):
+        if self._loop is not None:
+            self._loop.remove_reader(self.ser.fileno())
+            self._loop = None
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def _on_readable(self):
+        try:
+            data = self.ser.read(max(1, self.ser.in_waiting))
+        except serial.SerialException as err:
+            self._error = Errors.ReadError(str(err))
+            self._detach()
+            self._wake()
+            return
+
+        self._decoder.feed(data)
+        self._frames.extend(self._decoder)
+        if self._frames:
+            self._wake()
+
+    def send_packet(self, packet, packet_type):
+
+        """
+        Send raw packet to sensor
+
+        :param packet: Bytes to send. Bytes-like object or list
+        :param packet_type: Packet identification
+        :raise Errors.WriteError: If there is problem with sending
+        """
+        frame = self._encoder.encode(packet_type, packet)
+        if self.ser.write(frame) != len(frame):
+            raise Errors.WriteError("Not all bytes send")
+
+    async def read_packet(self, packet_identification):
+
+        """
+        Wait for the next frame from the sensor
+
+        :param packet_identification: Expected packet identification
+        :return: Return only the data packet
+        :raise Errors.ReadError: If there is something wrong with the communication
+        """
+        loop = self._attach()
+        deadline = loop.time() + self.timeout
+
+        while not self._frames:
+            if self._error is not None:
+                raise self._error
+
+            self._waiter = loop.create_future()
+            try:
+                await asyncio.wait_for(self._waiter, deadline - loop.time())
+            except asyncio.TimeoutError:
+                raise Errors.ReadError("Zero bytes read. Check your sensor connection")
+            finally:
+                self._waiter = None
+
+        address, packet_type, data = self._frames.popleft()
+
+        # Check device address
+        if address != self._device_address:
+            raise Errors.ReadError("Device address doesn't match")
+
+        # Check identification
+        if packet_type != packet_identification:
+            raise Errors.ReadError("Packet identification doesn't match")
+
+        return data
+
+    async def transfer(self, packet):
+
+        """
+        Send command and wait for the acknowledge.
+        The caller must hold the lock.
+
+        :param packet: Command bytes
+        :return: Acknowledge data. The first byte is the confirmation code
+        """
+        self._attach()
+
+        # Leftovers of previous transfer can't belong to this command
+        self._frames.clear()
+        self._decoder.reset()
+
+        self.send_packet(packet, StatusCodes.PacketType.Command.value)
+        return await self.read_packet(StatusCodes.PacketType.Ack.value)
+
+    def close(self):
+        """
+        Stop watching and close the port
+        """
+        self._detach()
+        self.ser.close()
+
+
+class AsyncSensor:
+
+    def __init__(self, port, baud=57600, password=0x00000000, address=0xffffffff, timeout=1.0):
+
+        """
+        Asyncio API for the sensor. Unlike the Finger classes the methods
+        return the results and raise Errors.Error on failure.
+
+        :param port: Communication port or pyserial URL
+        :param baud: Communication speed
+        :param password: Sensor password
+        :param address: Sensor address
+        :param timeout: Time in seconds to wait for every frame
+        """
+        self.port = port
+        self.password = password
+        self.params = None
+        self.com = AsyncCommunication(port, address, baud_rate=baud, timeout=timeout)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Close the connection
+        """
+        self.com.close()
+
+    async def _command(self, packet):
+        # Send command and check the confirmation code
+        ret = await self.com.transfer(packet)
+        Finger.Finger.check_ok(ret[0])
+        return ret
+
+    async def _read_data(self, buffer):
+        # Read data packets following an acknowledge into buffer
+        count = len(buffer) // self.params.packet_size
+        offset = 0
+        for i in range(count):
+            if i != count - 1:
+                data = await self.com.read_packet(StatusCodes.PacketType.Data.value)
+            else:
+                data = await self.com.read_packet(StatusCodes.PacketType.EndData.value)
+
+            if offset + len(data) > len(buffer):
+                raise Errors.StatusError("Unexpected data length")
+            buffer[offset:offset + len(data)] = data
+            offset += len(data)
+
+        if offset != len(buffer):
+            raise Errors.StatusError("Incomplete data")
+        return buffer
+
+    async def _packet_size(self):
+        if self.params is None:
+            await self._read_system_params()
+        return self.params.packet_size
+
+    async def verify_password(self):
+        """
+        Verify password against sensor
+        :raise Errors.StatusError: If the password is wrong
+        """
+        async with self.com.lock:
+            await self._command([0x13] + Finger.Finger.u32_to_list(self.password))
+
+    async def set_password(self, password):
+        """
+        Change current device password
+        :param password: New password
+        """
+        async with self.com.lock:
+            await self._command([0x12] + Finger.Finger.u32_to_list(password))
+            self.password = password
+
+    async def set_address(self, address):
+        """
+        Change current device address
+        :param address: New address for the sensor
+        """
+        async with self.com.lock:
+            await self._command([0x15] + Finger.Finger.u32_to_list(address))
+            self.com.device_address = address
+
+    async def _read_system_params(self):
+        ret = await self._command([0x0f])
+        self.params = Finger.SystemParameters.from_response(ret)
+        return self.params
+
+    async def read_system_params(self):
+        """
+        Read current system parameters
+        :return: Finger.SystemParameters
+        """
+        async with self.com.lock:
+            return await self._read_system_params()
+
+    async def get_model_count(self):
+        """
+        Get number of stored models
+        :return: Models count
+        """
+        async with self.com.lock:
+            ret = await self._command([0x1d])
+            return ret[1] << 8 | ret[2]
+
+    async def get_storage_table(self, page):
+        """
+        Get usage bitmap of index page
+        :param page: Index page (0 to 3)
+        :return: 32 bytes, bit n of byte k is set when model page*256 + k*8 + n is used
+        """
+        async with self.com.lock:
+            ret = await self._command([0x1f, page])
+            return bytes(ret[1:33])
+
+    async def generate_model(self):
+        """
+        Take fingerprint image
+        :raise Errors.StatusError: If there is no finger or the image fails
+        """
+        async with self.com.lock:
+            await self._command([0x01])
+
+    async def generate_characteristics(self, buffer_id):
+        """
+        Generate characteristics from the image into CharBuffer
+        :param buffer_id: CharBuffer
+        """
+        async with self.com.lock:
+            await self._command([0x02, buffer_id])
+
+    async def register_model(self):
+        """
+        Combine CharBuffer1 and CharBuffer2 into model
+        """
+        async with self.com.lock:
+            await self._command([0x05])
+
+    async def match_model(self):
+        """
+        Compare CharBuffer1 and CharBuffer2
+        :return: Score
+        """
+        async with self.com.lock:
+            ret = await self._command([0x03])
+            return ret[1] << 8 | ret[2]
+
+    async def search_model(self, buffer_id, start_page, num_pages):
+        """
+        Search the database for the model in CharBuffer
+        :param buffer_id: CharBuffer
+        :param start_page: Start point in the database
+        :param num_pages: Number of elements to search
+        :return: Tuple (page, score)
+        """
+        packet = [0x04, buffer_id] + Finger.Finger.u16_to_list(start_page) + Finger.Finger.u16_to_list(num_pages)
+        async with self.com.lock:
+            ret = await self._command(packet)
+            return ret[1] << 8 | ret[2], ret[3] << 8 | ret[4]
+
+    async def store_model(self, buffer_id, page_id):
+        """
+        Store CharBuffer to page
+        :param buffer_id: CharBuffer
+        :param page_id: Location
+        """
+        async with self.com.lock:
+            await self._command([0x06, buffer_id] + Finger.Finger.u16_to_list(page_id))
+
+    async def load_model(self, buffer_id, page_id):
+        """
+        Load page into CharBuffer
+        :param buffer_id: CharBuffer
+        :param page_id: Location
+        """
+        async with self.com.lock:
+            await self._command([0x07, buffer_id] + Finger.Finger.u16_to_list(page_id))
+
+    async def delete_model(self, start_id, count):
+        """
+        Delete models
+        :param start_id: Start address
+        :param count: Number of models to remove
+        """
+        async with self.com.lock:
+            await self._command([0x0c] + Finger.Finger.u16_to_list(start_id) + Finger.Finger.u16_to_list(count))
+
+    async def empty_database(self):
+        """
+        Delete all stored models
+        """
+        async with self.com.lock:
+            await self._command([0x0d])
+
+    async def upload_model(self, buffer_id):
+        """
+        Transfer content of CharBuffer to the host
+        :param buffer_id: CharBuffer
+        :return: Template bytes
+        """
+        async with self.com.lock:
+            await self._packet_size()
+            await self._command([0x08, buffer_id])
+            return bytes(await self._read_data(bytearray(Finger.TEMPLATE_SIZE)))
+
+    async def download_model(self, buffer_id, data):
+        """
+        Transfer template to CharBuffer
+        :param buffer_id: CharBuffer
+        :param data: Template bytes
+        """
+        async with self.com.lock:
+            packet_size = await self._packet_size()
+            await self._command([0x09, buffer_id])
+
+            for offset in range(0, len(data), packet_size):
+                if offset + packet_size < len(data):
+                    packet_type = StatusCodes.PacketType.Data.value
+                else:
+                    packet_type = StatusCodes.PacketType.EndData.value
+                self.com.send_packet(data[offset:offset + packet_size], packet_type)
+
+    async def upload_image(self, buffer=None):
+        """
+        Transfer image from ImageBuffer
+        :param buffer: Writable buffer of Finger.IMAGE_SIZE bytes. None for new bytearray
+        :return: Memoryview of the packed image
+        """
+        if buffer is None:
+            buffer = bytearray(Finger.IMAGE_SIZE)
+        image = memoryview(buffer)[:Finger.IMAGE_SIZE]
+
+        async with self.com.lock:
+            await self._packet_size()
+            await self._command([0x0a])
+            return await self._read_data(image)
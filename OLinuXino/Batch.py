@@ -0,0 +1,151 @@
+__author__ = "Stefan Mavrodiev"
+__copyright__ = "Copyright 2015, Olimex LTD"
+__credits__ = ["Stefan Mavrodiev"]
+__license__ = "GPL"
+__version__ = "2.0"
+__maintainer__ = __author__
+__email__ = "support@olimex.com"
+
+import shlex
+import sys
+import time
+
+import Errors
+import Finger
+
+# Command name -> (operations, method, argument types, usage)
+# Operations are "system", "models" or "image" of Session.Session
+COMMANDS = {
+    "verify": ("system", "verify_password", (), "verify"),
+    "settings": ("system", "read_system_params", (), "settings"),
+    "generate": ("models", "generate_model", (), "generate"),
+    "chars": ("models", "generate_characteristics", (int,), "chars BUFFER"),
+    "register": ("models", "register_model", (), "register"),
+    "match": ("models", "match_model", (), "match"),
+    "search": ("models", "search_model", (int, int, int), "search BUFFER START COUNT"),
+    "store": ("models", "store_model", (int, int), "store BUFFER PAGE"),
+    "load": ("models", "load_model", (int, int), "load BUFFER PAGE"),
+    "delete": ("models", "delete_model", (int, int), "delete START COUNT"),
+    "empty": ("models", "empty_database", (), "empty"),
+    "count": ("models", "get_model_count", (), "count"),
+    "list": ("models", "get_storage_table", (int,), "list PAGE"),
+    "upload": ("models", "upload_model", (int, str), "upload BUFFER FILE"),
+    "download": ("models", "download_model", (int, str), "download BUFFER FILE"),
+    "image": ("image", "upload_image", (str, str), "image FILE FORMAT"),
+    "sleep": (None, None, (float,), "sleep SECONDS"),
+    "wait": (None, None, (float,), "wait SECONDS"),
+}
+
+
+class Step:
+
+    def __init__(self, line, name, args):
+
+        """
+        One command of a script
+
+        :param line: Line number in the script
+        :param name: Command name, key of COMMANDS
+        :param args: Converted arguments
+        """
+        self.line = line
+        self.name = name
+        self.args = args
+        self.ok = None
+        self.elapsed = 0.0
+
+    def __str__(self):
+        return " ".join([self.name] + [str(arg) for arg in self.args])
+
+
+def parse(lines):
+    """
+    Parse script. Every line holds one command with its arguments.
+    Empty lines and text after # are ignored.
+
+    :param lines: Iterable of script lines
+    :return: List of Step
+    :raise ValueError: On unknown command or wrong arguments, with the line number
+    """
+    steps = []
+    for number, line in enumerate(lines, 1):
+        words = shlex.split(line, comments=True)
+        if not words:
+            continue
+
+        name, words = words[0].lower(), words[1:]
+        if name not in COMMANDS:
+            raise ValueError("Line %d: unknown command '%s'" % (number, name))
+
+        types, usage = COMMANDS[name][2:]
+        if name == "image" and len(words) == 1:
+            words.append("bmp")
+        if len(words) != len(types):
+            raise ValueError("Line %d: usage: %s" % (number, usage))
+
+        try:
+            args = [convert(word) for convert, word in zip(types, words)]
+        except ValueError:
+            raise ValueError("Line %d: usage: %s" % (number, usage))
+
+        if name == "image" and args[1] not in Finger.IMAGE_FORMATS:
+            raise ValueError("Line %d: unknown image format '%s'" % (number, args[1]))
+
+        steps.append(Step(number, name, args))
+    return steps
+
+
+def execute(session, steps, keep_going=False, report=None):
+    """
+    Run steps one after another on the session
+
+    :param session: Session.Session of the sensor
+    :param steps: List of Step from parse
+    :param keep_going: Continue after failed step
+    :param report: Called as report(step) after every step, or None
+    :return: Number of failed steps
+    """
+    failed = 0
+    for step in steps:
+        operations, method = COMMANDS[step.name][:2]
+
+        start = time.perf_counter()
+        if step.name == "sleep":
+            time.sleep(step.args[0])
+            step.ok = True
+        elif step.name == "wait":
+            # Take image as soon as finger is placed. Imported here, so --batch starts without it
+            import Presence
+            try:
+                step.ok = Presence.FingerWatcher(session).wait(timeout=step.args[0]) is not None
+                if not step.ok:
+                    sys.stderr.write("No finger placed in %g s\n" % step.args[0])
+            except Errors.Error as err:
+                sys.stderr.write(err.msg + "\n")
+                step.ok = False
+        else:
+            try:
+                step.ok = getattr(getattr(session, operations), method)(*step.args) == 0
+            except OSError as err:
+                # File of upload, download or image
+                sys.stderr.write("%s\n" % err)
+                step.ok = False
+        step.elapsed = time.perf_counter() - start
+
+        if report is not None:
+            report(step)
+
+        if not step.ok:
+            failed += 1
+            if not keep_going:
+                break
+    return failed
+
+
+def format_step(step):
+    """
+    Format step status as one line
+    :param step: Executed Step
+    :return: Line of text
+    """
+    return "%4d  %-32s %-5s %9.2f ms" % (step.line, step, "OK" if step.ok else "ERROR", step.elapsed * 1000)
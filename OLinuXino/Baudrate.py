@@ -0,0 +1,109 @@
+__author__ = "Stefan Mavrodiev"
+__copyright__ = "Copyright 2015, Olimex LTD"
+__credits__ = ["Stefan Mavrodiev"]
+__license__ = "GPL"
+__version__ = "2.0"
+__maintainer__ = __author__
+__email__ = "support@olimex.com"
+
+import Errors
+import Finger
+import Retry
+
+# Speeds supported by the sensor, N * 9600 for N from 1 to 12
+BAUD_RATES = tuple(9600 * n for n in range(1, 13))
+
+# Most sensors run at one of these, so they are tried first
+_COMMON_RATES = (57600, 115200, 9600, 19200, 38400)
+
+# Time to wait for the acknowledge of one probe in seconds
+PROBE_TIMEOUT = 0.1
+
+
+def _answers(session, timeout):
+    # Any valid acknowledge means the sensor understood the command,
+    # even if the password is wrong
+    com = session.com
+    saved, com.ser.timeout = com.ser.timeout, timeout
+    policy, com.retry = com.retry, Retry.NEVER
+    try:
+        com.transfer([0x13] + Finger.Finger.u32_to_list(session.password))
+        return True
+    except Errors.Error:
+        return False
+    finally:
+        com.ser.timeout = saved
+        com.retry = policy
+
+
+def probe(session, rates=BAUD_RATES, timeout=PROBE_TIMEOUT):
+    """
+    Find the speed the sensor is listening at.
+    The current port speed is tried first, then the common speeds and the rest.
+    The port is left at the found speed.
+
+    :param session: Session.Session of the sensor
+    :param rates: Speeds to try
+    :param timeout: Time to wait for every answer in seconds
+    :return: Found speed or None. The port is restored if nothing answers
+    """
+    current = session.com.baud_rate
+    order = [current] + [rate for rate in _COMMON_RATES if rate in rates] + list(rates)
+
+    tried = set()
+    for rate in order:
+        if rate in tried:
+            continue
+        tried.add(rate)
+
+        session.com.baud_rate = rate
+        if _answers(session, timeout):
+            return rate
+
+    session.com.baud_rate = current
+    return None
+
+
+def negotiate(session, maximum=BAUD_RATES[-1], checks=3, timeout=PROBE_TIMEOUT):
+    """
+    Find the current speed and switch the sensor and the port to the highest
+    speed that passes password verification. If a speed fails, the next
+    lower one is tried.
+
+    :param session: Session.Session of the sensor
+    :param maximum: Highest speed to use
+    :param checks: Password verifications needed to accept speed
+    :param timeout: Time to wait for every answer while probing in seconds
+    :return: Speed in use
+    :raise Errors.ReadError: If the sensor doesn't answer at any speed
+    :raise Errors.StatusError: If the password is wrong
+    """
+    current = probe(session, timeout=timeout)
+    if current is None:
+        raise Errors.ReadError("Sensor doesn't answer at any speed")
+
+    original = current
+    for rate in reversed([rate for rate in BAUD_RATES if original < rate <= maximum]):
+        if session.system.set_baudrate(rate):
+            # The sensor rejected the speed and still runs at the old one
+            session.com.baud_rate = current
+            continue
+
+        if all(_answers(session, timeout) for _ in range(checks)):
+            current = rate
+            break
+
+        # Find where the sensor ended up and try lower speed from there
+        current = probe(session, timeout=timeout)
+        if current is None:
+            raise Errors.ReadError("Sensor lost while changing speed")
+
+        if current == original:
+            # The sensor applies the speed only after restart. Keep the stored one
+            if session.system.set_baudrate(original):
+                raise session.system.last_error
+            break
+
+    if session.system.verify_password():
+        raise session.system.last_error
+    return current
@@ -0,0 +1,519 @@
+__author__ = "Stefan Mavrodiev"
+__copyright__ = "Copyright 2015, Olimex LTD"
+__credits__ = ["Stefan Mavrodiev"]
+__license__ = "GPL"
+__version__ = "2.0"
+__maintainer__ = __author__
+__email__ = "support@olimex.com"
+
+import argparse
+import contextlib
+import io
+import math
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+import Codec
+import Session
+
+
+class CountingSerial:
+
+    def __init__(self, ser):
+
+        """
+        Wrapper around serial port counting the transferred bytes
+
+        :param ser: Serial port instance
+        """
+        self._ser = ser
+        self.bytes_written = 0
+        self.bytes_read = 0
+
+    def write(self, data):
+        count = self._ser.write(data)
+        self.bytes_written += count
+        return count
+
+    def read(self, size=1):
+        data = self._ser.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    @property
+    def timeout(self):
+        return self._ser.timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        # Communication.drain shortens the timeout of the real port
+        self._ser.timeout = value
+
+    def __getattr__(self, name):
+        return getattr(self._ser, name)
+
+
+class Result:
+
+    def __init__(self, name):
+
+        """
+        Collected measurements of one operation
+
+        :param name: Operation name
+        """
+        self.name = name
+        self.latencies = []
+        self.cpu = []
+        self.wire_bytes = []
+        self.errors = 0
+
+    def add(self, latency, cpu, wire_bytes):
+        self.latencies.append(latency)
+        self.cpu.append(cpu)
+        self.wire_bytes.append(wire_bytes)
+
+    def percentile(self, q):
+        """
+        Get latency percentile using nearest rank
+        :param q: Percentile (0 to 100)
+        :return: Latency in seconds
+        """
+        values = sorted(self.latencies)
+        if not values:
+            return 0
+        return values[max(0, math.ceil(q / 100 * len(values)) - 1)]
+
+
+def percentile_table(results, baud_rate):
+    """
+    Format results as text table
+
+    :param results: List of Result
+    :param baud_rate: Configured line speed
+    :return: Table as string
+    """
+    line_rate = baud_rate / 10
+    lines = ["%-26s %5s %10s %10s %9s %10s %6s %10s %10s" % (
+        "operation", "n", "p50 ms", "p99 ms", "bytes/op", "bytes/s", "line%", "wire ms", "cpu ms/op")]
+
+    for result in results:
+        if not result.latencies:
+            lines.append("%-26s %5d %s" % (result.name, 0, "failed (%d errors)" % result.errors))
+            continue
+
+        count = len(result.latencies)
+        total_time = sum(result.latencies)
+        wire_bytes = sum(result.wire_bytes) / count
+        rate = sum(result.wire_bytes) / total_time if total_time else 0
+
+        lines.append("%-26s %5d %10.2f %10.2f %9d %10.0f %6.1f %10.2f %10.2f" % (
+            result.name,
+            count,
+            result.percentile(50) * 1000,
+            result.percentile(99) * 1000,
+            wire_bytes,
+            rate,
+            rate / line_rate * 100,
+            wire_bytes / line_rate * 1000,
+            sum(result.cpu) / count * 1000))
+
+    lines.append("Line rate: %d bytes/s at %d bps" % (line_rate, baud_rate))
+    return "\n".join(lines)
+
+
+class Benchmark:
+
+    def __init__(self, port, baud=57600, password=0x00000000, address=0xffffffff, low_latency=False):
+
+        """
+        Time every Finger operation against real or simulated sensor
+
+        :param port: Communication port
+        :param baud: Communication speed
+        :param password: Sensor password
+        :param address: Sensor address
+        :param low_latency: Use low latency transfer mode
+        """
+        self.baud = baud
+        self.session = Session.Session(port, baud=baud, password=password, address=address,
+                                       low_latency=low_latency)
+        self.system = self.session.system
+        self.models = self.session.models
+        self.image = self.session.image
+
+        self._counter = CountingSerial(self.session.com.ser)
+        self.session.com.ser = self._counter
+
+        self._directory = tempfile.mkdtemp(prefix="fingerprint-bench-")
+        self._model_file = os.path.join(self._directory, "model.bin")
+        self._image_file = os.path.join(self._directory, "image")
+
+    def close(self):
+        """
+        Close the ports and remove the temporary files
+        """
+        self.session.close()
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+    def _wire_bytes(self):
+        return self._counter.bytes_written + self._counter.bytes_read
+
+    def operations(self):
+        """
+        Get list of operations in execution order.
+        Later operations depend on the state created by the earlier ones.
+
+        :return: List of (name, function) tuples
+        """
+        return [
+            ("verify_password", self.system.verify_password),
+            ("read_system_params", self.system.read_system_params),
+            ("generate_model", self.models.generate_model),
+            ("generate_characteristics", lambda: self.models.generate_characteristics(1)),
+            ("search_model", lambda: self.models.search_model(1, 0, 1000)),
+            ("upload_model", lambda: self.models.upload_model(1, self._model_file)),
+            ("download_model", lambda: self.models.download_model(2, self._model_file)),
+            ("upload_image", lambda: self.image.upload_image(self._image_file)),
+        ]
+
+    def run(self, repeat=10, names=None):
+        """
+        Run the benchmark
+
+        :param repeat: Number of runs for each operation
+        :param names: Operation names to time. None for all
+        :return: List of Result
+        """
+        # Transfer sizes depend on the sensor parameters
+        with contextlib.redirect_stderr(io.StringIO()):
+            self.system.verify_password()
+            self.system.read_system_params()
+
+        results = []
+        for name, function in self.operations():
+            result = Result(name)
+            results.append(result)
+            count = repeat if names is None or name in names else 1
+
+            for i in range(count):
+                wire_bytes = self._wire_bytes()
+                cpu = time.thread_time()
+                start = time.perf_counter()
+
+                with contextlib.redirect_stderr(io.StringIO()):
+                    ret = function()
+
+                latency = time.perf_counter() - start
+                cpu = time.thread_time() - cpu
+
+                if ret:
+                    result.errors += 1
+                elif names is None or name in names:
+                    result.add(latency, cpu, self._wire_bytes() - wire_bytes)
+
+        return [result for result in results if names is None or result.name in names]
+
+
+def _legacy_encode(address, packet, packet_type):
+    # Frame encoder used before Codec, kept as reference for the codec benchmark
+    string = b""
+    buffer = [0xEF, 0x01]
+    buffer += [(address >> 24 & 0xFF), (address >> 16 & 0xFF), (address >> 8 & 0xFF), (address >> 0 & 0xFF)]
+    buffer += [packet_type]
+    packet_len = len(packet)
+    buffer += [packet_len + 2 >> 8, packet_len + 2 & 0xFF]
+    buffer += packet
+    summary = (packet_len + 2 >> 8) + (packet_len + 2 & 0xFF) + packet_type
+    for i in packet:
+        summary += i
+    summary &= 0xFFFF
+    buffer += [(summary >> 8 & 0xFF), summary & 0xFF]
+    for i in buffer:
+        string += struct.pack("B", i)
+    return string
+
+
+def _legacy_decode(address, response, packet_identification):
+    # Frame decoder used before Codec, kept as reference for the codec benchmark
+    if response[0] != 0xEF or response[1] != 0x01:
+        raise ValueError
+    if response[2] != (address >> 24 & 0xFF) or response[3] != (address >> 16 & 0xFF) or \
+            response[4] != (address >> 8 & 0xFF) or response[5] != (address >> 0 & 0xFF):
+        raise ValueError
+    if response[6] != packet_identification:
+        raise ValueError
+    checksum = response[6]
+    for i in response[7:-2]:
+        checksum += i
+    if (checksum & 0xFFFF) != (response[-2] << 8 | response[-1]):
+        raise ValueError
+    ret = []
+    for i in response[9:9 + (response[7] << 8 | response[8]) - 2]:
+        ret.append(i)
+    return ret
+
+
+def codec_benchmark(count=2000, packet_size=128, address=0xffffffff):
+    """
+    Measure frame encoding and decoding speed of the legacy code and Codec
+
+    :param count: Number of frames for each measurement
+    :param packet_size: Data bytes in a frame
+    :param address: Device address
+    :return: Table as string
+    """
+    data = bytes(range(256)) * (packet_size // 256 + 1)
+    data = data[:packet_size]
+    data_list = list(data)
+    packet_type = 0x02
+
+    encoder = Codec.FrameEncoder(address)
+    frame = bytes(encoder.encode(packet_type, data))
+
+    def rate(function):
+        start = time.perf_counter()
+        for i in range(count):
+            function()
+        return count / (time.perf_counter() - start)
+
+    # Frame by frame, as the acknowledges of single commands arrive
+    single = Codec.FrameDecoder()
+
+    def decode_one():
+        single.feed(frame)
+        return single.next_frame()
+
+    # Streaming decoder gets all frames of a transfer at once
+    stream = frame * count
+    decoder = Codec.FrameDecoder()
+
+    def stream_rate():
+        start = time.perf_counter()
+        decoder.feed(stream)
+        for _ in decoder:
+            pass
+        return count / (time.perf_counter() - start)
+
+    measurements = [
+        ("encode", rate(lambda: _legacy_encode(address, data_list, packet_type)),
+         rate(lambda: encoder.encode(packet_type, data))),
+        ("decode", rate(lambda: _legacy_decode(address, frame, packet_type)),
+         rate(decode_one)),
+        ("stream", rate(lambda: _legacy_decode(address, frame, packet_type)), stream_rate()),
+    ]
+
+    lines = ["%-10s %14s %14s %8s" % ("%d bytes" % packet_size, "before frames/s", "after frames/s", "speedup")]
+    for name, before, after in measurements:
+        lines.append("%-10s %14.0f %14.0f %7.1fx" % (name, before, after, after / before))
+    return "\n".join(lines)
+
+
+def turnaround_benchmark(port, baud=57600, password=0x00000000, address=0xffffffff, count=100):
+    """
+    Compare short commands per second in normal and low latency transfer mode
+
+    :param port: Communication port
+    :param baud: Communication speed
+    :param password: Sensor password
+    :param address: Sensor address
+    :param count: Number of commands for each measurement
+    :return: Table as string
+    """
+    lines = ["%-16s %-12s %12s %12s %12s" % ("command", "mode", "commands/s", "p50 ms", "p99 ms")]
+
+    for low_latency in (False, True):
+        session = Session.Session(port, baud=baud, password=password, address=address, low_latency=low_latency)
+
+        for name, function in (("verify_password", session.system.verify_password),
+                               ("get_model_count", session.models.get_model_count)):
+            result = Result(name)
+            start = time.perf_counter()
+            with contextlib.redirect_stderr(io.StringIO()):
+                for i in range(count):
+                    begin = time.perf_counter()
+                    if function():
+                        result.errors += 1
+                    else:
+                        result.add(time.perf_counter() - begin, 0, 0)
+            elapsed = time.perf_counter() - start
+
+            lines.append("%-16s %-12s %12.1f %12.2f %12.2f" % (
+                name, "low latency" if low_latency else "normal", len(result.latencies) / elapsed,
+                result.percentile(50) * 1000, result.percentile(99) * 1000))
+
+        session.close()
+
+    return "\n".join(lines)
+
+
+def cold_start_benchmark(port, baud=57600, password=0x00000000, address=0xffffffff, repeat=10,
+                         command=("--models-count",)):
+    """
+    Run main.py in new interpreter repeatedly and collect its --timing phases.
+    The first run warms the file cache and the bytecode cache and isn't counted.
+
+    :param port: Communication port
+    :param baud: Communication speed
+    :param password: Sensor password
+    :param address: Sensor address
+    :param repeat: Number of runs
+    :param command: Arguments selecting the main.py operation
+    :return: Table as string
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    arguments = [sys.executable, script, "-p", port, "--baudrate", str(baud), "--password", "%08x" % password,
+                 "--address", "%08x" % address, "--timing"] + list(command)
+
+    results = {}
+    for i in range(repeat + 1):
+        start = time.perf_counter()
+        process = subprocess.run([sys.executable, "-c", "pass"])
+        interpreter = time.perf_counter() - start
+
+        start = time.perf_counter()
+        process = subprocess.run(arguments, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                 universal_newlines=True)
+        elapsed = time.perf_counter() - start
+        if not i:
+            continue
+
+        result = results.setdefault("bare interpreter", Result("bare interpreter"))
+        result.add(interpreter, 0, 0)
+        result = results.setdefault("wall", Result("wall"))
+        if process.returncode:
+            result.errors += 1
+            continue
+        result.add(elapsed, 0, 0)
+
+        for line in process.stderr.splitlines():
+            fields = line.split()
+            if len(fields) >= 3 and fields[0] == "timing":
+                phase = " ".join(fields[1:-2])
+                results.setdefault(phase, Result(phase)).add(float(fields[-2]) / 1000, 0, 0)
+
+    lines = ["%-18s %5s %10s %10s" % ("phase", "n", "p50 ms", "p90 ms")]
+    for result in results.values():
+        lines.append("%-18s %5d %10.2f %10.2f" % (
+            result.name, len(result.latencies), result.percentile(50) * 1000, result.percentile(90) * 1000))
+    lines.append("Command: main.py %s" % " ".join(command))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Olimex finger sensor benchmark",
+                                     prog="FingerPrint-benchmark")
+
+    parser.add_argument("-p", "--port",
+                        action="store",
+                        help="Communication port or pyserial URL to use")
+    parser.add_argument("--codec",
+                        action="store_true",
+                        help="Run frame codec micro-benchmark only")
+    parser.add_argument("--turnaround",
+                        action="store_true",
+                        help="Compare commands/s in normal and low latency transfer mode")
+    parser.add_argument("--cold-start",
+                        action="store_true",
+                        help="Time main.py --models-count from interpreter start, once per repeat")
+    parser.add_argument("--low-latency",
+                        action="store_true",
+                        help="Use low latency transfer mode")
+    parser.add_argument("--simulate",
+                        action="store_true",
+                        help="Run against the virtual sensor from Simulator.py")
+    parser.add_argument("--baudrate",
+                        action="store",
+                        type=int,
+                        default=57600,
+                        help="Communication speed. Default: 57600")
+    parser.add_argument("--repeat",
+                        action="store",
+                        type=int,
+                        default=10,
+                        help="Number of runs for each operation. Default: 10")
+    parser.add_argument("--only",
+                        action="store",
+                        nargs="+",
+                        metavar="OPERATION",
+                        help="Time only these operations")
+    parser.add_argument("--packet",
+                        action="store",
+                        type=int,
+                        choices=[32, 64, 128, 256],
+                        default=128,
+                        help="Simulated data packet length. Default: 128")
+    parser.add_argument("--latency-scale",
+                        action="store",
+                        type=float,
+                        default=1.0,
+                        help="Simulated processing time multiplier. Default: 1.0")
+    parser.add_argument("--no-wire-delay",
+                        action="store_true",
+                        help="Do not simulate wire time, leaving only host overhead")
+    parser.add_argument("--password",
+                        action="store",
+                        type=lambda value: int(value, 16),
+                        default=0x00000000,
+                        help="Sensor password. Default: 0x00000000")
+    parser.add_argument("--address",
+                        action="store",
+                        type=lambda value: int(value, 16),
+                        default=0xFFFFFFFF,
+                        help="Sensor address. Default: 0xffffffff")
+
+    args = parser.parse_args()
+
+    if args.codec:
+        for packet_size in (32, 64, 128, 256):
+            print(codec_benchmark(packet_size=packet_size))
+        return 0
+
+    if args.port is None and not args.simulate:
+        parser.error("either --port or --simulate is required")
+
+    with contextlib.ExitStack() as stack:
+        port = args.port
+        if args.simulate:
+            import Simulator
+
+            sensor = Simulator.VirtualSensor(address=args.address,
+                                             password=args.password,
+                                             packet_size=args.packet,
+                                             baud_rate=args.baudrate,
+                                             latency_scale=args.latency_scale,
+                                             wire_delay=not args.no_wire_delay)
+            for page in range(100):
+                sensor.enroll(page, page + 2)
+            sensor.enroll(100, 1)
+
+            port = stack.enter_context(Simulator.PtyServer(sensor)).url
+
+        if args.cold_start:
+            print(cold_start_benchmark(port, baud=args.baudrate, password=args.password, address=args.address,
+                                       repeat=args.repeat))
+            return 0
+
+        if args.turnaround:
+            print(turnaround_benchmark(port, baud=args.baudrate, password=args.password, address=args.address,
+                                       count=args.repeat))
+            return 0
+
+        benchmark = Benchmark(port, baud=args.baudrate, password=args.password, address=args.address,
+                              low_latency=args.low_latency)
+        try:
+            results = benchmark.run(repeat=args.repeat, names=args.only)
+        finally:
+            benchmark.close()
+
+    print(percentile_table(results, args.baudrate))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,320 @@
+__author__ = "Stefan Mavrodiev"
+__copyright__ = "Copyright 2015, Olimex LTD"
+__credits__ = ["Stefan Mavrodiev"]
+__license__ = "GPL"
+__version__ = "2.0"
+__maintainer__ = __author__
+__email__ = "support@olimex.com"
+
+import argparse
+import collections
+import struct
+import sys
+import threading
+import time
+
+import Codec
+import Errors
+import Metrics
+import Session
+
+# Capture layout, all numbers little-endian:
+#   header  magic, version, baud rate, sensor address, start time
+#   records time since start in microseconds, direction, length, followed by the bytes
+MAGIC = b"FPCAPV1\n"
+VERSION = 1
+
+WRITE = 0
+READ = 1
+
+_header = struct.Struct("<8sHIId")
+_record = struct.Struct("<QBI")
+
+
+def read_capture(file):
+    """
+    Load capture file
+
+    :param file: Capture file name
+    :return: Tuple (header dictionary, list of (time in seconds, direction, bytes))
+    :raise ValueError: If the file is not a capture
+    """
+    with open(file, "rb") as f:
+        data = f.read()
+
+    if len(data) < _header.size:
+        raise ValueError("Not a capture file")
+    magic, version, baud_rate, address, started = _header.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a capture file")
+
+    records = []
+    offset = _header.size
+    while offset + _record.size <= len(data):
+        timestamp, direction, length = _record.unpack_from(data, offset)
+        offset += _record.size
+        if offset + length > len(data):
+            # Recording interrupted in the middle of a record
+            break
+        records.append((timestamp / 1e6, direction, data[offset:offset + length]))
+        offset += length
+
+    return {"baud_rate": baud_rate, "address": address, "started": started}, records
+
+
+class RecordingSerial:
+
+    def __init__(self, ser, file, address=0xffffffff):
+
+        """
+        Wrapper around serial port writing every transferred byte to capture file
+
+        :param ser: Serial port instance
+        :param file: Capture file name
+        :param address: Sensor address stored in the header
+        """
+        self._ser = ser
+        self._file = open(file, "wb")
+        self._file.write(_header.pack(MAGIC, VERSION, int(ser.baudrate), address, time.time()))
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _record(self, direction, data):
+        with self._lock:
+            elapsed = int((time.perf_counter() - self._start) * 1e6)
+            self._file.write(_record.pack(elapsed, direction, len(data)))
+            self._file.write(data)
+
+    def write(self, data):
+        count = self._ser.write(data)
+        self._record(WRITE, bytes(data[:count]))
+        return count
+
+    def read(self, size=1):
+        data = self._ser.read(size)
+        if data:
+            self._record(READ, data)
+        return data
+
+    @property
+    def baudrate(self):
+        return self._ser.baudrate
+
+    @baudrate.setter
+    def baudrate(self, value):
+        self._ser.baudrate = value
+
+    @property
+    def timeout(self):
+        return self._ser.timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        self._ser.timeout = value
+
+    def close(self):
+        self._file.close()
+        self._ser.close()
+
+    def __getattr__(self, name):
+        return getattr(self._ser, name)
+
+
+class ReplaySerial:
+
+    def __init__(self, file, speed=1.0, strict=True):
+
+        """
+        Serial port answering with recorded traffic.
+        Every write is matched with the next recorded write, and the bytes
+        read after it in the recording become readable at the recorded
+        delays divided by speed.
+
+        :param file: Capture file name
+        :param speed: Replay speed factor. 0 delivers the answers at once
+        :param strict: Raise Errors.WriteError if the written bytes differ from the recording
+        """
+        self.header, records = read_capture(file)
+        self.speed = speed
+        self.strict = strict
+        self.baudrate = self.header["baud_rate"]
+        self.timeout = 1
+        self.mismatches = 0
+
+        # Recorded writes, each with the reads that followed it as (delay, bytes)
+        self._exchanges = collections.deque()
+        for timestamp, direction, data in records:
+            if direction == WRITE:
+                self._exchanges.append((timestamp, data, []))
+            elif self._exchanges:
+                sent = self._exchanges[-1][0]
+                self._exchanges[-1][2].append((timestamp - sent, data))
+
+        self._input = bytearray()
+        self._scheduled = collections.deque()
+        self._written = bytearray()
+        self.is_open = True
+
+    def _deliver(self):
+        now = time.perf_counter()
+        while self._scheduled and self._scheduled[0][0] <= now:
+            self._input += self._scheduled.popleft()[1]
+
+    def write(self, data):
+        self._written += data
+
+        # Host may write a frame in several calls. Answer when a whole recorded write is matched
+        while self._exchanges:
+            _, expected, answers = self._exchanges[0]
+            if len(self._written) < len(expected):
+                if self.strict and bytes(self._written) != expected[:len(self._written)]:
+                    raise Errors.WriteError("Command differs from the recording")
+                break
+
+            if bytes(self._written[:len(expected)]) != expected:
+                self.mismatches += 1
+                if self.strict:
+                    raise Errors.WriteError("Command differs from the recording")
+
+            del self._written[:len(expected)]
+            self._exchanges.popleft()
+
+            now = time.perf_counter()
+            for delay, answer in answers:
+                self._scheduled.append((now + (delay / self.speed if self.speed else 0), answer))
+
+        return len(data)
+
+    def read(self, size=1):
+        # Timeout None blocks like pyserial until enough bytes arrive
+        deadline = float("inf") if self.timeout is None else time.perf_counter() + self.timeout
+        while True:
+            self._deliver()
+            if len(self._input) >= size or not self._scheduled:
+                break
+
+            wait = min(self._scheduled[0][0], deadline) - time.perf_counter()
+            if wait <= 0 and self._scheduled[0][0] > deadline:
+                break
+            if wait > 0:
+                time.sleep(wait)
+
+        data = bytes(self._input[:size])
+        del self._input[:size]
+        return data
+
+    @property
+    def in_waiting(self):
+        self._deliver()
+        return len(self._input)
+
+    def reset_input_buffer(self):
+        self._deliver()
+        self._input.clear()
+
+    def reset_output_buffer(self):
+        pass
+
+    def flush(self):
+        pass
+
+    flushInput = reset_input_buffer
+    flushOutput = reset_output_buffer
+
+    @property
+    def remaining(self):
+        """
+        Get number of recorded writes not replayed yet
+        """
+        return len(self._exchanges)
+
+    def close(self):
+        self.is_open = False
+
+
+def record(session, file):
+    """
+    Start recording traffic of session
+    :param session: Session.Session
+    :param file: Capture file name
+    """
+    session.com.ser = RecordingSerial(session.com.ser, file, session.address)
+
+
+def replay_session(file, speed=1.0, password=0x00000000, strict=True):
+    """
+    Create session talking to recorded traffic instead of sensor
+
+    :param file: Capture file name
+    :param speed: Replay speed factor. 0 delivers the answers at once
+    :param password: Sensor password used during the recording
+    :param strict: Raise Errors.WriteError if the commands differ from the recording
+    :return: Session.Session
+    """
+    replay = ReplaySerial(file, speed=speed, strict=strict)
+    session = Session.Session("loop://", baud=replay.baudrate, password=password, address=replay.header["address"])
+    session.com.ser.close()
+    session.com.ser = replay
+    return session
+
+
+def summary(file):
+    """
+    Describe capture: traffic in both directions and turnaround of every command
+
+    :param file: Capture file name
+    :return: Text
+    """
+    header, records = read_capture(file)
+    written = sum(len(data) for _, direction, data in records if direction == WRITE)
+    read = sum(len(data) for _, direction, data in records if direction == READ)
+    duration = records[-1][0] if records else 0.0
+
+    lines = ["Started %s, %d bps, address 0x%08x" % (time.ctime(header["started"]), header["baud_rate"],
+                                                    header["address"]),
+             "%d records in %.3f s, %d bytes written, %d bytes read" % (len(records), duration, written, read)]
+
+    # Decode commands and acknowledges to show where the time went
+    decoder = Codec.FrameDecoder()
+    command = None
+    sent = 0.0
+    for timestamp, direction, data in records:
+        if direction == WRITE:
+            frames = Codec.FrameDecoder()
+            frames.feed(data)
+            for _, packet_type, body in frames:
+                if packet_type == 0x01 and body:
+                    command, sent = body[0], timestamp
+            decoder.reset()
+            continue
+
+        decoder.feed(data)
+        for _, packet_type, body in decoder:
+            if packet_type == 0x07 and command is not None:
+                lines.append("%10.3f s  %-14s %-16s %8.2f ms" % (
+                    sent, Metrics.command_name(command), Metrics.code_name(body[0]) if body else "?",
+                    (timestamp - sent) * 1000))
+                command = None
+
+    if decoder.checksum_errors:
+        lines.append("%d frames with wrong checksum" % decoder.checksum_errors)
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show traffic recorded with main.py --record",
+                                     prog="FingerPrint-capture")
+    parser.add_argument("file",
+                        help="Capture file")
+    args = parser.parse_args()
+
+    try:
+        print(summary(args.file))
+    except (OSError, ValueError) as err:
+        print(err)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
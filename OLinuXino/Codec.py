@@ -0,0 +1,227 @@
+__author__ = "Stefan Mavrodiev"
+__copyright__ = "Copyright 2015, Olimex LTD"
+__credits__ = ["Stefan Mavrodiev"]
+__license__ = "GPL"
+__version__ = "2.0"
+__maintainer__ = __author__
+__email__ = "support@olimex.com"
+
+# Magic header of every frame
+START_CODE = b"\xef\x01"
+
+# Start code, address, packet identification and length
+HEADER_SIZE = 9
+
+# Bytes after the data
+CHECKSUM_SIZE = 2
+
+# Longest data packet supported by the sensor
+MAX_DATA = 256
+
+# Last frame of a data stream, nothing follows it
+END_DATA = 0x08
+
+
+def checksum(packet_type, data):
+    """
+    Calculate checksum of frame
+
+    :param packet_type: Packet identification
+    :param data: Data bytes
+    :return: Calculated checksum. Returns only the low 2 bytes
+    """
+    length = len(data) + CHECKSUM_SIZE
+    return (packet_type + (length >> 8) + (length & 0xFF) + sum(data)) & 0xFFFF
+
+
+def address_header(address):
+    """
+    Get start code and address bytes for device address
+
+    :param address: Device address
+    :return: 6 bytes header
+    """
+    return START_CODE + address.to_bytes(4, "big")
+
+
+class FrameEncoder:
+
+    def __init__(self, address, max_data=256):
+
+        """
+        Encode frames into reusable buffer
+
+        :param address: Device address
+        :param max_data: Initial capacity for data bytes. The buffer grows if needed
+        """
+        self._buffer = bytearray(HEADER_SIZE + max_data + CHECKSUM_SIZE)
+        self._view = memoryview(self._buffer)
+        self.address = address
+
+    @property
+    def address(self):
+        return self._address
+
+    @address.setter
+    def address(self, address):
+        # Precompute start code and address
+        self._address = address
+        self._buffer[0:6] = address_header(address)
+
+    def encode(self, packet_type, data):
+        """
+        Encode frame
+
+        :param packet_type: Packet identification
+        :param data: Data bytes. Any bytes-like object or list of integers
+        :return: Memoryview of the encoded frame. Valid until the next call
+        """
+        data_len = len(data)
+        frame_len = HEADER_SIZE + data_len + CHECKSUM_SIZE
+
+        # Replace the buffer for longer data. Frames returned earlier keep the old one
+        if frame_len > len(self._buffer):
+            self._buffer = bytearray(frame_len)
+            self._view = memoryview(self._buffer)
+            self.address = self._address
+
+        length = data_len + CHECKSUM_SIZE
+        summary = (packet_type + (length >> 8) + (length & 0xFF) + sum(data)) & 0xFFFF
+
+        buffer = self._buffer
+        buffer[6] = packet_type
+        buffer[7] = length >> 8
+        buffer[8] = length & 0xFF
+        buffer[HEADER_SIZE:HEADER_SIZE + data_len] = data
+        buffer[frame_len - 2] = summary >> 8
+        buffer[frame_len - 1] = summary & 0xFF
+
+        return self._view[:frame_len]
+
+
+class FrameDecoder:
+
+    def __init__(self):
+
+        """
+        Incremental frame decoder.
+        Feed it with any number of received bytes and take complete frames out.
+        Garbage before a frame and frames with bad length or checksum are skipped
+        by searching for the next start code.
+
+        With keep_damaged set, a frame with wrong checksum whose end is confirmed
+        by the start code of the next frame (or that is the end of data stream)
+        is returned with None instead of the data, so the receiver knows which
+        frame of a stream is missing.
+        """
+        self._buffer = bytearray()
+        self.keep_damaged = False
+
+        # Statistics
+        self.discarded = 0
+        self.checksum_errors = 0
+        self.damaged = 0
+
+    @property
+    def pending(self):
+        """
+        Get number of buffered bytes not yet returned as frame
+        """
+        return len(self._buffer)
+
+    def reset(self):
+        """
+        Drop all buffered bytes
+
+        :return: Number of dropped bytes
+        """
+        pending = len(self._buffer)
+        self._buffer.clear()
+        return pending
+
+    def feed(self, data):
+        """
+        Append received bytes
+
+        :param data: Received bytes
+        """
+        self._buffer += data
+
+    def resync(self):
+        """
+        Drop the first buffered byte, so the search for start code moves forward.
+        Used when a frame with valid looking header never completes.
+        """
+        if self._buffer:
+            del self._buffer[0]
+            self.discarded += 1
+
+    def needed(self):
+        """
+        Get number of bytes missing to complete the next frame
+
+        :return: Number of bytes, at least 1
+        """
+        buffer = self._buffer
+        if len(buffer) < HEADER_SIZE or buffer[0:2] != START_CODE:
+            return max(1, HEADER_SIZE - len(buffer))
+        return max(1, HEADER_SIZE + (buffer[7] << 8 | buffer[8]) - len(buffer))
+
+    def next_frame(self):
+        """
+        Take the next complete frame
+
+        :return: Tuple (address, packet identification, data bytes) or None if there isn't complete frame.
+                 Data is None for a damaged frame kept because of keep_damaged
+        """
+        buffer = self._buffer
+
+        while True:
+            # Skip everything before the start code. Trailing 0xEF may be the first half of it
+            start = buffer.find(START_CODE)
+            if start < 0:
+                keep = 1 if buffer[-1:] == START_CODE[:1] else 0
+                self.discarded += len(buffer) - keep
+                del buffer[:len(buffer) - keep]
+                return None
+            if start:
+                self.discarded += start
+                del buffer[:start]
+
+            if len(buffer) < HEADER_SIZE:
+                return None
+
+            # Start code in the middle of data may give impossible length
+            length = buffer[7] << 8 | buffer[8]
+            if length < CHECKSUM_SIZE or length > MAX_DATA + CHECKSUM_SIZE:
+                self.resync()
+                continue
+
+            end = HEADER_SIZE + length
+            if len(buffer) < end:
+                return None
+
+            if (sum(buffer[6:end - 2]) & 0xFFFF) != (buffer[end - 2] << 8 | buffer[end - 1]):
+                if self.keep_damaged and buffer[6] != END_DATA and len(buffer) < end + len(START_CODE):
+                    # Wait for the next frame to tell if the length was right
+                    return None
+
+                self.checksum_errors += 1
+                if self.keep_damaged and (buffer[6] == END_DATA or buffer[end:end + len(START_CODE)] == START_CODE):
+                    self.damaged += 1
+                    frame = (int.from_bytes(buffer[2:6], "big"), buffer[6], None)
+                    del buffer[:end]
+                    return frame
+
+                self.resync()
+                continue
+
+            frame = (int.from_bytes(buffer[2:6], "big"), buffer[6], bytes(buffer[HEADER_SIZE:end - 2]))
+            del buffer[:end]
+            return frame
+
+    def __iter__(self):
+        frame = self.next_frame()
+        while frame is not None:
+            yield frame
+            frame = self.next_frame()
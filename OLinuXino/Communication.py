@@ -7,11 +7,14 @@ __maintainer__ = __author__
 __email__ = "support@olimex.com"
 
 
+import collections
 import serial
-import struct
 import time
 
+import Codec
 import Errors
+import Metrics
+import Retry
 import StatusCodes
 
 
@@ -19,21 +22,41 @@ class Communication:
 
     _start_code = 0xEF01
 
-    def __init__(self, port, device_address, baud_rate=57600):
+    # Number of turnaround times kept for every command
+    _turnaround_history = 100
+
+    def __init__(self, port, device_address, baud_rate=57600, low_latency=False):
 
         """
         Class initialization
 
-        :param port: Communication port
+        :param port: Communication port or pyserial URL (socket://, loop://, ...)
         :param device_address: Sensor address
         :param baud_rate: Communication speed
+        :param low_latency: Don't flush and wait before every command. Input is
+                            discarded only when stale or garbage bytes are detected
         """
         # Create communication
-        self.ser = serial.Serial(port, baudrate=baud_rate, timeout=1)
+        self.ser = serial.serial_for_url(port, baudrate=baud_rate, timeout=1)
 
         # Set current address. May be changed via set and get methods
         self._device_address = device_address
 
+        # Frames are encoded in place with precomputed header
+        self._encoder = Codec.FrameEncoder(device_address)
+        self._decoder = Codec.FrameDecoder()
+
+        self.low_latency = low_latency
+
+        # Last turnaround times in seconds for every command code
+        self.turnaround = collections.defaultdict(lambda: collections.deque(maxlen=self._turnaround_history))
+
+        # Counters for monitoring
+        self.metrics = Metrics.Metrics(self._decoder)
+
+        # Repeats after communication errors
+        self.retry = Retry.RetryPolicy()
+
     @property
     def device_address(self):
 
@@ -60,109 +83,167 @@ class Communication:
 
         # Set the new address
         self._device_address = new_address
+        self._encoder.address = new_address
+
+    @property
+    def baud_rate(self):
+        """
+        Get current port speed
+        """
+        return self.ser.baudrate
+
+    @baud_rate.setter
+    def baud_rate(self, baud_rate):
+        """
+        Reconfigure the open port to new speed.
+        Bytes received at the old speed are discarded.
+
+        :param baud_rate: Communication speed
+        """
+        self.ser.baudrate = baud_rate
+        self.ser.reset_input_buffer()
+        self._decoder.reset()
 
     def send_packet(self, packet, packet_type):
 
         """
         Send raw packet to sensor
 
-        :param packet: List with bytes to send
+        :param packet: Bytes to send. Bytes-like object or list
         :param packet_type: Packet identification
         :raise Errors.WriteError: If there is problem with sending
         """
 
-        # Create empty byte string
-        string = b""
-
-        # Append start code
-        buffer = [(self._start_code >> 8 & 0xFF), self._start_code & 0xFF]
-
-        # Append address
-        buffer += [(self._device_address >> 24 & 0xFF),
-                   (self._device_address >> 16 & 0xFF),
-                   (self._device_address >> 8 & 0xFF),
-                   (self._device_address >> 0 & 0xFF)]
-
-        # Append packet type
-        buffer += [packet_type]
-
-        # Append packet len
-        packet_len = len(packet)
-        buffer += [packet_len + 2 >> 8, packet_len + 2 & 0xFF]
-
-        # Add data packet
-        buffer += packet
-
-        # Calculate checksum
-        checksum = self.checksum(packet, packet_type)
-        buffer += [(checksum >> 8 & 0xFF), checksum & 0xFF]
-
-        # Convert to byte array
-        for i in buffer:
-            string += struct.pack("B", i)
+        frame = self._encoder.encode(packet_type, packet)
 
         # Send packet
-        if self.ser.write(string) != len(string):
+        if self.ser.write(frame) != len(frame):
             raise Errors.WriteError("Not all bytes send")
+        self.metrics.sent(len(frame))
 
-    def read_packet(self, number_bytes, packet_identification):
+    @property
+    def decoder(self):
+        """
+        Get the frame decoder with its statistics
+        """
+        return self._decoder
+
+    def read_packet(self, packet_identification):
 
         """
-        Read data comming from sensor
+        Read data comming from sensor.
+        The frame length is taken from the frame itself. All bytes available
+        on the port are read at once and the rest is kept for the next call.
 
-        :param number_bytes: Number of bytes to read
         :param packet_identification: Expected packet identification
-        :return: Return only the data packet
+        :return: Return only the data packet. None for a damaged frame kept by the decoder, see FrameDecoder
         :raise Errors.ReadError: If there is something wrong with the communication
         """
+        frame = self._decoder.next_frame()
+
+        while frame is None:
+            # Read bytes from serial port
+            data = self.ser.read(max(self.ser.in_waiting, self._decoder.needed()))
+
+            if len(data) == 0:
+                self.metrics.timeout()
 
-        # Read bytes from serial port
-        response = self.ser.read(number_bytes)
+                # Check for empty input buffer
+                if not self._decoder.pending:
+                    raise Errors.ReadError("Zero bytes read. Check your sensor connection")
 
-        # Check for empty input buffer
-        if len(response) == 0:
-            raise Errors.ReadError("Zero bytes read. Check your sensor connection")
+                # Header of frame that never completes. Search for the next one
+                self._decoder.resync()
+            else:
+                self.metrics.received(len(data))
+                self._decoder.feed(data)
 
-        # Check for magic header
-        if response[0] != 0xEF or response[1] != 0x01:
-            raise Errors.ReadError("Message header doesn't match")
+            frame = self._decoder.next_frame()
+
+        self.metrics.frame()
+        address, packet_type, data = frame
 
         # Check device address
-        if response[2] != (self._device_address >> 24 & 0xFF) or \
-            response[3] != (self._device_address >> 16 & 0xFF) or \
-                response[4] != (self._device_address >> 8 & 0xFF) or \
-                response[5] != (self._device_address >> 0 & 0xFF):
+        if address != self._device_address:
+            self.metrics.header_error()
             raise Errors.ReadError("Device address doesn't match")
 
         # Check identification
-        if response[6] != packet_identification:
+        if packet_type != packet_identification:
+            self.metrics.header_error()
             raise Errors.ReadError("Packet identification doesn't match")
 
-        # Calculate checksum
-        checksum = response[6]
-        for i in response[7:-2]:
-            checksum += i
-        if (checksum & 0xFFFF) != (response[-2] << 8 | response[-1]):
-            raise Errors.ReadError("Checksum doesn't match.")
-
-        # Return list with data
-        ret = []
-        for i in response[9:9 + (response[7] << 8 | response[8]) - 2]:
-            ret.append(i)
-        return ret
+        return data
 
-    def transfer(self, packet, packet_len):
-        # Before any transfer flush buffers
-        self.ser.flushInput()
-        self.ser.flushOutput()
+    def drain(self, quiet=0.05):
+        """
+        Wait until the sensor stops sending, for example the rest of a broken
+        data stream, and drop everything received
 
-        time.sleep(0.01)
+        :param quiet: Time without received bytes that ends the wait in seconds
+        """
+        saved, self.ser.timeout = self.ser.timeout, quiet
+        try:
+            while self.ser.read(4096):
+                pass
+        finally:
+            self.ser.timeout = saved
+        self._decoder.reset()
+
+    def _transfer(self, packet):
+        if not self.low_latency:
+            # Before any transfer flush buffers. Output still on the way, like the data
+            # packets after DownChar, must reach the sensor, so it is waited for, not dropped
+            self.ser.flushInput()
+            self.ser.flush()
+            self._decoder.reset()
+
+            time.sleep(0.01)
+
+        elif self._decoder.pending or self.ser.in_waiting:
+            # Leftovers of previous transfer can't belong to this command
+            self.ser.reset_input_buffer()
+            self._decoder.reset()
+
+        start = time.perf_counter()
+
+        try:
+            # Send the packet
+            self.send_packet(packet, StatusCodes.PacketType.Command.value)
+
+            # Read the response
+            response = self.read_packet(StatusCodes.PacketType.Ack.value)
+        except Errors.Error:
+            self.metrics.failure(packet[0])
+            raise
+
+        elapsed = time.perf_counter() - start
+        self.turnaround[packet[0]].append(elapsed)
+        self.metrics.command(packet[0], elapsed, response[0])
+        return response
+
+    def transfer(self, packet):
 
-        # Send the packet
-        self.send_packet(packet, StatusCodes.PacketType.Command.value)
+        """
+        Send command and read the acknowledge.
+        Idempotent commands are sent again after read errors as the retry policy allows.
 
-        # Read the response
-        return self.read_packet(packet_len, StatusCodes.PacketType.Ack.value)
+        :param packet: Command bytes
+        :return: Acknowledge data. The first byte is the confirmation code
+        :raise Errors.Error: If there is problem with the communication
+        """
+        attempt = 0
+        while True:
+            try:
+                return self._transfer(packet)
+            except Errors.ReadError:
+                if attempt >= self.retry.retries(packet[0]):
+                    raise
+
+            attempt += 1
+            self.metrics.retry(packet[0])
+            time.sleep(self.retry.pause(attempt))
+            self.drain()
 
     @staticmethod
     def checksum(packet, packet_type):
@@ -174,14 +255,4 @@ class Communication:
         :return: Calculated checksum. Returns only the low 2 bytes
         """
 
-        # Get packet len + 2 bytes for checksum
-        packet_len = len(packet) + 2
-
-        # Sum all packet values
-        summary = (packet_len >> 8) + (packet_len & 0xFF) + packet_type
-        for i in packet:
-            summary += i
-
-        # Return value
-        return summary & 0xFFFF
-
+        return Codec.checksum(packet_type, packet)
@@ -0,0 +1,409 @@
+__author__ = "Stefan Mavrodiev"
+__copyright__ = "Copyright 2015, Olimex LTD"
+__credits__ = ["Stefan Mavrodiev"]
+__license__ = "GPL"
+__version__ = "2.0"
+__maintainer__ = __author__
+__email__ = "support@olimex.com"
+
+import argparse
+import concurrent.futures
+import sys
+import threading
+import time
+
+import Errors
+import Session
+
+
+class SensorResult:
+
+    def __init__(self, port, value=None, error=None, elapsed=0.0):
+
+        """
+        Result of an operation on one sensor
+
+        :param port: Port of the sensor
+        :param value: Returned value
+        :param error: Error message or None on success
+        :param elapsed: Time spent in the operation in seconds
+        """
+        self.port = port
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class Shard:
+
+    def __init__(self, port, start, count, base=0):
+
+        """
+        Part of the enrolled population stored on one sensor
+
+        :param port: Port of the sensor
+        :param start: First page on the sensor
+        :param count: Number of pages
+        :param base: Global id of the first page
+        """
+        self.port = port
+        self.start = start
+        self.count = count
+        self.base = base
+
+
+class SearchResult:
+
+    def __init__(self, shard, page, score):
+
+        """
+        Match found by sharded search
+
+        :param shard: Shard where the model was found
+        :param page: Page on the sensor
+        :param score: Match score
+        """
+        self.shard = shard
+        self.page = page
+        self.score = score
+
+    @property
+    def port(self):
+        return self.shard.port
+
+    @property
+    def global_id(self):
+        """
+        Get id of the model in the whole population
+        """
+        return self.shard.base + self.page - self.shard.start
+
+    def __str__(self):
+        return "id %d (%s page %d), score %d" % (self.global_id, self.port, self.page, self.score)
+
+
+def _check(finger, ret):
+    # Turn the 0/1 result of Finger operations into exception
+    if ret:
+        raise finger.last_error or Errors.StatusError("Operation failed")
+
+
+class Controller:
+
+    def __init__(self, ports, baud=57600, password=0x00000000, address=0xffffffff, low_latency=False):
+
+        """
+        Manage sessions to several sensors and run operations on them concurrently.
+        Every port has its own single worker, so the operations on one sensor never
+        overlap on its half-duplex line while different sensors run in parallel.
+
+        :param ports: List of ports or pyserial URLs
+        :param baud: Communication speed
+        :param password: Sensor password
+        :param address: Sensor address
+        :param low_latency: Skip the flush and delay before every command
+        :raise IOError: If a port can't be opened
+        """
+        self.sessions = {}
+        self._workers = {}
+
+        try:
+            for port in ports:
+                self.sessions[port] = Session.Session(port, baud=baud, password=password, address=address,
+                                                      low_latency=low_latency)
+                self._workers[port] = concurrent.futures.ThreadPoolExecutor(max_workers=1,
+                                                                            thread_name_prefix=port)
+        except IOError:
+            self.close()
+            raise
+
+    @property
+    def ports(self):
+        return list(self.sessions)
+
+    def close(self):
+        """
+        Stop the workers and close all sessions
+        """
+        for worker in self._workers.values():
+            worker.shutdown()
+        for session in self.sessions.values():
+            session.close()
+        self._workers.clear()
+        self.sessions.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _run(self, port, function, args):
+        start = time.perf_counter()
+        try:
+            value = function(self.sessions[port], *args)
+            return SensorResult(port, value=value, elapsed=time.perf_counter() - start)
+        except Errors.Error as err:
+            return SensorResult(port, error=err.msg, elapsed=time.perf_counter() - start)
+        except IOError as err:
+            # Unplugged sensor (serial.SerialException is an IOError) fails only its own result
+            return SensorResult(port, error=str(err), elapsed=time.perf_counter() - start)
+
+    def submit(self, port, function, *args):
+        """
+        Queue operation on the worker of one sensor
+
+        :param port: Port of the sensor
+        :param function: Called as function(session, *args)
+        :return: concurrent.futures.Future with SensorResult
+        """
+        return self._workers[port].submit(self._run, port, function, args)
+
+    def run_all(self, function, *args, ports=None):
+        """
+        Run operation on all sensors concurrently and wait for the results
+
+        :param function: Called as function(session, *args) for every sensor
+        :param ports: Limit to these ports. None for all
+        :return: Dictionary port -> SensorResult, in the order of the ports
+        """
+        futures = [self.submit(port, function, *args) for port in (ports or self.sessions)]
+        return {future.result().port: future.result() for future in futures}
+
+    def verify_password(self):
+        """
+        Verify password on all sensors
+        :return: Dictionary port -> SensorResult
+        """
+        def verify(session):
+            _check(session.system, session.system.verify_password())
+
+        return self.run_all(verify)
+
+    def read_system_params(self):
+        """
+        Read parameters of all sensors
+        :return: Dictionary port -> SensorResult with Finger.SystemParameters
+        """
+        return self.run_all(lambda session: session.system.system_params())
+
+    def get_model_count(self):
+        """
+        Read models count of all sensors
+        :return: Dictionary port -> SensorResult with the count
+        """
+        return self.run_all(lambda session: session.models.model_count())
+
+    def empty_database(self):
+        """
+        Delete all models on all sensors
+        :return: Dictionary port -> SensorResult
+        """
+        def empty(session):
+            _check(session.models, session.models.empty_database())
+
+        return self.run_all(empty)
+
+    def shards(self):
+        """
+        Create shards covering the whole database of every sensor.
+        Global ids continue from one sensor to the next in the order of the ports.
+
+        :return: List of Shard
+        """
+        def size(session):
+            return session.parameters().database_size
+
+        shards = []
+        base = 0
+        for port, result in self.run_all(size).items():
+            if not result.ok:
+                raise Errors.StatusError("%s: %s" % (port, result.error))
+            shards.append(Shard(port, 0, result.value, base))
+            base += result.value
+        return shards
+
+    def sharded_search(self, probe, shards=None, threshold=100, chunk=256, buffer_id=1):
+        """
+        Search probe template on all shards in parallel.
+        The probe is downloaded once to every sensor, then its shards are searched
+        in chunks of pages. Once a score reaches the threshold the remaining
+        chunks are cancelled.
+
+        :param probe: Template bytes
+        :param shards: List of Shard. None for the whole database of every sensor
+        :param threshold: Score accepted as confident match
+        :param chunk: Pages searched by one command. Smaller chunks cancel sooner
+        :param buffer_id: CharBuffer used for the probe. Its content is lost
+        :return: Tuple (best SearchResult or None, dictionary port -> SensorResult with the best
+                 SearchResult of the shards on that port or None)
+        """
+        if shards is None:
+            shards = self.shards()
+
+        found = threading.Event()
+
+        # Shards of one sensor are searched by one task, so the probe is downloaded once
+        by_port = {}
+        for shard in shards:
+            by_port.setdefault(shard.port, []).append(shard)
+
+        def search(session, port_shards):
+            session.models.write_model(buffer_id, probe)
+
+            best = None
+            for shard in port_shards:
+                for start in range(shard.start, shard.start + shard.count, chunk):
+                    if found.is_set():
+                        return best
+
+                    match = session.models.find_model(buffer_id, start,
+                                                      min(chunk, shard.start + shard.count - start))
+                    if match is not None and (best is None or match[1] > best.score):
+                        best = SearchResult(shard, match[0], match[1])
+                        if best.score >= threshold:
+                            found.set()
+            return best
+
+        futures = [self.submit(port, search, port_shards) for port, port_shards in by_port.items()]
+        results = {}
+        for future in futures:
+            result = future.result()
+            results[result.port] = result
+
+        matches = [result.value for result in results.values() if result.ok and result.value is not None]
+        best = max(matches, key=lambda match: match.score) if matches else None
+        return best, results
+
+
+def format_results(results, title="value"):
+    """
+    Format fan-out results as text table
+
+    :param results: Dictionary port -> SensorResult
+    :param title: Name of the value column
+    :return: Table as string
+    """
+    lines = ["%-24s %-8s %10s  %s" % ("port", "status", "time ms", title)]
+    for result in results.values():
+        if result.ok:
+            value = "" if result.value is None else str(result.value)
+            lines.append("%-24s %-8s %10.2f  %s" % (result.port, "OK", result.elapsed * 1000, value))
+        else:
+            lines.append("%-24s %-8s %10.2f  %s" % (result.port, "ERROR", result.elapsed * 1000, result.error))
+
+    succeeded = sum(1 for result in results.values() if result.ok)
+    lines.append("%d of %d sensors OK, slowest %.2f ms" % (
+        succeeded, len(results), max([result.elapsed for result in results.values()] or [0]) * 1000))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run operations on several finger sensors at once",
+                                     prog="FingerPrint-controller")
+
+    parser.add_argument("-p", "--port",
+                        action="store",
+                        nargs="+",
+                        required=True,
+                        help="Communication ports or pyserial URLs")
+    parser.add_argument("--baudrate",
+                        action="store",
+                        type=int,
+                        default=57600,
+                        help="Set communication speed. Default: 57600")
+    parser.add_argument("--password",
+                        action="store",
+                        type=lambda value: int(value, 16),
+                        default=0x00000000,
+                        help="Sensor password. Default: 0x00000000")
+    parser.add_argument("--address",
+                        action="store",
+                        type=lambda value: int(value, 16),
+                        default=0xFFFFFFFF,
+                        help="Sensor address. Default: 0xffffffff")
+    parser.add_argument("--low-latency",
+                        action="store_true",
+                        help="Don't flush the port and wait 10 ms before every command")
+
+    actions = parser.add_mutually_exclusive_group(required=True)
+    actions.add_argument("--settings",
+                         action="store_true",
+                         help="Read settings of all sensors")
+    actions.add_argument("--models-count",
+                         action="store_true",
+                         help="Print models count of all sensors")
+    actions.add_argument("--empty",
+                         action="store_true",
+                         help="Empty model database of all sensors")
+    actions.add_argument("--search",
+                         action="store",
+                         metavar="FILE",
+                         help="Search template FILE in the databases of all sensors. Uses CharBuffer1")
+
+    parser.add_argument("--threshold",
+                        action="store",
+                        type=int,
+                        default=100,
+                        help="Score that stops the search on the other sensors. Default: 100")
+    parser.add_argument("--chunk",
+                        action="store",
+                        type=int,
+                        default=256,
+                        help="Pages searched by one command. Default: 256")
+
+    args = parser.parse_args()
+
+    try:
+        controller = Controller(args.port, baud=args.baudrate, password=args.password, address=args.address,
+                                low_latency=args.low_latency)
+    except IOError as err:
+        print(err)
+        return 1
+
+    with controller:
+        results = controller.verify_password()
+        failed = [port for port, result in results.items() if not result.ok]
+        if failed:
+            print(format_results(results))
+            return 1
+
+        if args.settings:
+            results = controller.read_system_params()
+            for result in results.values():
+                if result.ok:
+                    params = result.value
+                    result.value = "id 0x%04x, database %d, security %d, packet %d, %d bps" % (
+                        params.system_id, params.database_size, params.security_level,
+                        params.packet_size, params.baud_rate)
+            print(format_results(results, "settings"))
+
+        elif args.models_count:
+            results = controller.get_model_count()
+            print(format_results(results, "models"))
+            print("Total models: %d" % sum(result.value for result in results.values() if result.ok))
+
+        elif args.empty:
+            results = controller.empty_database()
+            print(format_results(results))
+
+        elif args.search:
+            with open(args.search, "rb") as f:
+                probe = f.read()
+            try:
+                best, results = controller.sharded_search(probe, threshold=args.threshold, chunk=args.chunk)
+            except Errors.Error as err:
+                print(err.msg)
+                return 1
+            print(format_results(results, "match"))
+            print("Best match: %s" % (best or "none"))
+
+    return 0 if all(result.ok for result in results.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
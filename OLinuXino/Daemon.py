@@ -0,0 +1,350 @@
+__author__ = "Stefan Mavrodiev"
+__copyright__ = "Copyright 2015, Olimex LTD"
+__credits__ = ["Stefan Mavrodiev"]
+__license__ = "GPL"
+__version__ = "2.0"
+__maintainer__ = __author__
+__email__ = "support@olimex.com"
+
+import argparse
+import base64
+import concurrent.futures
+import inspect
+import json
+import os
+import socket
+import socketserver
+import sys
+import time
+import traceback
+
+import Errors
+import Metrics
+import Occupancy
+import Session
+
+# Requests and responses are JSON objects, one per line:
+#   {"id": 1, "command": "search", "args": [1, 0, 1000]}
+#   {"id": 1, "ok": true, "result": {"page": 5, "score": 200}, "error": null, "elapsed": 12.5}
+# Binary data (templates, images) is base64 encoded.
+
+
+def _check(finger, ret):
+    # Turn the 0/1 result of Finger operations into exception
+    if ret:
+        raise finger.last_error or Errors.StatusError("Operation failed")
+
+
+def _search(session, buffer_id, start, count):
+    match = session.models.find_model(buffer_id, start, count)
+    return None if match is None else {"page": match[0], "score": match[1]}
+
+
+def _table(session, page):
+    table = Occupancy.OccupancyMap(Occupancy.PAGE_MODELS, session.models.index_table(page))
+    return [page * Occupancy.PAGE_MODELS + model for model in table]
+
+
+def _used(session, start=0, count=None):
+    return session.occupancy().ranges(start, count)
+
+
+def _write_model(session, buffer_id, data):
+    session.models.write_model(buffer_id, base64.b64decode(data))
+
+
+def _accepts(function, args):
+    # Check the number of arguments before the command is queued
+    try:
+        inspect.signature(function).bind(None, *args)
+    except TypeError:
+        return False
+    return True
+
+
+# Command name -> function(session, *args) returning JSON value
+COMMANDS = {
+    "verify": lambda session: _check(session.system, session.system.verify_password()),
+    "params": lambda session: vars(session.parameters()),
+    "count": lambda session: session.models.model_count(),
+    "table": _table,
+    "generate": lambda session: _check(session.models, session.models.generate_model()),
+    "chars": lambda session, buffer_id: _check(session.models, session.models.generate_characteristics(buffer_id)),
+    "register": lambda session: _check(session.models, session.models.register_model()),
+    "match": lambda session: session.models.match_score(),
+    "search": _search,
+    "store": lambda session, buffer_id, page: _check(session.models, session.models.store_model(buffer_id, page)),
+    "store_free": lambda session, buffer_id, start=0: session.models.store_free(buffer_id, start),
+    "used": _used,
+    "free": lambda session, start=0: session.occupancy().next_free(start),
+    "load": lambda session, buffer_id, page: _check(session.models, session.models.load_model(buffer_id, page)),
+    "delete": lambda session, start, count: _check(session.models, session.models.delete_model(start, count)),
+    "empty": lambda session: _check(session.models, session.models.empty_database()),
+    "read_model": lambda session, buffer_id: base64.b64encode(session.models.read_model(buffer_id)).decode(),
+    "write_model": _write_model,
+    "image": lambda session: base64.b64encode(session.image.read_image()).decode(),
+    "metrics": lambda session: session.com.metrics.snapshot(),
+}
+
+
+class SensorDaemon:
+
+    def __init__(self, session):
+
+        """
+        Serve one sensor session to many clients.
+        Requests of all clients go through one queue, so only one command
+        uses the half-duplex line at a time.
+
+        :param session: Session.Session of the sensor, kept open
+        """
+        self.session = session
+        self._worker = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="sensor")
+        self.requests = 0
+
+    def _run(self, command, args):
+        start = time.perf_counter()
+        try:
+            result = COMMANDS[command](self.session, *args)
+            return {"ok": True, "result": result, "error": None,
+                    "elapsed": (time.perf_counter() - start) * 1000}
+        except Errors.Error as err:
+            return {"ok": False, "result": None, "error": err.msg,
+                    "elapsed": (time.perf_counter() - start) * 1000}
+        except IOError as err:
+            return {"ok": False, "result": None, "error": str(err),
+                    "elapsed": (time.perf_counter() - start) * 1000}
+        except Exception as err:
+            # Bug in the command or unexpected answer of the sensor. The client gets
+            # an error response and the daemon keeps serving
+            traceback.print_exc()
+            return {"ok": False, "result": None, "error": "Internal error in '%s': %r" % (command, err),
+                    "elapsed": (time.perf_counter() - start) * 1000}
+
+    def handle(self, request):
+        """
+        Queue request and wait for its response
+
+        :param request: Dictionary with command, args and optional id
+        :return: Response dictionary
+        """
+        command = request.get("command")
+        args = request.get("args", [])
+
+        if command not in COMMANDS:
+            response = {"ok": False, "result": None, "error": "Unknown command '%s'" % command, "elapsed": 0.0}
+        elif not isinstance(args, list):
+            response = {"ok": False, "result": None, "error": "args must be a list", "elapsed": 0.0}
+        elif not _accepts(COMMANDS[command], args):
+            response = {"ok": False, "result": None, "error": "Wrong arguments for '%s'" % command,
+                        "elapsed": 0.0}
+        else:
+            self.requests += 1
+            response = self._worker.submit(self._run, command, args).result()
+
+        response["id"] = request.get("id")
+        return response
+
+    def close(self):
+        """
+        Finish the queued requests
+        """
+        self._worker.shutdown()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("Request must be an object")
+            except ValueError as err:
+                response = {"id": None, "ok": False, "result": None, "error": "Bad request: %s" % err,
+                            "elapsed": 0.0}
+            else:
+                response = self.server.sensor.handle(request)
+
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+    def __init__(self, daemon, path):
+
+        """
+        Serve SensorDaemon on Unix domain socket
+
+        :param daemon: SensorDaemon instance
+        :param path: Socket file. Replaced if it exists
+        """
+        if os.path.exists(path):
+            os.remove(path)
+        self.sensor = daemon
+        super().__init__(path, _Handler)
+
+
+class TcpServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, daemon, port, host="127.0.0.1"):
+
+        """
+        Serve SensorDaemon on TCP socket
+
+        :param daemon: SensorDaemon instance
+        :param port: Listen port
+        :param host: Listen address. Only local clients by default
+        """
+        self.sensor = daemon
+        super().__init__((host, port), _Handler)
+
+
+class Client:
+
+    def __init__(self, address):
+
+        """
+        Connection to running daemon
+
+        :param address: Unix socket path or (host, port) tuple
+        """
+        if isinstance(address, str):
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._socket.connect(address)
+        self._file = self._socket.makefile("rwb")
+        self._id = 0
+
+    def call(self, command, *args):
+        """
+        Run command on the sensor
+
+        :param command: Command name, key of COMMANDS
+        :param args: Command arguments
+        :return: Result of the command
+        :raise Errors.RemoteError: If the command fails
+        """
+        self._id += 1
+        self._file.write(json.dumps({"id": self._id, "command": command, "args": list(args)}).encode() + b"\n")
+        self._file.flush()
+
+        line = self._file.readline()
+        if not line:
+            raise Errors.ReadError("Daemon closed the connection")
+
+        response = json.loads(line)
+        if not response["ok"]:
+            raise Errors.RemoteError(response["error"])
+        return response["result"]
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep the sensor connection open and serve requests over socket",
+                                     prog="FingerPrint-daemon")
+
+    parser.add_argument("-p", "--port",
+                        action="store",
+                        required=True,
+                        help="Communication port or pyserial URL to use")
+    parser.add_argument("--baudrate",
+                        action="store",
+                        type=int,
+                        default=57600,
+                        help="Set communication speed. Default: 57600")
+    parser.add_argument("--password",
+                        action="store",
+                        type=lambda value: int(value, 16),
+                        default=0x00000000,
+                        help="Sensor password. Default: 0x00000000")
+    parser.add_argument("--address",
+                        action="store",
+                        type=lambda value: int(value, 16),
+                        default=0xFFFFFFFF,
+                        help="Sensor address. Default: 0xffffffff")
+    parser.add_argument("--low-latency",
+                        action="store_true",
+                        help="Don't flush the port and wait 10 ms before every command")
+    parser.add_argument("--params-cache",
+                        action="store",
+                        metavar="FILE",
+                        help="Keep sensor parameters in FILE between runs")
+
+    parser.add_argument("--metrics-port",
+                        action="store",
+                        type=int,
+                        metavar="PORT",
+                        help="Serve Prometheus metrics on localhost PORT at /metrics")
+
+    listen = parser.add_mutually_exclusive_group(required=True)
+    listen.add_argument("--unix",
+                        action="store",
+                        metavar="PATH",
+                        help="Listen on Unix domain socket PATH")
+    listen.add_argument("--tcp",
+                        action="store",
+                        type=int,
+                        metavar="PORT",
+                        help="Listen on localhost TCP PORT")
+
+    args = parser.parse_args()
+
+    try:
+        session = Session.Session(args.port, baud=args.baudrate, password=args.password, address=args.address,
+                                  low_latency=args.low_latency, params_cache=args.params_cache)
+    except IOError as err:
+        print(err)
+        return 1
+
+    with session:
+        if session.system.verify_password():
+            return 1
+
+        daemon = SensorDaemon(session)
+        if args.unix is not None:
+            server = UnixServer(daemon, args.unix)
+        else:
+            server = TcpServer(daemon, args.tcp)
+
+        metrics = None
+        if args.metrics_port is not None:
+            metrics = Metrics.MetricsServer([session], args.metrics_port).start()
+
+        sys.stderr.write("Serving %s on %s\n" % (args.port, args.unix or "127.0.0.1:%d" % args.tcp))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            daemon.close()
+            if metrics is not None:
+                metrics.stop()
+            if args.unix is not None and os.path.exists(args.unix):
+                os.remove(args.unix)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -32,6 +32,9 @@ class Error(Exception):
         # 0x08
         elif err == ConfirmationCode.image_mismatch.value:
             return "Fingerprints do not match"
+        # 0x09
+        elif err == ConfirmationCode.DintSearch.value:
+            return "No matching fingerprint in the database"
         # 0x0a
         elif err == ConfirmationCode.MergeFailed.value:
             return "Merge failed. (The two fingerprints does not belong to the same finger)"
@@ -79,3 +82,8 @@ class StatusError(Error):
     def __init__(self, msg):
         self.msg = "Status error: " + msg
 
+
+class RemoteError(Error):
+    # Error reported by Daemon.py. The message already has its prefix
+    def __init__(self, msg):
+        self.msg = msg
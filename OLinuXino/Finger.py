@@ -6,24 +6,75 @@ __version__ = "2.0"
 __maintainer__ = __author__
 __email__ = "support@olimex.com"
 
-import Communication
+import Session
 import StatusCodes
 import Errors
 
+import struct
 import sys
+import time
 
-# from PIL import Image
-import PIL.Image
+# Fingerprint image dimensions. The sensor sends 4 bits per pixel
+IMAGE_WIDTH = 256
+IMAGE_HEIGHT = 288
 
-# System parameters
-packet_size = None
-system_id = None
-database_size = None
-secure_level = None
+# Size of the packed image in bytes
+IMAGE_SIZE = IMAGE_WIDTH * IMAGE_HEIGHT // 2
+
+# Supported output formats for create_image. Packed is the image as sent by the sensor
+IMAGE_FORMATS = ("bmp", "png", "raw", "npy", "packed")
+
+# Translation tables from packed byte to 8-bit pixels
+_high_pixel = bytes(i & 0xF0 for i in range(256))
+_low_pixel = bytes((i & 0x0F) << 4 for i in range(256))
+
+# Size of one characteristics template
+TEMPLATE_SIZE = 512
+
+
+class SystemParameters:
+
+    def __init__(self, status_register, system_id, database_size, security_level, device_address,
+                 packet_size, baud_rate):
+
+        """
+        Sensor parameters as returned by ReadSysPara
+
+        :param status_register: Status register
+        :param system_id: System identifier code
+        :param database_size: Fingerprint library size
+        :param security_level: Security level (1 to 5)
+        :param device_address: Sensor address
+        :param packet_size: Data packet length in bytes
+        :param baud_rate: Communication speed
+        """
+        self.status_register = status_register
+        self.system_id = system_id
+        self.database_size = database_size
+        self.security_level = security_level
+        self.device_address = device_address
+        self.packet_size = packet_size
+        self.baud_rate = baud_rate
+
+    @classmethod
+    def from_response(cls, ret):
+        """
+        Parse ReadSysPara acknowledge
+        :param ret: Acknowledge data including the confirmation code
+        :return: SystemParameters instance
+        """
+        return cls(status_register=ret[1] << 8 | ret[2],
+                   system_id=ret[3] << 8 | ret[4],
+                   database_size=ret[5] << 8 | ret[6],
+                   security_level=ret[7] << 8 | ret[8],
+                   device_address=ret[9] << 24 | ret[10] << 16 | ret[11] << 8 | ret[12],
+                   packet_size=32 << (ret[13] << 8 | ret[14]),
+                   baud_rate=(ret[15] << 8 | ret[16]) * 9600)
 
 
 class Finger:
-    def __init__(self, port, baud=57600, password=0x00000000, address=0xffffffff):
+    def __init__(self, port=None, baud=57600, password=0x00000000, address=0xffffffff, low_latency=False,
+                 session=None):
 
         """
         Class to control finger sensor
@@ -31,17 +82,106 @@ class Finger:
         :param baud: Communication speed
         :param password: Sensor password
         :param address: Sensor address
+        :param low_latency: Skip the flush and delay before every command
+        :param session: Session.Session to use. If given the other arguments are ignored
         """
-        self._password = password
-        self._address = address
-
         # Open serial port
-        try:
-            self.com = Communication.Communication(port=port, device_address=self._address, baud_rate=baud)
-        except IOError as err:
-            print(err)
-            sys.exit(1)
-
+        if session is None:
+            try:
+                session = Session.Session(port, baud=baud, password=password, address=address,
+                                          low_latency=low_latency)
+            except IOError as err:
+                print(err)
+                sys.exit(1)
+
+        self.session = session
+        self.com = session.com
+
+        # Error of the last failed operation
+        self.last_error = None
+
+    @property
+    def _password(self):
+        return self.session.password
+
+    def _packet_size(self):
+        """
+        Get data packet length from the session parameters.
+        The parameters are read from the sensor if not cached.
+
+        :return: Packet length in bytes
+        :raise Errors.Error: If there is problem with the communication
+        """
+        return self.session.parameters().packet_size
+
+    def _read_stream(self, packet, buffer, callback=None):
+        """
+        Send upload command and receive its data packets into buffer.
+        A data frame with wrong checksum is only marked as missing, the frames
+        around it keep their place. When the stream is over and packets are
+        missing, or the position in the stream was lost, the command is sent
+        again and only the packets not received yet are written and reported.
+        Restarts without progress are limited by the retry policy of the connection.
+
+        :param packet: Upload command bytes
+        :param buffer: Writable memoryview of the whole transfer
+        :param callback: Called as callback(offset, data) once for every data packet, not always in order
+        :raise Errors.Error: If there is problem with the transfer
+        """
+        # Parameters may be read only before the data stream starts
+        packet_size = self._packet_size()
+        count = len(buffer) // packet_size
+        decoder = self.com.decoder
+
+        received = bytearray(count)
+        done = 0
+        resumed = 0
+        attempt = 0
+        while True:
+            try:
+                self.check_ok(self.com.transfer(packet)[0])
+
+                decoder.keep_damaged = True
+                try:
+                    for i in range(count):
+                        errors = decoder.checksum_errors - decoder.damaged + decoder.discarded
+                        if i != count - 1:
+                            data = self.com.read_packet(StatusCodes.PacketType.Data.value)
+                        else:
+                            data = self.com.read_packet(StatusCodes.PacketType.EndData.value)
+
+                        # Skipped bytes may have been a whole frame, so the position is unknown
+                        if decoder.checksum_errors - decoder.damaged + decoder.discarded != errors:
+                            raise Errors.ReadError("Data frame lost")
+                        if data is None or received[i]:
+                            continue
+                        if len(data) != packet_size:
+                            raise Errors.StatusError("Unexpected data length")
+
+                        buffer[i * packet_size:(i + 1) * packet_size] = data
+                        if callback is not None:
+                            callback(i * packet_size, data)
+                        self.com.metrics.payload(len(data))
+                        received[i] = 1
+                        done += 1
+                finally:
+                    decoder.keep_damaged = False
+
+                if done == count:
+                    return
+                raise Errors.ReadError("Data frame damaged")
+
+            except Errors.ReadError:
+                # Only restarts without progress are counted
+                if done > resumed:
+                    attempt, resumed = 0, done
+                if attempt >= self.com.retry.retries(packet[0]):
+                    raise
+
+            attempt += 1
+            self.com.metrics.restart(packet[0])
+            time.sleep(self.com.retry.pause(attempt))
+            self.com.drain()
 
     @staticmethod
     def u32_to_list(data):
@@ -68,14 +208,15 @@ class Finger:
         return [(data >> 8 & 0xFF),
                 (data >> 0 & 0xFF)]
 
-    @staticmethod
-    def bytes_to_list(data):
+    def report_error(self, err):
         """
-        Convert bytes array to list
-        :param data: bytes array
-        :return: list with data
+        Print error and keep it in last_error
+        :param err: Errors.Error instance
+        :return: 1, the error return value of the operations
         """
-        return [x for x in data]
+        self.last_error = err
+        sys.stderr.write(err.msg + "\n")
+        return 1
 
     @staticmethod
     def check_ok(response):
@@ -87,6 +228,22 @@ class Finger:
         if response != StatusCodes.ConfirmationCode.OK.value:
             raise Errors.StatusError(Errors.Error.print_error(response))
 
+    @staticmethod
+    def unpack_pixels(pixels, offset, data):
+        """
+        Convert from 1 byte for 2 pixels to 2 bytes for 2 pixels
+        into part of pixel buffer
+
+        :param pixels: Output buffer with 1 byte per pixel
+        :param offset: Position of data in the packed image
+        :param data: Packed bytes
+        """
+        data = bytes(data)
+        start = offset * 2
+        end = start + len(data) * 2
+        pixels[start:end:2] = data.translate(_high_pixel)
+        pixels[start + 1:end:2] = data.translate(_low_pixel)
+
     @staticmethod
     def __convert_image(data):
         """
@@ -94,83 +251,142 @@ class Finger:
         :param data: Input data
         :return: Converter data
         """
-        new_image = []
-        for i in data:
-            new_image += [(i & 0xF0), (i & 0x0F) << 4]
+        new_image = bytearray(len(data) * 2)
+        Finger.unpack_pixels(new_image, 0, data)
 
         return new_image
 
     @staticmethod
-    def create_image(data, file):
+    def create_image(data, file, image_format="bmp"):
         """
-        Create new bmp file and fill it with the data
+        Create new image file and fill it with the data
         :param data: Image data
-        :param file: File name
+        :param file: File name without extension
+        :param image_format: One of IMAGE_FORMATS
+        :return: Name of the created file
+        """
+        if image_format == "packed":
+            file = "%s.%s" % (file, image_format)
+            with open(file, "wb") as f:
+                f.write(data)
+            return file
+
+        return Finger.save_pixels(Finger.__convert_image(data), file, image_format)
+
+    @staticmethod
+    def save_pixels(pixels, file, image_format="bmp"):
         """
-        img = PIL.Image.new('L', (256, 288), 'white')
-        data2 = Finger.__convert_image(data)
+        Save unpacked image with 1 byte per pixel
+        :param pixels: Image pixels
+        :param file: File name without extension
+        :param image_format: One of IMAGE_FORMATS except packed
+        :return: Name of the created file
+        """
+        file = "%s.%s" % (file, image_format)
+
+        if image_format == "raw":
+            # 8-bit grayscale, row by row
+            with open(file, "wb") as f:
+                f.write(pixels)
 
-        for y in range(288):
-            for x in range(256):
-                img.putpixel((x, y), data2[x + (y * 256)])
+        elif image_format == "npy":
+            # NumPy array file format version 1.0
+            header = "{'descr': '|u1', 'fortran_order': False, 'shape': (%d, %d), }" % (IMAGE_HEIGHT, IMAGE_WIDTH)
+            header += " " * (63 - (len(header) + 10) % 64) + "\n"
+            with open(file, "wb") as f:
+                f.write(b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1"))
+                f.write(pixels)
+
+        elif image_format in ("bmp", "png"):
+            # Pillow is slow to import and needed only here
+            import PIL.Image
+
+            img = PIL.Image.frombytes('L', (IMAGE_WIDTH, IMAGE_HEIGHT), bytes(pixels))
+            img.save(file, image_format.upper())
+
+        else:
+            raise ValueError("Unknown image format")
 
-        img.save(file + ".bmp", "BMP")
+        return file
 
 
 class Image(Finger):
 
-    def upload_image(self, file):
+    def read_image(self, buffer=None, callback=None):
 
         """
-        Transfer image from ImageBuffer from sensor to host PC
+        Transfer image from ImageBuffer into memory.
+        Every data packet is written to its place in the buffer as soon as it arrives.
 
-        :param file: Name of the output file
-        :return: :raise Errors.StatusError: 0 on success, 1 on error
+        :param buffer: Writable buffer of IMAGE_SIZE bytes, for example mmap. None for new bytearray
+        :param callback: Called as callback(offset, data) after each data packet
+        :return: Memoryview of the packed image, 2 pixels per byte
+        :raise Errors.Error: If there is problem with the transfer
         """
-        image = []
+        if buffer is None:
+            buffer = bytearray(IMAGE_SIZE)
+        image = memoryview(buffer)[:IMAGE_SIZE]
 
-        packet = [0x0a]
-        try:
-            ret = self.com.transfer(packet, 12)
-            self.check_ok(ret[0])
-            sys.stderr.write("Downloading: ")
+        self._read_stream([0x0a], image, callback)
+        return image
 
-            count = 288 * (256 / packet_size)
-            for i in range(count):
-                if i != count - 1:
-                    data = self.com.read_packet(11 + packet_size // 2, StatusCodes.PacketType.Data.value)
-                else:
-                    data = self.com.read_packet(11 + packet_size // 2, StatusCodes.PacketType.EndData.value)
+    def upload_image(self, file, image_format="bmp"):
 
-                sys.stderr.write("\rDownloading: %.2f " % (i / (count - 1) * 100))
+        """
+        Transfer image from ImageBuffer from sensor to host PC.
+        Other formats than packed are unpacked while the rest of the image is received.
+        The file is written only after the whole image arrived.
 
-                if not data:
-                    raise Errors.StatusError("No data")
+        :param file: Name of the output file without extension
+        :param image_format: Output file format. One of IMAGE_FORMATS
+        :return: :raise Errors.StatusError: 0 on success, 1 on error
+        """
+        pixels = None if image_format == "packed" else bytearray(IMAGE_SIZE * 2)
 
-                image += data
+        def progress(offset, data):
+            if pixels is not None:
+                self.unpack_pixels(pixels, offset, data)
+            sys.stderr.write("\rDownloading: %.2f " % ((offset + len(data)) / IMAGE_SIZE * 100))
 
+        try:
+            sys.stderr.write("Downloading: ")
+            image = self.read_image(callback=progress)
             sys.stderr.write("OK\n")
-            self.create_image(image, file)
+
+            if pixels is None:
+                with open("%s.%s" % (file, image_format), "wb") as f:
+                    f.write(image)
+            else:
+                self.save_pixels(pixels, file, image_format)
             return 0
 
         except Errors.Error as err:
-            sys.stderr.write(err.msg + "\n")
-            return 1
+            return self.report_error(err)
 
 
 class Models(Finger):
 
+    def index_table(self, page):
+        """
+        Get page usage bitmap
+        :param page: Number of the page
+        :return: 32 bytes. Bit n of byte k is set when model page * 256 + k * 8 + n is used
+        :raise Errors.Error: If there is problem with the command
+        """
+        packet = [0x1f, page]
+        ret = self.com.transfer(packet)
+        self.check_ok(ret[0])
+        return bytes(ret[1:33])
+
     def get_storage_table(self, page):
         """
         Print page usage
         :param page: Number of the page
         :return: 0 for success, 1 for error
         """
-        packet = [0x1f, page]
-
         try:
-            ret = self.com.transfer(packet, 44)
-            self.check_ok(ret[0])
+            # Keep the indexes of the acknowledge
+            ret = b"\x00" + self.index_table(page)
 
             # Print usage table
             print("\t15 14 13 12 11 10 9  8  7  6  5  4  3  2  1  0")
@@ -191,8 +407,19 @@ class Models(Finger):
 
             return 0
         except Errors.Error as err:
-            sys.stderr.write(err.msg + "\n")
-            return 1
+            return self.report_error(err)
+
+    def model_count(self):
+        """
+        Get current models count
+
+        :return: Number of stored models
+        :raise Errors.Error: If there is problem with the command
+        """
+        packet = [0x1d]
+        ret = self.com.transfer(packet)
+        self.check_ok(ret[0])
+        return ret[1] << 8 | ret[2]
 
     def get_model_count(self):
         """
@@ -200,15 +427,11 @@ class Models(Finger):
 
         :return: 0 on success, 1 on error
         """
-        packet = [0x1d]
         try:
-            ret = self.com.transfer(packet, 14)
-            self.check_ok(ret[0])
-            sys.stderr.write("Models count: %d\n" % (ret[1] << 8 | ret[2]))
+            sys.stderr.write("Models count: %d\n" % self.model_count())
             return 0
         except Errors.Error as err:
-            sys.stderr.write(err.msg + "\n")
-            return 1
+            return self.report_error(err)
 
     def store_model(self, buffer_id, page_id):
         """
@@ -222,12 +445,32 @@ class Models(Finger):
         packet = [0x06, buffer_id] + self.u16_to_list(page_id)
 
         try:
-            ret = self.com.transfer(packet, 14)
+            ret = self.com.transfer(packet)
             self.check_ok(ret[0])
+            self.session.mark_pages(page_id, 1, True)
             return 0
         except Errors.Error as err:
-            sys.stderr.write(err.msg + "\n")
-            return 1
+            return self.report_error(err)
+
+    def store_free(self, buffer_id, start_page=0):
+        """
+        Store model in buffer1 or buffer2 to the first free page.
+        The free page is found in the occupancy map of the session.
+
+        :param buffer_id: Current BufferID
+        :param start_page: First page to consider
+        :return: Page the model is stored at
+        :raise Errors.StatusError: If there is no free page or the sensor rejects the model
+        :raise Errors.Error: If there is problem with the communication
+        """
+        page_id = self.session.occupancy().next_free(start_page)
+        if page_id is None:
+            raise Errors.StatusError("No free page in the database")
+
+        ret = self.com.transfer([0x06, buffer_id] + self.u16_to_list(page_id))
+        self.check_ok(ret[0])
+        self.session.mark_pages(page_id, 1, True)
+        return page_id
 
     def delete_model(self, start_id, count):
         """
@@ -239,12 +482,12 @@ class Models(Finger):
         packet = [0x0c] + self.u16_to_list(start_id) + self.u16_to_list(count)
 
         try:
-            self.check_ok(self.com.transfer(packet, 12)[0])
+            self.check_ok(self.com.transfer(packet)[0])
+            self.session.mark_pages(start_id, count, False)
             return 0
 
         except Errors.Error as err:
-            sys.stderr.write(err.msg + "\n")
-            return 1
+            return self.report_error(err)
 
     def empty_database(self):
         # Form packet to send
@@ -256,12 +499,12 @@ class Models(Finger):
         packet = [0x0d]
 
         try:
-            self.check_ok(self.com.transfer(packet, 12)[0])
+            self.check_ok(self.com.transfer(packet)[0])
+            self.session.mark_pages(0, None, False)
             return 0
 
         except Errors.Error as err:
-            sys.stderr.write(err.msg + "\n")
-            return 1
+            return self.report_error(err)
 
     def load_model(self, buffer_id, page_id):
 
@@ -275,12 +518,23 @@ class Models(Finger):
         packet = [0x07, buffer_id] + self.u16_to_list(page_id)
 
         try:
-            self.check_ok(self.com.transfer(packet, 12)[0])
+            self.check_ok(self.com.transfer(packet)[0])
             return 0
 
         except Errors.Error as err:
-            sys.stderr.write(err.msg + "\n")
-            return 1
+            return self.report_error(err)
+
+    def read_model(self, buffer_id):
+
+        """
+        Transfer content of buffer to the host
+        :param buffer_id: CharBufferID (1 or 2)
+        :return: Template bytes
+        :raise Errors.Error: If there is problem with the transfer
+        """
+        data = bytearray(TEMPLATE_SIZE)
+        self._read_stream([0x08, int(buffer_id)], memoryview(data))
+        return bytes(data)
 
     def upload_model(self, buffer_id, file):
 
@@ -290,31 +544,41 @@ class Models(Finger):
         :param file: Output file
         :return: 0 on success, 1 on error
         """
-        packet = [0x08, int(buffer_id)]
-        data = []
-
         try:
-            # Run
-            ret = self.com.transfer(packet, 12)
-            self.check_ok(ret[0])
-
-            # Read data
-            xfer_count = 512 // (packet_size // 2)
-            for i in range(xfer_count):
-                if i != xfer_count - 1:
-                    data += self.com.read_packet(packet_size // 2 + 11, StatusCodes.PacketType.Data.value)
-                else:
-                    data += self.com.read_packet(packet_size // 2 + 11, StatusCodes.PacketType.EndData.value)
+            data = self.read_model(buffer_id)
 
             # Write to file
             with open(file, 'wb') as f:
-                f.write(bytearray(data))
-                f.close()
+                f.write(data)
 
             return 0
         except Errors.Error as err:
-            sys.stderr.write(err.msg + "\n")
-            return 1
+            return self.report_error(err)
+
+    def write_model(self, buffer_id, data):
+
+        """
+        Transfer template to buffer
+        :param buffer_id: Number of char buffer
+        :param data: Template bytes
+        :raise Errors.Error: If there is problem with the transfer
+        """
+        packet = [0x09, int(buffer_id)]
+        packet_size = self._packet_size()
+        data = memoryview(data)
+
+        # Send command
+        ret = self.com.transfer(packet)
+        self.check_ok(ret[0])
+
+        # Send data
+        xfer_count = TEMPLATE_SIZE // packet_size
+        for i in range(xfer_count):
+            chunk = data[i * packet_size:(i + 1) * packet_size]
+            if i != xfer_count - 1:
+                self.com.send_packet(chunk, StatusCodes.PacketType.Data.value)
+            else:
+                self.com.send_packet(chunk, StatusCodes.PacketType.EndData.value)
 
     def download_model(self, buffer_id, file):
 
@@ -324,26 +588,28 @@ class Models(Finger):
         :param file: Input file
         :return: 0 on success, 1 on error
         """
-        packet = [0x09, int(buffer_id)]
-
         try:
-            # Send command
-            ret = self.com.transfer(packet, 12)
-            self.check_ok(ret[0])
-
-            # Send data
-            xfer_count = 512 // (packet_size // 2)
             with open(file, 'rb') as f:
-                for i in range(xfer_count):
-                    data = f.read(packet_size // 2)
-                    if i != xfer_count-1:
-                        self.com.send_packet(self.bytes_to_list(data), StatusCodes.PacketType.Data.value)
-                    else:
-                        self.com.send_packet(self.bytes_to_list(data), StatusCodes.PacketType.EndData.value)
+                data = f.read(TEMPLATE_SIZE)
+
+            self.write_model(buffer_id, data)
+            return 0
 
         except Errors.Error as err:
-            sys.stderr.write(err.msg + "\n")
-            return 1
+            return self.report_error(err)
+
+    def capture(self):
+        """
+        Take fingerprint image if there is finger on the sensor
+
+        :return: True if the image is in ImageBuffer, False if there is no finger
+        :raise Errors.Error: If the image fails or there is problem with the command
+        """
+        ret = self.com.transfer([0x01])
+        if ret[0] == StatusCodes.ConfirmationCode.NoFinger.value:
+            return False
+        self.check_ok(ret[0])
+        return True
 
     def generate_model(self):
         """
@@ -354,12 +620,27 @@ class Models(Finger):
         packet = [0x01]
 
         try:
-            self.check_ok(self.com.transfer(packet, 12)[0])
+            self.check_ok(self.com.transfer(packet)[0])
             return 0
 
         except Errors.Error as err:
-            sys.stderr.write(err.msg + "\n")
-            return 1
+            return self.report_error(err)
+
+    def extract(self, buffer_id):
+        """
+        Generate fingerprint characteristics from the image in ImageBuffer
+
+        :param buffer_id: CharBuffer
+        :return: True on success, False if the image is too messy, too small or invalid
+        :raise Errors.Error: If there is problem with the command
+        """
+        ret = self.com.transfer([0x02, buffer_id])
+        if ret[0] in (StatusCodes.ConfirmationCode.ImageMessy.value,
+                      StatusCodes.ConfirmationCode.ImageSmall.value,
+                      StatusCodes.ConfirmationCode.InvalidImage.value):
+            return False
+        self.check_ok(ret[0])
+        return True
 
     def generate_characteristics(self, buffer_id):
         """
@@ -369,12 +650,11 @@ class Models(Finger):
         """
         packet = [0x02, buffer_id]
         try:
-            self.check_ok(self.com.transfer(packet, 12)[0])
+            self.check_ok(self.com.transfer(packet)[0])
             return 0
 
         except Errors.Error as err:
-            sys.stderr.write(err.msg + "\n")
-            return 1
+            return self.report_error(err)
 
     def register_model(self):
         """
@@ -384,11 +664,22 @@ class Models(Finger):
         """
         packet = [0x05]
         try:
-            self.check_ok(self.com.transfer(packet, 12)[0])
+            self.check_ok(self.com.transfer(packet)[0])
             return 0
         except Errors.Error as err:
-            sys.stderr.write(err.msg + "\n")
-            return 1
+            return self.report_error(err)
+
+    def match_score(self):
+        """
+        Compare CharBuffer1 and CharBuffer2
+
+        :return: Match score
+        :raise Errors.Error: If the models don't match or there is problem with the command
+        """
+        packet = [0x03]
+        ret = self.com.transfer(packet)
+        self.check_ok(ret[0])
+        return ret[1] << 8 | ret[2]
 
     def match_model(self):
         """
@@ -396,39 +687,50 @@ class Models(Finger):
         Compare CharBuffer1 and CharBuffer2 for match
         :return:
         """
-        packet = [0x03]
         try:
-            ret = self.com.transfer(packet, 14)
-            self.check_ok(ret[0])
-
-            sys.stderr.write("Score: %d\n" % (ret[1] << 8 | ret[2]))
+            sys.stderr.write("Score: %d\n" % self.match_score())
             return 0
 
         except Errors.Error as err:
-            sys.stderr.write(err.msg + "\n")
-            return 1
+            return self.report_error(err)
 
-    def search_model(self, buffer_id, start_page, num_pages):
+    def find_model(self, buffer_id, start_page, num_pages):
         """
         Search for matching model in the database
         :param buffer_id: charBuffer number
         :param start_page: Start point in the database
         :param num_pages: Number of elements to search
-        :return: 0 on success, 1 on fail
+        :return: Tuple (page, score) or None if there is no match
+        :raise Errors.Error: If there is problem with the command
         """
         packet = [0x04, buffer_id] + self.u16_to_list(start_page) + self.u16_to_list(num_pages)
 
+        ret = self.com.transfer(packet)
+        if ret[0] == StatusCodes.ConfirmationCode.DintSearch.value:
+            return None
+        self.check_ok(ret[0])
+
+        return ret[1] << 8 | ret[2], ret[3] << 8 | ret[4]
+
+    def search_model(self, buffer_id, start_page, num_pages):
+        """
+        Search for matching model in the database
+        :param buffer_id: charBuffer number
+        :param start_page: Start point in the database
+        :param num_pages: Number of elements to search
+        :return: 0 on success, 1 on fail
+        """
         try:
-            ret = self.com.transfer(packet, 16)
-            self.check_ok(ret[0])
+            result = self.find_model(buffer_id, start_page, num_pages)
+            if result is None:
+                raise Errors.StatusError(Errors.Error.print_error(StatusCodes.ConfirmationCode.DintSearch.value))
 
-            sys.stderr.write("Page: %d\n" % (ret[1] << 8 | ret[2]))
-            sys.stderr.write("Score: %d\n" % (ret[3] << 8 | ret[4]))
+            sys.stderr.write("Page: %d\n" % result[0])
+            sys.stderr.write("Score: %d\n" % result[1])
             return 0
 
         except Errors.Error as err:
-            sys.stderr.write(err.msg + "\n")
-            return 1
+            return self.report_error(err)
 
 
 class System(Finger):
@@ -445,12 +747,11 @@ class System(Finger):
         packet = [0x13] + self.u32_to_list(self._password)
 
         try:
-            self.check_ok(self.com.transfer(packet, 12)[0])
+            self.check_ok(self.com.transfer(packet)[0])
             return 0
 
         except Errors.Error as err:
-            sys.stderr.write(err.msg + "\n")
-            return 1
+            return self.report_error(err)
 
     def set_password(self, password):
         """
@@ -465,12 +766,11 @@ class System(Finger):
         packet = [0x12] + self.u32_to_list(password)
 
         try:
-            self.check_ok(self.com.transfer(packet, 12)[0])
+            self.check_ok(self.com.transfer(packet)[0])
             return 0
 
         except Errors.Error as err:
-            sys.stderr.write(err.msg + "\n")
-            return 1
+            return self.report_error(err)
 
     def set_address(self, address):
         """
@@ -485,13 +785,27 @@ class System(Finger):
         packet = [0x15] + self.u32_to_list(address)
 
         try:
-            self.check_ok(self.com.transfer(packet, 12)[0])
+            self.check_ok(self.com.transfer(packet)[0])
+            self.session.invalidate()
             self.com.device_address = address
             return 0
 
         except Errors.Error as err:
-            sys.stderr.write(err.msg + "\n")
-            return 1
+            return self.report_error(err)
+
+    def system_params(self):
+        """
+        Read current system parameters and keep them in the session
+
+        :return: SystemParameters
+        :raise Errors.Error: If there is problem with the communication
+        """
+        ret = self.com.transfer([0x0f])
+        self.check_ok(ret[0])
+
+        params = SystemParameters.from_response(ret)
+        self.session.store_params(params)
+        return params
 
     def read_system_params(self):
         """
@@ -499,53 +813,40 @@ class System(Finger):
 
         :return: 0 on success, 1 on error
         """
-        packet = [0x0f]
-
         try:
-            ret = self.com.transfer(packet, 28)
-            self.check_ok(ret[0])
-
-            global system_id
-            system_id = ret[3] << 8 | ret[4]
-
-            global database_size
-            database_size = ret[5] << 8 | ret[6]
-
-            global secure_level
-            secure_level = ret[7] << 8 | ret[8]
-
-            global packet_size
-            packet_size = 32 * pow(2, (ret[13] << 8 | ret[14] + 1))
-
-            sys.stderr.write("Status register 0x%02x\n" % (ret[1] << 8 | ret[2]))
-            sys.stderr.write("System ID: 0x%04x\n" % system_id)
-            sys.stderr.write("Fingerprint database size: %d\n" % database_size)
-            sys.stderr.write("Security level: %d\n" % secure_level)
-            sys.stderr.write("Device address: 0x%08x\n" % (ret[9] << 24 | ret[10] << 16 | ret[11] << 8 | ret[12]))
-            sys.stderr.write("Packet size: %d bytes\n" % packet_size)
-            sys.stderr.write("Baudrate: %d bps\n" % (ret[15] << 8 | ret[16] * 9600))
+            params = self.system_params()
+
+            sys.stderr.write("Status register 0x%02x\n" % params.status_register)
+            sys.stderr.write("System ID: 0x%04x\n" % params.system_id)
+            sys.stderr.write("Fingerprint database size: %d\n" % params.database_size)
+            sys.stderr.write("Security level: %d\n" % params.security_level)
+            sys.stderr.write("Device address: 0x%08x\n" % params.device_address)
+            sys.stderr.write("Packet size: %d bytes\n" % params.packet_size)
+            sys.stderr.write("Baudrate: %d bps\n" % params.baud_rate)
             return 0
 
         except Errors.Error as err:
-            sys.stderr.write(err.msg + "\n")
-            return 1
+            return self.report_error(err)
 
     def set_baudrate(self, baudrate):
         """
-        Set new baudrate
-        :param baudrate: Communication speed
+        Set new baudrate. The port is switched to the new speed as well,
+        because the sensor answers at it from the next command on.
+
+        :param baudrate: Communication speed, multiple of 9600
+        :return: 0 on success, 1 on error
         """
         try:
             # Form packet to send
             packet = [0x0e, 4, baudrate//9600]
 
-            self.check_ok(self.com.transfer(packet, 12)[0])
-            # self.com.ser.setBaudrate = baudrate  Fixme: Do I need this?
+            self.check_ok(self.com.transfer(packet)[0])
+            self.session.invalidate()
+            self.com.baud_rate = baudrate
             return 0
 
         except Errors.Error as err:
-            sys.stderr.write(err.msg + "\n")
-            return 1
+            return self.report_error(err)
 
     def set_security(self, level):
         """
@@ -556,18 +857,18 @@ class System(Finger):
         packet = [0x0e, 5, level]
 
         try:
-            self.check_ok(self.com.transfer(packet, 12)[0])
+            self.check_ok(self.com.transfer(packet)[0])
+            self.session.invalidate()
             return 0
 
         except Errors.Error as err:
-            sys.stderr.write(err.msg + "\n")
-            return 1
+            return self.report_error(err)
 
     def set_packet(self, length):
 
         """
         Set packet length
-        :param length:
+        :param length: Data packet length in bytes (32, 64, 128 or 256)
         :return: 0 on success, 1 on error
         """
         if length == 32:
@@ -579,14 +880,14 @@ class System(Finger):
         else:
             code = 3
 
-        packet = [0x0e, 5, code]
+        packet = [0x0e, 6, code]
 
         try:
-            self.check_ok(self.com.transfer(packet, 12)[0])
+            self.check_ok(self.com.transfer(packet)[0])
+            self.session.invalidate()
             return 0
 
         except Errors.Error as err:
-            sys.stderr.write(err.msg + "\n")
-            return 1
+            return self.report_error(err)
 
 
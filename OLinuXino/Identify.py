@@ -0,0 +1,269 @@
+__author__ = "Stefan Mavrodiev"
+__copyright__ = "Copyright 2015, Olimex LTD"
+__credits__ = ["Stefan Mavrodiev"]
+__license__ = "GPL"
+__version__ = "2.0"
+__maintainer__ = __author__
+__email__ = "support@olimex.com"
+
+import argparse
+import sys
+import threading
+import time
+
+import Errors
+import Metrics
+import Presence
+import Session
+
+# Pipeline stages in execution order. Wait is the polling before the finger is placed
+STAGES = ("wait", "capture", "extract", "search")
+
+
+class Identification:
+
+    def __init__(self):
+
+        """
+        Result of one identification with the time spent in every stage
+        """
+        self.page = None
+        self.score = 0
+        self.captures = 0
+        self.polls = 0
+        self.stages = dict.fromkeys(STAGES, 0.0)
+
+    @property
+    def matched(self):
+        return self.page is not None
+
+    @property
+    def total(self):
+        return sum(self.stages.values())
+
+    @property
+    def latency(self):
+        """
+        Get time from placing the finger to the result in seconds
+        """
+        return self.total - self.stages["wait"]
+
+    def __str__(self):
+        result = "page %d, score %d" % (self.page, self.score) if self.matched else "no match"
+        stages = ", ".join("%s %.1f ms" % (stage, self.stages[stage] * 1000) for stage in STAGES)
+        return "%-22s latency %7.1f ms | %s | %d captures, %d polls" % (
+            result, self.latency * 1000, stages, self.captures, self.polls)
+
+
+class Identifier:
+
+    def __init__(self, session, buffer_id=1, start_page=0, num_pages=None, threshold=0, retries=2,
+                 watcher=None):
+
+        """
+        Capture, extract and search pipeline
+
+        :param session: Session.Session of the sensor
+        :param buffer_id: CharBuffer used for the features
+        :param start_page: First page to search
+        :param num_pages: Number of pages to search. None for the rest of the database
+        :param threshold: Lowest score accepted as match
+        :param retries: Additional captures when the image is unusable
+        :param watcher: Presence.FingerWatcher, None for new one
+        """
+        self.session = session
+        self.buffer_id = buffer_id
+        self.start_page = start_page
+        self.num_pages = num_pages
+        self.threshold = threshold
+        self.retries = retries
+        self.watcher = watcher or Presence.FingerWatcher(session)
+
+    def _process(self, result, event):
+        # Extract and search the image of the event. False if the image is unusable
+        models = self.session.models
+
+        result.captures += 1
+        result.polls += event.polls
+        result.stages["wait"] += event.waited - event.capture
+        result.stages["capture"] += event.capture
+
+        start = time.perf_counter()
+        usable = models.extract(self.buffer_id)
+        result.stages["extract"] += time.perf_counter() - start
+        if not usable:
+            return False
+
+        num_pages = self.num_pages
+        if num_pages is None:
+            num_pages = self.session.parameters().database_size - self.start_page
+
+        start = time.perf_counter()
+        match = models.find_model(self.buffer_id, self.start_page, num_pages)
+        result.stages["search"] += time.perf_counter() - start
+
+        if match is not None and match[1] >= self.threshold:
+            result.page, result.score = match
+        return True
+
+    def _identify(self, result, event, timeout, cancel):
+        # Process event, or wait for one, and capture again while the image is unusable
+        start = time.monotonic()
+
+        for _ in range(self.retries + 1):
+            if event is None:
+                remaining = None if timeout is None else max(0.0, timeout - (time.monotonic() - start))
+                begin = time.perf_counter()
+                try:
+                    event = self.watcher.wait(timeout=remaining, cancel=cancel)
+                except Errors.StatusError:
+                    # Image failed, for example finger moved. The failed poll can't be
+                    # told apart from the waiting before it, so all of it counts as wait
+                    result.captures += 1
+                    result.stages["wait"] += time.perf_counter() - begin
+                    continue
+                if event is None:
+                    return None
+            if self._process(result, event):
+                return result
+            event = None
+
+        raise Errors.StatusError("No usable image in %d captures" % result.captures)
+
+    def identify(self, timeout=None, cancel=None):
+        """
+        Wait for finger and search it in the database.
+        Unusable images are captured again up to retries times.
+
+        :param timeout: Longest wait for the finger in seconds, None for no limit
+        :param cancel: threading.Event that stops the wait when set
+        :return: Identification or None if no finger was placed
+        :raise Errors.StatusError: If no capture gave usable image
+        :raise Errors.Error: If there is problem with the communication
+        """
+        return self._identify(Identification(), None, timeout, cancel)
+
+    def run(self, callback, cancel):
+        """
+        Access control loop. Identify every touch until cancel is set.
+        The finger must be lifted before the next touch is identified.
+        Unusable images are captured again up to retries times while the finger stays.
+
+        :param callback: Called as callback(Identification) for every usable touch
+        :param cancel: threading.Event that stops the loop
+        :raise Errors.ReadError: If there is problem with the communication
+        """
+        def on_finger(event):
+            try:
+                # Timeout 0 captures again only if the finger is still there
+                result = self._identify(Identification(), event, 0, cancel)
+            except Errors.StatusError:
+                return
+            if result is not None:
+                callback(result)
+
+        self.watcher.watch(on_finger, cancel)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Identify fingers with per-stage timing",
+                                     prog="FingerPrint-identify")
+
+    parser.add_argument("-p", "--port",
+                        action="store",
+                        required=True,
+                        help="Communication port or pyserial URL to use")
+    parser.add_argument("--baudrate",
+                        action="store",
+                        type=int,
+                        default=57600,
+                        help="Set communication speed. Default: 57600")
+    parser.add_argument("--password",
+                        action="store",
+                        type=lambda value: int(value, 16),
+                        default=0x00000000,
+                        help="Sensor password. Default: 0x00000000")
+    parser.add_argument("--address",
+                        action="store",
+                        type=lambda value: int(value, 16),
+                        default=0xFFFFFFFF,
+                        help="Sensor address. Default: 0xffffffff")
+    parser.add_argument("--low-latency",
+                        action="store_true",
+                        help="Don't flush the port and wait 10 ms before every command")
+    parser.add_argument("--params-cache",
+                        action="store",
+                        metavar="FILE",
+                        help="Keep sensor parameters in FILE between runs")
+    parser.add_argument("--loop",
+                        action="store_true",
+                        help="Identify every touch until interrupted")
+    parser.add_argument("--metrics-file",
+                        action="store",
+                        metavar="FILE",
+                        help="Write Prometheus metrics to FILE after every touch in the loop")
+    parser.add_argument("--timeout",
+                        action="store",
+                        type=float,
+                        default=10.0,
+                        help="Wait for finger at most this many seconds. Default: 10")
+    parser.add_argument("--threshold",
+                        action="store",
+                        type=int,
+                        default=0,
+                        help="Lowest score accepted as match. Default: 0")
+    parser.add_argument("--start",
+                        action="store",
+                        type=int,
+                        default=0,
+                        help="First page to search. Default: 0")
+    parser.add_argument("--count",
+                        action="store",
+                        type=int,
+                        help="Number of pages to search. Default: the rest of the database")
+
+    args = parser.parse_args()
+
+    try:
+        session = Session.Session(args.port, baud=args.baudrate, password=args.password, address=args.address,
+                                  low_latency=args.low_latency, params_cache=args.params_cache)
+    except IOError as err:
+        print(err)
+        return 1
+
+    with session:
+        if session.system.verify_password():
+            return 1
+
+        identifier = Identifier(session, start_page=args.start, num_pages=args.count, threshold=args.threshold)
+
+        try:
+            if args.loop:
+                def report(result):
+                    print(result)
+                    sys.stdout.flush()
+                    if args.metrics_file is not None:
+                        Metrics.write([session], args.metrics_file)
+
+                cancel = threading.Event()
+                try:
+                    identifier.run(report, cancel)
+                except KeyboardInterrupt:
+                    cancel.set()
+                return 0
+
+            result = identifier.identify(timeout=args.timeout)
+        except Errors.Error as err:
+            print(err.msg)
+            return 1
+
+    if result is None:
+        print("No finger placed in %g s" % args.timeout)
+        return 1
+
+    print(result)
+    return 0 if result.matched else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,388 @@
+__author__ = "Stefan Mavrodiev"
+__copyright__ = "Copyright 2015, Olimex LTD"
+__credits__ = ["Stefan Mavrodiev"]
+__license__ = "GPL"
+__version__ = "2.0"
+__maintainer__ = __author__
+__email__ = "support@olimex.com"
+
+import collections
+import json
+import os
+import threading
+
+from StatusCodes import ConfirmationCode
+
+# Instruction code -> name used in the exported metrics
+COMMAND_NAMES = {
+    0x01: "GenImg",
+    0x02: "Img2Tz",
+    0x03: "Match",
+    0x04: "Search",
+    0x05: "RegModel",
+    0x06: "Store",
+    0x07: "LoadChar",
+    0x08: "UpChar",
+    0x09: "DownChar",
+    0x0a: "UpImage",
+    0x0b: "DownImage",
+    0x0c: "DeleteChar",
+    0x0d: "Empty",
+    0x0e: "SetSysPara",
+    0x0f: "ReadSysPara",
+    0x12: "SetPwd",
+    0x13: "VfyPwd",
+    0x14: "GetRandomCode",
+    0x15: "SetAdr",
+    0x17: "Control",
+    0x18: "WriteNotepad",
+    0x19: "ReadNotepad",
+    0x1d: "TemplateNum",
+    0x1f: "ReadIndexTable",
+}
+
+# Upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_code_names = {code.value: code.name for code in ConfirmationCode}
+
+
+def command_name(command):
+    return COMMAND_NAMES.get(command, "0x%02x" % command)
+
+
+def code_name(code):
+    return _code_names.get(code, "0x%02x" % code)
+
+
+class Histogram:
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+
+        """
+        Latency histogram with fixed buckets
+
+        :param buckets: Upper bounds in seconds, ascending
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """
+        Add one measurement
+        :param value: Latency in seconds
+        """
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        """
+        Get (upper bound, count of values up to it) pairs. The last bound is +Inf
+        """
+        total = 0
+        pairs = []
+        for bound, count in zip(list(self.buckets) + [float("inf")], self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+
+class Metrics:
+
+    def __init__(self, decoder=None):
+
+        """
+        Counters of one connection
+
+        :param decoder: Codec.FrameDecoder whose checksum and garbage counters are reported
+        """
+        self.decoder = decoder
+        self._lock = threading.Lock()
+
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.frames_sent = 0
+        self.frames_received = 0
+        self.header_errors = 0
+        self.timeouts = 0
+        # Image and template bytes delivered by bulk transfers, without repeated frames
+        self.payload_bytes = 0
+
+        # Command code -> Histogram of successful transfers
+        self.latency = collections.defaultdict(Histogram)
+        # Command code -> Counter of confirmation codes
+        self.outcomes = collections.defaultdict(collections.Counter)
+        # Command code -> number of transfers without acknowledge
+        self.failures = collections.Counter()
+        # Command code -> number of repeats after read errors
+        self.retries = collections.Counter()
+        # Command code -> number of bulk transfers restarted after broken data frame
+        self.restarts = collections.Counter()
+
+    def sent(self, length):
+        with self._lock:
+            self.bytes_sent += length
+            self.frames_sent += 1
+
+    def received(self, length):
+        with self._lock:
+            self.bytes_received += length
+
+    def frame(self):
+        with self._lock:
+            self.frames_received += 1
+
+    def header_error(self):
+        with self._lock:
+            self.header_errors += 1
+
+    def timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def command(self, command, elapsed, code):
+        """
+        Record acknowledged command
+
+        :param command: Instruction code
+        :param elapsed: Time from sending the command to the acknowledge in seconds
+        :param code: Confirmation code
+        """
+        with self._lock:
+            self.latency[command].observe(elapsed)
+            self.outcomes[command][code] += 1
+
+    def failure(self, command):
+        """
+        Record command without valid acknowledge
+        :param command: Instruction code
+        """
+        with self._lock:
+            self.failures[command] += 1
+
+    def retry(self, command):
+        """
+        Record repeat of command
+        :param command: Instruction code
+        """
+        with self._lock:
+            self.retries[command] += 1
+
+    def restart(self, command):
+        """
+        Record restart of bulk transfer
+        :param command: Instruction code of the upload command
+        """
+        with self._lock:
+            self.restarts[command] += 1
+
+    def payload(self, length):
+        with self._lock:
+            self.payload_bytes += length
+
+    def snapshot(self):
+        """
+        Get all counters as dictionary, suitable for JSON
+        """
+        with self._lock:
+            commands = {}
+            for command in sorted(set(self.latency) | set(self.failures) | set(self.retries)):
+                histogram = self.latency.get(command) or Histogram()
+                commands[command_name(command)] = {
+                    "count": histogram.count,
+                    "failures": self.failures[command],
+                    "retries": self.retries[command],
+                    "restarts": self.restarts[command],
+                    "latency_sum": histogram.sum,
+                    "latency_buckets": [["+Inf" if bound == float("inf") else bound, count]
+                                        for bound, count in histogram.cumulative()],
+                    "outcomes": {code_name(code): count for code, count in sorted(self.outcomes[command].items())},
+                }
+
+            return {
+                "bytes_sent": self.bytes_sent,
+                "bytes_received": self.bytes_received,
+                "frames_sent": self.frames_sent,
+                "frames_received": self.frames_received,
+                "header_errors": self.header_errors,
+                "timeouts": self.timeouts,
+                "payload_bytes": self.payload_bytes,
+                "checksum_errors": self.decoder.checksum_errors if self.decoder else 0,
+                "discarded_bytes": self.decoder.discarded if self.decoder else 0,
+                "commands": commands,
+            }
+
+
+def session_labels(session):
+    """
+    Get labels identifying session in the exported metrics
+    :param session: Session.Session
+    :return: Dictionary of labels
+    """
+    return {"port": session.port, "address": "0x%08x" % session.address}
+
+
+def to_json(sessions):
+    """
+    Export metrics of sessions as JSON
+
+    :param sessions: List of Session.Session
+    :return: JSON text
+    """
+    return json.dumps([dict(session_labels(session), metrics=session.com.metrics.snapshot())
+                       for session in sessions], indent=1)
+
+
+def _labels(labels):
+    return "{" + ",".join('%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+                          for name, value in labels.items()) + "}"
+
+
+def to_prometheus(sessions):
+    """
+    Export metrics of sessions in Prometheus text format
+
+    :param sessions: List of Session.Session
+    :return: Text
+    """
+    counters = (
+        ("bytes_sent", "fingerprint_bytes_sent_total", "Bytes written to the port"),
+        ("bytes_received", "fingerprint_bytes_received_total", "Bytes read from the port"),
+        ("frames_sent", "fingerprint_frames_sent_total", "Frames written to the port"),
+        ("frames_received", "fingerprint_frames_received_total", "Complete frames received"),
+        ("checksum_errors", "fingerprint_checksum_errors_total", "Received frames with wrong checksum"),
+        ("header_errors", "fingerprint_header_errors_total", "Frames with wrong address or packet type"),
+        ("discarded_bytes", "fingerprint_discarded_bytes_total", "Received bytes outside of valid frames"),
+        ("timeouts", "fingerprint_timeouts_total", "Reads that returned no data"),
+        ("payload_bytes", "fingerprint_payload_bytes_total", "Image and template bytes delivered by bulk transfers"),
+    )
+
+    snapshots = [(session_labels(session), session.com.metrics.snapshot()) for session in sessions]
+    lines = []
+
+    for key, name, description in counters:
+        lines.append("# HELP %s %s" % (name, description))
+        lines.append("# TYPE %s counter" % name)
+        for labels, snapshot in snapshots:
+            lines.append("%s%s %d" % (name, _labels(labels), snapshot[key]))
+
+    lines.append("# HELP fingerprint_command_seconds Time from command to acknowledge")
+    lines.append("# TYPE fingerprint_command_seconds histogram")
+    for labels, snapshot in snapshots:
+        for command, values in snapshot["commands"].items():
+            command_labels = dict(labels, command=command)
+            for bound, count in values["latency_buckets"]:
+                lines.append("fingerprint_command_seconds_bucket%s %d" % (
+                    _labels(dict(command_labels, le=bound)), count))
+            lines.append("fingerprint_command_seconds_sum%s %f" % (_labels(command_labels), values["latency_sum"]))
+            lines.append("fingerprint_command_seconds_count%s %d" % (_labels(command_labels), values["count"]))
+
+    lines.append("# HELP fingerprint_command_failures_total Commands without valid acknowledge")
+    lines.append("# TYPE fingerprint_command_failures_total counter")
+    for labels, snapshot in snapshots:
+        for command, values in snapshot["commands"].items():
+            lines.append("fingerprint_command_failures_total%s %d" % (
+                _labels(dict(labels, command=command)), values["failures"]))
+
+    lines.append("# HELP fingerprint_command_retries_total Commands sent again after read error")
+    lines.append("# TYPE fingerprint_command_retries_total counter")
+    for labels, snapshot in snapshots:
+        for command, values in snapshot["commands"].items():
+            lines.append("fingerprint_command_retries_total%s %d" % (
+                _labels(dict(labels, command=command)), values["retries"]))
+
+    lines.append("# HELP fingerprint_transfer_restarts_total Bulk transfers resumed after broken data frame")
+    lines.append("# TYPE fingerprint_transfer_restarts_total counter")
+    for labels, snapshot in snapshots:
+        for command, values in snapshot["commands"].items():
+            lines.append("fingerprint_transfer_restarts_total%s %d" % (
+                _labels(dict(labels, command=command)), values["restarts"]))
+
+    lines.append("# HELP fingerprint_confirmation_total Acknowledges by confirmation code")
+    lines.append("# TYPE fingerprint_confirmation_total counter")
+    for labels, snapshot in snapshots:
+        for command, values in snapshot["commands"].items():
+            for code, count in values["outcomes"].items():
+                lines.append("fingerprint_confirmation_total%s %d" % (
+                    _labels(dict(labels, command=command, code=code)), count))
+
+    return "\n".join(lines) + "\n"
+
+
+def write(sessions, file, format="prometheus"):
+    """
+    Write metrics to file atomically, for example for node exporter textfile collector
+
+    :param sessions: List of Session.Session
+    :param file: Output file name
+    :param format: "prometheus" or "json"
+    """
+    text = to_json(sessions) if format == "json" else to_prometheus(sessions)
+    with open(file + ".tmp", "w") as f:
+        f.write(text)
+    os.replace(file + ".tmp", file)
+
+
+class MetricsServer:
+
+    def __init__(self, sessions, port, host="127.0.0.1"):
+
+        """
+        Serve metrics over HTTP, Prometheus text at /metrics and JSON at /metrics.json.
+        http.server is imported only here, it is slow to import and most runs don't serve.
+
+        :param sessions: List of Session.Session
+        :param port: Listen port
+        :param host: Listen address
+        """
+        import http.server
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body = to_prometheus(sessions).encode()
+                    content_type = "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body = to_json(sessions).encode()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.sessions = sessions
+        self._server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def server_address(self):
+        return self._server.server_address
+
+    def start(self):
+        """
+        Serve in background thread
+        :return: self
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
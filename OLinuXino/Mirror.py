@@ -0,0 +1,156 @@
+__author__ = "Stefan Mavrodiev"
+__copyright__ = "Copyright 2015, Olimex LTD"
+__credits__ = ["Stefan Mavrodiev"]
+__license__ = "GPL"
+__version__ = "2.0"
+__maintainer__ = __author__
+__email__ = "support@olimex.com"
+
+import hashlib
+import json
+import os
+import time
+
+
+def read_occupancy(session):
+    """
+    Read which pages are used on the sensor. The occupancy map of the session is refreshed
+
+    :param session: Session.Session of the sensor
+    :return: Set of page ids
+    :raise Errors.Error: If there is problem with the communication
+    """
+    return set(session.occupancy(refresh=True))
+
+
+class SyncResult:
+
+    def __init__(self):
+
+        """
+        Statistics of one synchronization
+        """
+        self.added = []
+        self.changed = []
+        self.removed = []
+        self.unchanged = 0
+        self.transferred = 0
+        self.elapsed = 0.0
+
+    def __str__(self):
+        return "added %d, changed %d, removed %d, unchanged %d, %d templates transferred in %.2f s" % (
+            len(self.added), len(self.changed), len(self.removed), self.unchanged, self.transferred, self.elapsed)
+
+
+class TemplateMirror:
+
+    # Name of the index file in the mirror directory
+    _index_name = "index.json"
+
+    def __init__(self, session, directory, buffer_id=1):
+
+        """
+        Local copy of the sensor template library.
+        Templates are kept as one file per page with SHA-256 hashes in index.json.
+
+        :param session: Session.Session of the sensor
+        :param directory: Directory of the mirror. Created if missing
+        :param buffer_id: CharBuffer used for loading templates. Its content is lost
+        """
+        self.session = session
+        self.directory = directory
+        self.buffer_id = buffer_id
+
+        os.makedirs(directory, exist_ok=True)
+
+        # Page id -> hash of the mirrored template
+        self.pages = {}
+
+        index = os.path.join(directory, self._index_name)
+        if os.path.exists(index):
+            with open(index) as f:
+                state = json.load(f)
+            if state.get("address") == session.address:
+                self.pages = {int(page): digest for page, digest in state["pages"].items()}
+
+    def path(self, page):
+        """
+        Get file name of mirrored template
+        :param page: Page id
+        :return: Path of the file
+        """
+        return os.path.join(self.directory, "%04d.bin" % page)
+
+    def template(self, page):
+        """
+        Read mirrored template
+        :param page: Page id
+        :return: Template bytes
+        """
+        with open(self.path(page), "rb") as f:
+            return f.read()
+
+    def _save_index(self):
+        index = os.path.join(self.directory, self._index_name)
+        with open(index + ".tmp", "w") as f:
+            json.dump({"address": self.session.address,
+                       "pages": {str(page): digest for page, digest in sorted(self.pages.items())}}, f, indent=1)
+        os.replace(index + ".tmp", index)
+
+    def _fetch(self, page):
+        models = self.session.models
+        if models.load_model(self.buffer_id, page):
+            raise models.last_error
+        return models.read_model(self.buffer_id)
+
+    def sync(self, verify=False):
+        """
+        Bring the mirror up to date.
+        Only pages that became used are transferred, unless verify is set.
+
+        :param verify: Transfer all used pages and compare the hashes
+        :return: SyncResult
+        :raise Errors.Error: If there is problem with the communication
+        """
+        start = time.perf_counter()
+        result = SyncResult()
+
+        self.session.parameters()
+
+        occupied = read_occupancy(self.session)
+
+        for page in sorted(occupied):
+            if page in self.pages and not verify:
+                result.unchanged += 1
+                continue
+
+            data = self._fetch(page)
+            result.transferred += 1
+            digest = hashlib.sha256(data).hexdigest()
+
+            if self.pages.get(page) == digest:
+                result.unchanged += 1
+                continue
+
+            if page in self.pages:
+                result.changed.append(page)
+            else:
+                result.added.append(page)
+
+            with open(self.path(page), "wb") as f:
+                f.write(data)
+            self.pages[page] = digest
+
+            # Keep progress if the sync is interrupted
+            if (len(result.added) + len(result.changed)) % 64 == 0:
+                self._save_index()
+
+        for page in sorted(set(self.pages) - occupied):
+            result.removed.append(page)
+            del self.pages[page]
+            if os.path.exists(self.path(page)):
+                os.remove(self.path(page))
+
+        self._save_index()
+        result.elapsed = time.perf_counter() - start
+        return result
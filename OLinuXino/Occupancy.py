@@ -0,0 +1,174 @@
+__author__ = "Stefan Mavrodiev"
+__copyright__ = "Copyright 2015, Olimex LTD"
+__credits__ = ["Stefan Mavrodiev"]
+__license__ = "GPL"
+__version__ = "2.0"
+__maintainer__ = __author__
+__email__ = "support@olimex.com"
+
+# Models described by one index table page
+PAGE_MODELS = 256
+
+
+def _bits(value):
+    return bin(value).count("1")
+
+
+class OccupancyMap:
+
+    def __init__(self, size, bitmap=b""):
+
+        """
+        Used pages of the model database, one bit per page.
+        The layout is the one of the index table: bit n of byte k is set
+        when page k * 8 + n is used, so the index table pages put one after
+        another are the bitmap.
+
+        :param size: Database size in pages
+        :param bitmap: Initial bitmap. Missing bytes are free pages, bits past size are ignored
+        """
+        self.size = size
+        self._bitmap = bytearray((size + 7) // 8)
+        self._bitmap[:] = bytes(bitmap[:len(self._bitmap)]).ljust(len(self._bitmap), b"\x00")
+        if size % 8:
+            self._bitmap[-1] &= (1 << size % 8) - 1
+
+        self._count = sum(_bits(value) for value in self._bitmap)
+
+        # Every page below is used. Keeps the search for free page short while enrolling
+        self._free_hint = 0
+
+    @classmethod
+    def read(cls, models, size):
+        """
+        Read the index table of the sensor
+
+        :param models: Finger.Models of the sensor
+        :param size: Database size in pages
+        :return: OccupancyMap
+        :raise Errors.Error: If there is problem with the communication
+        """
+        tables = b"".join(models.index_table(page) for page in range((size + PAGE_MODELS - 1) // PAGE_MODELS))
+        return cls(size, tables)
+
+    def _check(self, page):
+        if not 0 <= page < self.size:
+            raise ValueError("Page %d is outside of the database" % page)
+
+    def __contains__(self, page):
+        return 0 <= page < self.size and bool(self._bitmap[page >> 3] & (1 << (page & 7)))
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for index, value in enumerate(self._bitmap):
+            while value:
+                low = value & -value
+                yield index * 8 + low.bit_length() - 1
+                value ^= low
+
+    @property
+    def free(self):
+        """
+        Get number of free pages
+        """
+        return self.size - self._count
+
+    def to_bytes(self):
+        """
+        Get the bitmap in index table layout
+        """
+        return bytes(self._bitmap)
+
+    def mark(self, start, count=1, used=True):
+        """
+        Set pages as used or free
+
+        :param start: First page
+        :param count: Number of pages. None for all pages from start
+        :param used: New state of the pages
+        :raise ValueError: If the pages are outside of the database
+        """
+        if count is None:
+            count = self.size - start
+        if count <= 0:
+            return
+        self._check(start)
+        self._check(start + count - 1)
+
+        for page in range(start, start + count):
+            mask = 1 << (page & 7)
+            value = self._bitmap[page >> 3]
+            if used and not value & mask:
+                self._bitmap[page >> 3] = value | mask
+                self._count += 1
+            elif not used and value & mask:
+                self._bitmap[page >> 3] = value & ~mask
+                self._count -= 1
+
+        if not used:
+            self._free_hint = min(self._free_hint, start)
+
+    def clear(self):
+        """
+        Set all pages as free
+        """
+        self._bitmap[:] = bytes(len(self._bitmap))
+        self._count = 0
+        self._free_hint = 0
+
+    def next_free(self, start=0):
+        """
+        Find the first free page. Full bytes are skipped, and pages known to be
+        used from the previous searches are not checked again.
+
+        :param start: First page to consider
+        :return: Page or None if all pages from start are used
+        """
+        page = max(start, self._free_hint)
+        index = page >> 3
+
+        while index < len(self._bitmap):
+            value = self._bitmap[index]
+            if value != 0xFF:
+                for bit in range(page & 7 if index == page >> 3 else 0, 8):
+                    found = index * 8 + bit
+                    if found >= self.size:
+                        break
+                    if not value & (1 << bit):
+                        if start <= self._free_hint:
+                            self._free_hint = found
+                        return found
+            index += 1
+
+        if start <= self._free_hint:
+            self._free_hint = self.size
+        return None
+
+    def ranges(self, start=0, count=None, used=True):
+        """
+        Get runs of used or free pages
+
+        :param start: First page to consider
+        :param count: Number of pages to consider. None for the rest of the database
+        :param used: True for used runs, False for free ones
+        :return: List of (first page, number of pages) tuples
+        """
+        end = self.size if count is None else min(self.size, start + count)
+        runs = []
+        first = None
+        for page in range(max(0, start), end):
+            if (page in self) == used:
+                if first is None:
+                    first = page
+            elif first is not None:
+                runs.append((first, page - first))
+                first = None
+        if first is not None:
+            runs.append((first, end - first))
+        return runs
+
+    def __str__(self):
+        return ", ".join("%d" % first if length == 1 else "%d-%d" % (first, first + length - 1)
+                         for first, length in self.ranges())
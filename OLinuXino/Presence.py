@@ -0,0 +1,158 @@
+__author__ = "Stefan Mavrodiev"
+__copyright__ = "Copyright 2015, Olimex LTD"
+__credits__ = ["Stefan Mavrodiev"]
+__license__ = "GPL"
+__version__ = "2.0"
+__maintainer__ = __author__
+__email__ = "support@olimex.com"
+
+import threading
+import time
+
+import Errors
+
+
+class FingerEvent:
+
+    def __init__(self, timestamp, polls, waited, capture=0.0):
+
+        """
+        Finger detected on the sensor. Its image is in ImageBuffer.
+
+        :param timestamp: time.time() of the detection
+        :param polls: Number of GenImg commands sent while waiting
+        :param waited: Time spent waiting in seconds, including the capture
+        :param capture: Time of the GenImg command that took the image in seconds
+        """
+        self.timestamp = timestamp
+        self.polls = polls
+        self.waited = waited
+        self.capture = capture
+
+    def __str__(self):
+        return "finger after %.2f s, %d polls" % (self.waited, self.polls)
+
+
+class FingerWatcher:
+
+    def __init__(self, session, min_interval=0.0, max_interval=0.5, backoff=1.5, active_period=5.0):
+
+        """
+        Wait for finger by polling GenImg. No finger is a normal state, not error.
+        The poll interval is min_interval while the sensor was used recently and grows
+        by the backoff factor up to max_interval when it stays idle.
+
+        :param session: Session.Session of the sensor
+        :param min_interval: Pause between polls right after activity in seconds
+        :param max_interval: Longest pause between polls in seconds
+        :param backoff: Multiplier of the pause after every empty poll once idle
+        :param active_period: Time after the last finger during which polling stays fast
+        """
+        self.session = session
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.active_period = active_period
+
+        self.interval = min_interval
+        self.last_finger = None
+        self.polls = 0
+
+    def _idle(self):
+        return self.last_finger is None or time.monotonic() - self.last_finger > self.active_period
+
+    def _next_interval(self):
+        if not self._idle():
+            return self.min_interval
+        return min(max(self.interval, 0.01) * self.backoff, self.max_interval)
+
+    def activity(self):
+        """
+        Mark the sensor as used, so the next waits poll fast
+        """
+        self.last_finger = time.monotonic()
+        self.interval = self.min_interval
+
+    def wait(self, timeout=None, cancel=None):
+        """
+        Wait until finger is placed on the sensor
+
+        :param timeout: Longest wait in seconds, None for no limit
+        :param cancel: threading.Event that stops the wait when set
+        :return: FingerEvent or None on timeout or cancellation
+        :raise Errors.Error: If the image fails or there is problem with the communication
+        """
+        if cancel is None:
+            cancel = threading.Event()
+
+        start = time.monotonic()
+        polls = 0
+        while not cancel.is_set():
+            polls += 1
+            self.polls += 1
+            poll = time.monotonic()
+            if self.session.models.capture():
+                self.activity()
+                now = time.monotonic()
+                return FingerEvent(time.time(), polls, now - start, now - poll)
+
+            self.interval = self._next_interval()
+            pause = self.interval
+            if timeout is not None:
+                remaining = timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    break
+                pause = min(pause, remaining)
+
+            if pause:
+                cancel.wait(pause)
+        return None
+
+    def wait_removed(self, timeout=None, cancel=None):
+        """
+        Wait until the finger is lifted from the sensor
+
+        :param timeout: Longest wait in seconds, None for no limit
+        :param cancel: threading.Event that stops the wait when set
+        :return: True when the finger is lifted, False on timeout or cancellation
+        :raise Errors.Error: If there is problem with the communication
+        """
+        if cancel is None:
+            cancel = threading.Event()
+
+        start = time.monotonic()
+        while not cancel.is_set():
+            self.polls += 1
+            try:
+                present = self.session.models.capture()
+            except Errors.StatusError:
+                # Image often fails while the finger is being lifted. Poll again
+                present = True
+            if not present:
+                self.activity()
+                return True
+            if timeout is not None and time.monotonic() - start >= timeout:
+                break
+            if self.min_interval:
+                cancel.wait(self.min_interval)
+        return False
+
+    def watch(self, callback, cancel):
+        """
+        Call callback for every touch until cancel is set.
+        The finger must be lifted before the next touch is reported.
+
+        :param callback: Called as callback(FingerEvent) with the image in ImageBuffer
+        :param cancel: threading.Event that stops watching
+        :raise Errors.ReadError: If there is problem with the communication
+        """
+        while not cancel.is_set():
+            try:
+                event = self.wait(cancel=cancel)
+            except Errors.StatusError:
+                # Bad image, for example finger moved. Keep watching
+                continue
+            if event is None:
+                break
+            callback(event)
+            self.wait_removed(cancel=cancel)
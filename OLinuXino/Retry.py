@@ -0,0 +1,71 @@
+__author__ = "Stefan Mavrodiev"
+__copyright__ = "Copyright 2015, Olimex LTD"
+__credits__ = ["Stefan Mavrodiev"]
+__license__ = "GPL"
+__version__ = "2.0"
+__maintainer__ = __author__
+__email__ = "support@olimex.com"
+
+# Commands that give the same result when sent twice, so a lost acknowledge
+# can be repaired by sending them again. Left out are the commands whose repeat
+# changes the outcome: GenImg takes a new image, RegModel combines buffers it
+# has already replaced, DownChar makes the sensor wait for data frames once it
+# is acknowledged, SetSysPara, SetPwd and SetAdr change how the sensor has to be
+# addressed, GetRandomCode and Control.
+IDEMPOTENT = frozenset((
+    0x02,  # Img2Tz
+    0x03,  # Match
+    0x04,  # Search
+    0x06,  # Store
+    0x07,  # LoadChar
+    0x08,  # UpChar
+    0x0a,  # UpImage
+    0x0c,  # DeleteChar
+    0x0d,  # Empty
+    0x0f,  # ReadSysPara
+    0x13,  # VfyPwd
+    0x18,  # WriteNotepad
+    0x19,  # ReadNotepad
+    0x1d,  # TemplateNum
+    0x1f,  # ReadIndexTable
+))
+
+
+class RetryPolicy:
+
+    def __init__(self, attempts=3, delay=0.02, factor=2.0, max_delay=0.5, idempotent=IDEMPOTENT):
+
+        """
+        How often and how fast commands are repeated after communication errors.
+        Only read errors are repeated, status codes reported by the sensor are final.
+
+        :param attempts: Repeats of one command, and restarts of one bulk transfer without progress
+        :param delay: Pause before the first repeat in seconds
+        :param factor: Multiplier of the pause for every next repeat
+        :param max_delay: Longest pause in seconds
+        :param idempotent: Command codes that may be repeated
+        """
+        self.attempts = attempts
+        self.delay = delay
+        self.factor = factor
+        self.max_delay = max_delay
+        self.idempotent = idempotent
+
+    def retries(self, command):
+        """
+        Get number of repeats allowed for command
+        :param command: Instruction code
+        """
+        return self.attempts if command in self.idempotent else 0
+
+    def pause(self, attempt):
+        """
+        Get pause before repeat
+        :param attempt: Number of the repeat, starting from 1
+        :return: Time in seconds
+        """
+        return min(self.delay * self.factor ** (attempt - 1), self.max_delay)
+
+
+# Policy for measurements that must see every error
+NEVER = RetryPolicy(attempts=0)
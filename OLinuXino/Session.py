@@ -0,0 +1,203 @@
+__author__ = "Stefan Mavrodiev"
+__copyright__ = "Copyright 2015, Olimex LTD"
+__credits__ = ["Stefan Mavrodiev"]
+__license__ = "GPL"
+__version__ = "2.0"
+__maintainer__ = __author__
+__email__ = "support@olimex.com"
+
+import json
+import os
+import sys
+
+import Communication
+import Finger
+import Occupancy
+
+
+class Session:
+
+    def __init__(self, port, baud=57600, password=0x00000000, address=0xffffffff, low_latency=False,
+                 params_cache=None):
+
+        """
+        Single connection to a sensor shared by the system, model and image operations
+
+        :param port: Communication port or pyserial URL
+        :param baud: Communication speed
+        :param password: Sensor password
+        :param address: Sensor address
+        :param low_latency: Skip the flush and delay before every command
+        :param params_cache: JSON file keeping the parameters between runs, or None
+        :raise IOError: If the port can't be opened
+        """
+        self.port = port
+        self.password = password
+        self.params_cache = params_cache
+
+        self.com = Communication.Communication(port=port, device_address=address, baud_rate=baud,
+                                               low_latency=low_latency)
+
+        # Sensor parameters, set by System.read_system_params
+        self.params = self._load_params()
+
+        # Used pages of the model database, read when first needed
+        self._occupancy = None
+
+        self._system = None
+        self._models = None
+        self._image = None
+
+    @property
+    def address(self):
+        """
+        Get current sensor address
+        """
+        return self.com.device_address
+
+    def _cache_key(self):
+        return "%s@%08x" % (self.port, self.address)
+
+    def _read_cache(self):
+        try:
+            with open(self.params_cache) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_cache(self, entries):
+        # The cache only saves reads. If it can't be written, the parameters are read
+        # from the sensor next time. A stale file is removed so it can't be used
+        try:
+            with open(self.params_cache + ".tmp", "w") as f:
+                json.dump(entries, f, indent=1, sort_keys=True)
+            os.replace(self.params_cache + ".tmp", self.params_cache)
+        except OSError as err:
+            sys.stderr.write("Parameters cache not written: %s\n" % err)
+            for file in (self.params_cache + ".tmp", self.params_cache):
+                try:
+                    os.remove(file)
+                except OSError:
+                    pass
+
+    def _load_params(self):
+        if self.params_cache is None:
+            return None
+        entry = self._read_cache().get(self._cache_key())
+        try:
+            return Finger.SystemParameters(**entry) if entry else None
+        except TypeError:
+            return None
+
+    def store_params(self, params):
+        """
+        Keep parameters read from the sensor
+        :param params: Finger.SystemParameters
+        """
+        self.params = params
+        if self.params_cache is not None:
+            entries = self._read_cache()
+            entries[self._cache_key()] = vars(params)
+            self._write_cache(entries)
+
+    def parameters(self):
+        """
+        Get sensor parameters. They are read from the sensor only if not cached
+
+        :return: Finger.SystemParameters
+        :raise Errors.Error: If there is problem with the communication
+        """
+        if self.params is None:
+            self.system.system_params()
+        return self.params
+
+    def invalidate(self):
+        """
+        Forget the cached parameters. Called after a setting of the sensor changes
+        """
+        self.params = None
+        if self.params_cache is not None:
+            entries = self._read_cache()
+            if entries.pop(self._cache_key(), None) is not None:
+                self._write_cache(entries)
+
+    def occupancy(self, refresh=False):
+        """
+        Get used pages of the model database. The index table is read from the
+        sensor only the first time, then store, delete and empty operations of
+        this session keep the map up to date. Use refresh when other programs
+        may have changed the database.
+
+        :param refresh: Read the index table again
+        :return: Occupancy.OccupancyMap
+        :raise Errors.Error: If there is problem with the communication
+        """
+        if self._occupancy is None or refresh:
+            self._occupancy = Occupancy.OccupancyMap.read(self.models, self.parameters().database_size)
+        return self._occupancy
+
+    def mark_pages(self, start, count, used):
+        """
+        Record change of the model database in the occupancy map, if it was read
+
+        :param start: First page
+        :param count: Number of pages. None for all pages from start
+        :param used: New state of the pages
+        :raise ValueError: If start or count is negative
+        """
+        if self._occupancy is None:
+            return
+
+        size = self._occupancy.size
+        if count is None:
+            count = size - start
+        if start < 0 or count < 0:
+            raise ValueError("Invalid page range %d, %d" % (start, count))
+
+        if start + count > size:
+            # Sensor accepted pages past the map, so the database size it was read with is wrong
+            self._occupancy = None
+        else:
+            self._occupancy.mark(start, count, used)
+
+    @property
+    def system(self):
+        """
+        Get system operations
+        :return: Finger.System bound to this session
+        """
+        if self._system is None:
+            self._system = Finger.System(session=self)
+        return self._system
+
+    @property
+    def models(self):
+        """
+        Get model operations
+        :return: Finger.Models bound to this session
+        """
+        if self._models is None:
+            self._models = Finger.Models(session=self)
+        return self._models
+
+    @property
+    def image(self):
+        """
+        Get image operations
+        :return: Finger.Image bound to this session
+        """
+        if self._image is None:
+            self._image = Finger.Image(session=self)
+        return self._image
+
+    def close(self):
+        """
+        Close the connection
+        """
+        self.com.ser.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
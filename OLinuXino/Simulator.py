@@ -0,0 +1,791 @@
+__author__ = "Stefan Mavrodiev"
+__copyright__ = "Copyright 2015, Olimex LTD"
+__credits__ = ["Stefan Mavrodiev"]
+__license__ = "GPL"
+__version__ = "2.0"
+__maintainer__ = __author__
+__email__ = "support@olimex.com"
+
+import argparse
+import array
+import fcntl
+import hashlib
+import os
+import random
+import select
+import socket
+import sys
+import threading
+import time
+import tty
+
+import StatusCodes
+
+# Size of the packed fingerprint image (256x288 pixels, 4 bits per pixel)
+IMAGE_SIZE = 256 * 288 // 2
+
+# Size of one characteristics template
+TEMPLATE_SIZE = 512
+
+# Register numbers used by SetSysPara
+REGISTER_BAUDRATE = 4
+REGISTER_SECURITY = 5
+REGISTER_PACKET = 6
+
+# Linux ioctl reading struct termios2 with the line speed as plain number
+_TCGETS2 = 0x802C542A
+
+# Processing time of the module in seconds. Commands not listed here
+# use DEFAULT_PROCESSING_TIME.
+PROCESSING_TIME = {
+    0x01: 0.200,  # GenImg
+    0x02: 0.150,  # Img2Tz
+    0x03: 0.010,  # Match
+    0x04: 0.050,  # Search
+    0x05: 0.050,  # RegModel
+    0x06: 0.030,  # Store
+    0x0c: 0.030,  # DeleteChar
+    0x0d: 0.100,  # Empty
+    0x0e: 0.010,  # SetSysPara
+    0x12: 0.010,  # SetPwd
+    0x15: 0.010,  # SetAdr
+    0x18: 0.010,  # WriteNotepad
+    0x1b: 0.020,  # HighSpeedSearch
+}
+DEFAULT_PROCESSING_TIME = 0.002
+
+
+class VirtualSensor:
+
+    # Confirmation codes not listed in StatusCodes
+    _invalid_register = 0x1a
+    _password_not_verified = 0x21
+
+    def __init__(self, address=0xffffffff, password=0x00000000, database_size=1000, packet_size=128,
+                 baud_rate=57600, security=3, latency_scale=1.0, wire_delay=True, finger=1, byte_error_rate=0.0):
+
+        """
+        Software model of the SNS-FINGERPRINT module
+
+        :param address: Sensor address
+        :param password: Sensor password
+        :param database_size: Number of template pages in the library
+        :param packet_size: Length of data packets in bytes (32, 64, 128 or 256)
+        :param baud_rate: Simulated line speed, used for the wire time model
+        :param security: Security level (1 to 5)
+        :param latency_scale: Multiplier for the processing times. 0 disables them
+        :param wire_delay: Delay every frame with the time it needs on the wire
+        :param finger: Id of the finger on the sensor, None for no finger
+        :param byte_error_rate: Probability that a sent byte is corrupted on the line
+        """
+        self.address = address
+        self.password = password
+        self.database_size = database_size
+        self.packet_size = packet_size
+        self.baud_rate = baud_rate
+        self.security = security
+        self.latency_scale = latency_scale
+        self.wire_delay = wire_delay
+        self.finger = finger
+        self.byte_error_rate = byte_error_rate
+        self._random = random.Random(address)
+
+        # Library, buffers and notepad
+        self.templates = {}
+        self.char_buffers = {1: None, 2: None}
+        self.image_buffer = None
+        self.notepad = [bytes(32) for _ in range(16)]
+
+        self._verified = password == 0x00000000
+        self._input = bytearray()
+        self._download = None
+        self._pending_address = None
+
+        # Statistics
+        self.commands = 0
+        self.frames_in = 0
+        self.frames_out = 0
+
+        self._handlers = {
+            0x01: self._gen_img,
+            0x02: self._img_2_tz,
+            0x03: self._match,
+            0x04: self._search,
+            0x05: self._reg_model,
+            0x06: self._store,
+            0x07: self._load_char,
+            0x08: self._up_char,
+            0x09: self._down_char,
+            0x0a: self._up_image,
+            0x0b: self._down_image,
+            0x0c: self._delete_char,
+            0x0d: self._empty,
+            0x0e: self._set_sys_para,
+            0x0f: self._read_sys_para,
+            0x12: self._set_pwd,
+            0x13: self._vfy_pwd,
+            0x14: self._get_random_code,
+            0x15: self._set_adr,
+            0x17: self._control,
+            0x18: self._write_notepad,
+            0x19: self._read_notepad,
+            0x1b: self._search,
+            0x1d: self._template_num,
+            0x1f: self._read_index_table,
+        }
+
+    @staticmethod
+    def template_for(finger):
+        """
+        Create deterministic template for finger id.
+        The first 32 bytes identify the finger and are used for matching.
+
+        :param finger: Finger id
+        :return: Template bytes
+        """
+        key = hashlib.sha256(b"finger-%d" % finger).digest()
+        body = hashlib.sha512(key).digest()
+        return (key + body * 8)[:TEMPLATE_SIZE]
+
+    @staticmethod
+    def image_for(finger):
+        """
+        Create deterministic packed image for finger id
+
+        :param finger: Finger id
+        :return: Packed image bytes
+        """
+        row = hashlib.sha512(b"image-%d" % finger).digest() * 2
+        return (row * (IMAGE_SIZE // len(row) + 1))[:IMAGE_SIZE]
+
+    def enroll(self, page, finger):
+        """
+        Store template of finger directly in the library
+        :param page: Page id
+        :param finger: Finger id
+        """
+        self.templates[page] = self.template_for(finger)
+
+    def processing_time(self, command):
+        """
+        Get simulated processing time of command
+        :param command: Instruction code
+        :return: Time in seconds
+        """
+        return PROCESSING_TIME.get(command, DEFAULT_PROCESSING_TIME) * self.latency_scale
+
+    def wire_time(self, length):
+        """
+        Get time needed to transfer bytes at current baud rate (8N1)
+        :param length: Number of bytes
+        :return: Time in seconds
+        """
+        if not self.wire_delay:
+            return 0
+        return length * 10 / self.baud_rate
+
+    def line_noise(self, frame):
+        """
+        Corrupt bytes of frame with the configured error rate
+        :param frame: Frame bytes
+        :return: Frame as received by the host
+        """
+        if not self.byte_error_rate:
+            return frame
+
+        errors = [i for i in range(len(frame)) if self._random.random() < self.byte_error_rate]
+        if not errors:
+            return frame
+
+        frame = bytearray(frame)
+        for i in errors:
+            frame[i] ^= 1 << self._random.randrange(8)
+        return bytes(frame)
+
+    @staticmethod
+    def checksum(packet_type, body):
+        """
+        Calculate frame checksum
+        :param packet_type: Packet identification
+        :param body: Data bytes
+        :return: Checksum of the frame
+        """
+        length = len(body) + 2
+        return (packet_type + (length >> 8) + (length & 0xFF) + sum(body)) & 0xFFFF
+
+    def frame(self, packet_type, body):
+        """
+        Build frame with the sensor address
+        :param packet_type: Packet identification
+        :param body: Data bytes
+        :return: Frame bytes
+        """
+        return b"".join([b"\xef\x01",
+                         self.address.to_bytes(4, "big"),
+                         bytes([packet_type]),
+                         (len(body) + 2).to_bytes(2, "big"),
+                         bytes(body),
+                         self.checksum(packet_type, body).to_bytes(2, "big")])
+
+    def feed(self, data):
+        """
+        Process bytes received from the host
+
+        :param data: Received bytes
+        :return: List of (delay, frame) tuples to send back to the host
+        """
+        self._input += data
+        output = []
+
+        while True:
+            # Find start code
+            start = self._input.find(b"\xef\x01")
+            if start < 0:
+                del self._input[:-1]
+                break
+            del self._input[:start]
+
+            if len(self._input) < 9:
+                break
+            length = self._input[7] << 8 | self._input[8]
+            if len(self._input) < 9 + length:
+                break
+
+            packet_type = self._input[6]
+            body = bytes(self._input[9:7 + length])
+            checksum = self._input[7 + length] << 8 | self._input[8 + length]
+            address = int.from_bytes(self._input[2:6], "big")
+
+            if length < 2 or checksum != self.checksum(packet_type, body):
+                # Drop only the start code and look for the next frame
+                del self._input[:2]
+                if self._download is None:
+                    output.append((0, self.frame(StatusCodes.PacketType.Ack.value, [0x01])))
+                else:
+                    self._download = None
+                continue
+
+            del self._input[:9 + length]
+            self.frames_in += 1
+
+            if address != self.address:
+                continue
+
+            output += self._process(packet_type, body)
+
+        return output
+
+    def _process(self, packet_type, body):
+        """
+        Process single frame
+
+        :param packet_type: Packet identification
+        :param body: Data bytes
+        :return: List of (delay, frame) tuples
+        """
+        # Data coming after DownChar or DownImage
+        if packet_type in (StatusCodes.PacketType.Data.value, StatusCodes.PacketType.EndData.value):
+            if self._download is not None:
+                target, data = self._download
+                data += body
+                if packet_type == StatusCodes.PacketType.EndData.value:
+                    self._download = None
+                    if target == "image":
+                        self.image_buffer = bytes(data[:IMAGE_SIZE])
+                    else:
+                        self.char_buffers[target] = bytes(data[:TEMPLATE_SIZE])
+            return []
+
+        if packet_type != StatusCodes.PacketType.Command.value or not body:
+            return [(0, self.frame(StatusCodes.PacketType.Ack.value, [0x01]))]
+
+        self.commands += 1
+        command = body[0]
+        handler = self._handlers.get(command)
+
+        if handler is None:
+            code, payload, data = 0x01, b"", None
+        elif not self._verified and command != 0x13:
+            code, payload, data = self._password_not_verified, b"", None
+        else:
+            code, payload, data = handler(body[1:])
+
+        output = [(self.processing_time(command),
+                   self.frame(StatusCodes.PacketType.Ack.value, bytes([code]) + payload))]
+
+        # Follow the acknowledge with data packets
+        if data is not None:
+            for i in range(0, len(data), self.packet_size):
+                if i + self.packet_size < len(data):
+                    packet_type = StatusCodes.PacketType.Data.value
+                else:
+                    packet_type = StatusCodes.PacketType.EndData.value
+                output.append((0, self.frame(packet_type, data[i:i + self.packet_size])))
+
+        # Address change takes effect after the acknowledge
+        if self._pending_address is not None:
+            self.address = self._pending_address
+            self._pending_address = None
+
+        self.frames_out += len(output)
+        return output
+
+    def _buffer(self, buffer_id):
+        return self.char_buffers.get(buffer_id)
+
+    @staticmethod
+    def _u16(data, offset):
+        return data[offset] << 8 | data[offset + 1]
+
+    def _gen_img(self, args):
+        if self.finger is None:
+            return StatusCodes.ConfirmationCode.NoFinger.value, b"", None
+        self.image_buffer = self.image_for(self.finger)
+        return 0x00, b"", None
+
+    def _img_2_tz(self, args):
+        if self.image_buffer is None or args[0] not in self.char_buffers:
+            return StatusCodes.ConfirmationCode.InvalidImage.value, b"", None
+
+        # Images of known fingers give their template, any other image gets its own
+        if self.finger is not None and self.image_buffer == self.image_for(self.finger):
+            template = self.template_for(self.finger)
+        else:
+            key = hashlib.sha256(self.image_buffer).digest()
+            template = (key + hashlib.sha512(key).digest() * 8)[:TEMPLATE_SIZE]
+        self.char_buffers[args[0]] = template
+        return 0x00, b"", None
+
+    @staticmethod
+    def _score(first, second):
+        if first is None or second is None:
+            return 0
+        return 200 if first[:32] == second[:32] else 0
+
+    def _match(self, args):
+        score = self._score(self.char_buffers[1], self.char_buffers[2])
+        if score:
+            return 0x00, score.to_bytes(2, "big"), None
+        return StatusCodes.ConfirmationCode.image_mismatch.value, bytes(2), None
+
+    def _search(self, args):
+        probe = self._buffer(args[0])
+        start = self._u16(args, 1)
+        count = self._u16(args, 3)
+
+        if probe is None:
+            return StatusCodes.ConfirmationCode.InvalidTemplate.value, bytes(4), None
+
+        for page in range(start, min(start + count, self.database_size)):
+            score = self._score(probe, self.templates.get(page))
+            if score:
+                return 0x00, page.to_bytes(2, "big") + score.to_bytes(2, "big"), None
+
+        return StatusCodes.ConfirmationCode.DintSearch.value, bytes(4), None
+
+    def _reg_model(self, args):
+        if not self._score(self.char_buffers[1], self.char_buffers[2]):
+            return StatusCodes.ConfirmationCode.MergeFailed.value, b"", None
+        self.char_buffers[2] = self.char_buffers[1]
+        return 0x00, b"", None
+
+    def _store(self, args):
+        page = self._u16(args, 1)
+        if page >= self.database_size:
+            return StatusCodes.ConfirmationCode.InvalidPageID.value, b"", None
+        if self._buffer(args[0]) is None:
+            return StatusCodes.ConfirmationCode.InvalidTemplate.value, b"", None
+        self.templates[page] = self._buffer(args[0])
+        return 0x00, b"", None
+
+    def _load_char(self, args):
+        page = self._u16(args, 1)
+        if page >= self.database_size or args[0] not in self.char_buffers:
+            return StatusCodes.ConfirmationCode.InvalidPageID.value, b"", None
+        if page not in self.templates:
+            return StatusCodes.ConfirmationCode.InvalidTemplate.value, b"", None
+        self.char_buffers[args[0]] = self.templates[page]
+        return 0x00, b"", None
+
+    def _up_char(self, args):
+        template = self._buffer(args[0])
+        if template is None:
+            return StatusCodes.ConfirmationCode.execution_failed.value, b"", None
+        return 0x00, b"", template
+
+    def _down_char(self, args):
+        if args[0] not in self.char_buffers:
+            return StatusCodes.ConfirmationCode.followup_failed.value, b"", None
+        self._download = (args[0], bytearray())
+        return 0x00, b"", None
+
+    def _up_image(self, args):
+        if self.image_buffer is None:
+            return StatusCodes.ConfirmationCode.InvalidImage.value, b"", None
+        return 0x00, b"", self.image_buffer
+
+    def _down_image(self, args):
+        self._download = ("image", bytearray())
+        return 0x00, b"", None
+
+    def _delete_char(self, args):
+        start = self._u16(args, 0)
+        count = self._u16(args, 2)
+        if start + count > self.database_size:
+            return StatusCodes.ConfirmationCode.InvalidPageID.value, b"", None
+        for page in range(start, start + count):
+            self.templates.pop(page, None)
+        return 0x00, b"", None
+
+    def _empty(self, args):
+        self.templates.clear()
+        return 0x00, b"", None
+
+    def _set_sys_para(self, args):
+        register, value = args[0], args[1]
+        if register == REGISTER_BAUDRATE and 1 <= value <= 12:
+            self.baud_rate = value * 9600
+        elif register == REGISTER_SECURITY and 1 <= value <= 5:
+            self.security = value
+        elif register == REGISTER_PACKET and 0 <= value <= 3:
+            self.packet_size = 32 << value
+        else:
+            return self._invalid_register, b"", None
+        return 0x00, b"", None
+
+    def _read_sys_para(self, args):
+        payload = b"".join([(0x0000).to_bytes(2, "big"),
+                            (0x0009).to_bytes(2, "big"),
+                            self.database_size.to_bytes(2, "big"),
+                            self.security.to_bytes(2, "big"),
+                            self.address.to_bytes(4, "big"),
+                            (self.packet_size.bit_length() - 6).to_bytes(2, "big"),
+                            (self.baud_rate // 9600).to_bytes(2, "big")])
+        return 0x00, payload, None
+
+    def _set_pwd(self, args):
+        self.password = int.from_bytes(args[0:4], "big")
+        return 0x00, b"", None
+
+    def _vfy_pwd(self, args):
+        if int.from_bytes(args[0:4], "big") != self.password:
+            return StatusCodes.ConfirmationCode.IncorrectPassword.value, b"", None
+        self._verified = True
+        return 0x00, b"", None
+
+    def _get_random_code(self, args):
+        return 0x00, os.urandom(4), None
+
+    def _set_adr(self, args):
+        # The acknowledge is still sent with the old address
+        self._pending_address = int.from_bytes(args[0:4], "big")
+        return 0x00, b"", None
+
+    def _control(self, args):
+        return 0x00, b"", None
+
+    def _write_notepad(self, args):
+        if args[0] > 15:
+            return StatusCodes.ConfirmationCode.execution_failed.value, b"", None
+        self.notepad[args[0]] = bytes(args[1:33]).ljust(32, b"\x00")
+        return 0x00, b"", None
+
+    def _read_notepad(self, args):
+        if args[0] > 15:
+            return StatusCodes.ConfirmationCode.execution_failed.value, b"", None
+        return 0x00, self.notepad[args[0]], None
+
+    def _template_num(self, args):
+        return 0x00, len(self.templates).to_bytes(2, "big"), None
+
+    def _read_index_table(self, args):
+        table = bytearray(32)
+        for page in self.templates:
+            if page // 256 == args[0]:
+                table[page % 256 // 8] |= 1 << (page % 8)
+        return 0x00, bytes(table), None
+
+
+class Server:
+
+    def __init__(self, sensor):
+
+        """
+        Base class for serving a VirtualSensor over a byte stream
+
+        :param sensor: VirtualSensor instance
+        """
+        self.sensor = sensor
+        self._running = False
+        self._thread = None
+        self._wire_free = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        """
+        Get the port name to pass to Communication
+        """
+        raise NotImplementedError
+
+    def start(self):
+        """
+        Start serving in background thread
+        :return: self
+        """
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop serving and wait for the thread
+        """
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _run(self):
+        raise NotImplementedError
+
+    def _respond(self, data, write):
+        """
+        Feed received bytes to the sensor and send the responses,
+        paced by processing and wire time
+
+        :param data: Received bytes
+        :param write: Function for sending bytes
+        """
+        # Time needed for the command to reach the sensor
+        time.sleep(self.sensor.wire_time(len(data)))
+
+        for delay, frame in self.sensor.feed(data):
+            if delay:
+                time.sleep(delay)
+
+            # Send the frame after it would have passed the wire
+            now = time.perf_counter()
+            self._wire_free = max(now, self._wire_free) + self.sensor.wire_time(len(frame))
+            if self._wire_free > now:
+                time.sleep(self._wire_free - now)
+            write(self.sensor.line_noise(frame))
+
+
+class PtyServer(Server):
+
+    def __init__(self, sensor):
+
+        """
+        Serve VirtualSensor over pseudo terminal.
+        The slave side can be opened as an ordinary serial port.
+        Bytes sent while the host port speed differs from the sensor
+        baud rate are dropped, as the sensor couldn't decode them.
+
+        :param sensor: VirtualSensor instance
+        """
+        super().__init__(sensor)
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self._name = os.ttyname(self._slave)
+
+    @property
+    def url(self):
+        return self._name
+
+    def line_speed(self):
+        """
+        Get speed configured by the host on the pseudo terminal
+
+        :return: Speed in bps or None if it can't be read
+        """
+        termios2 = array.array("I", [0] * 11)
+        try:
+            fcntl.ioctl(self._slave, _TCGETS2, termios2)
+        except OSError:
+            return None
+        return termios2[10]
+
+    def _write(self, data):
+        while data:
+            data = data[os.write(self._master, data):]
+
+    def _run(self):
+        while self._running:
+            readable, _, _ = select.select([self._master], [], [], 0.1)
+            if not readable:
+                continue
+            try:
+                data = os.read(self._master, 4096)
+            except OSError:
+                continue
+
+            if self.line_speed() not in (None, self.sensor.baud_rate):
+                continue
+            self._respond(data, self._write)
+
+    def stop(self):
+        super().stop()
+        os.close(self._master)
+        os.close(self._slave)
+
+
+class TcpServer(Server):
+
+    def __init__(self, sensor, host="127.0.0.1", port=0):
+
+        """
+        Serve VirtualSensor over TCP socket.
+        Use the socket:// url to connect.
+
+        :param sensor: VirtualSensor instance
+        :param host: Listen address
+        :param port: Listen port, 0 for any free port
+        """
+        super().__init__(sensor)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((host, port))
+        self._socket.listen(1)
+        self._socket.settimeout(0.1)
+
+    @property
+    def url(self):
+        host, port = self._socket.getsockname()
+        return "socket://%s:%d" % (host, port)
+
+    def _run(self):
+        clients = []
+        while self._running:
+            try:
+                client, _ = self._socket.accept()
+            except socket.timeout:
+                continue
+
+            # Every Communication instance opens its own connection
+            thread = threading.Thread(target=self._serve_client, args=(client,), daemon=True)
+            thread.start()
+            clients.append(thread)
+
+        for thread in clients:
+            thread.join()
+
+    def _serve_client(self, client):
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client.settimeout(0.1)
+        with client:
+            while self._running:
+                try:
+                    data = client.recv(4096)
+                except socket.timeout:
+                    continue
+                except OSError:
+                    break
+                if not data:
+                    break
+                try:
+                    with self._lock:
+                        self._respond(data, client.sendall)
+                except OSError:
+                    # Client went away in the middle of the answer
+                    break
+
+    def stop(self):
+        super().stop()
+        self._socket.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Virtual SNS-FINGERPRINT module",
+                                     prog="FingerPrint-simulator")
+
+    parser.add_argument("--tcp",
+                        action="store",
+                        type=int,
+                        metavar="PORT",
+                        help="Serve over TCP instead of pseudo terminal. Use 0 for any free port")
+    parser.add_argument("--baudrate",
+                        action="store",
+                        type=int,
+                        default=57600,
+                        help="Simulated line speed. Default: 57600")
+    parser.add_argument("--no-wire-delay",
+                        action="store_true",
+                        help="Do not simulate the time spent on the wire")
+    parser.add_argument("--latency-scale",
+                        action="store",
+                        type=float,
+                        default=1.0,
+                        help="Multiplier for command processing times. Default: 1.0")
+    parser.add_argument("--packet",
+                        action="store",
+                        type=int,
+                        choices=[32, 64, 128, 256],
+                        default=128,
+                        help="Data packet length in bytes. Default: 128")
+    parser.add_argument("--byte-error-rate",
+                        action="store",
+                        type=float,
+                        default=0.0,
+                        help="Probability that a byte sent to the host is corrupted. Default: 0.0")
+    parser.add_argument("--database-size",
+                        action="store",
+                        type=int,
+                        default=1000,
+                        help="Number of library pages. Default: 1000")
+    parser.add_argument("--enroll",
+                        action="store",
+                        type=int,
+                        default=0,
+                        metavar="COUNT",
+                        help="Fill the first COUNT pages with templates")
+    parser.add_argument("--password",
+                        action="store",
+                        type=lambda value: int(value, 16),
+                        default=0x00000000,
+                        help="Sensor password. Default: 0x00000000")
+    parser.add_argument("--address",
+                        action="store",
+                        type=lambda value: int(value, 16),
+                        default=0xFFFFFFFF,
+                        help="Sensor address. Default: 0xffffffff")
+
+    args = parser.parse_args()
+
+    sensor = VirtualSensor(address=args.address,
+                           password=args.password,
+                           database_size=args.database_size,
+                           packet_size=args.packet,
+                           baud_rate=args.baudrate,
+                           latency_scale=args.latency_scale,
+                           wire_delay=not args.no_wire_delay,
+                           byte_error_rate=args.byte_error_rate)
+    for page in range(args.enroll):
+        sensor.enroll(page, page + 1)
+
+    if args.tcp is not None:
+        server = TcpServer(sensor, port=args.tcp)
+    else:
+        server = PtyServer(sensor)
+
+    with server:
+        print(server.url)
+        sys.stdout.flush()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
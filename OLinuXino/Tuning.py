@@ -0,0 +1,237 @@
+__author__ = "Stefan Mavrodiev"
+__copyright__ = "Copyright 2015, Olimex LTD"
+__credits__ = ["Stefan Mavrodiev"]
+__license__ = "GPL"
+__version__ = "2.0"
+__maintainer__ = __author__
+__email__ = "support@olimex.com"
+
+import argparse
+import contextlib
+import sys
+import time
+
+import Errors
+import Finger
+import Retry
+import Session
+
+# Data packet lengths supported by the sensor
+PACKET_SIZES = (32, 64, 128, 256)
+
+# Template used for the measurements
+_TEMPLATE = bytes(range(256)) * 2
+
+
+class TuningResult:
+
+    def __init__(self, packet_size):
+
+        """
+        Measured transfers with one packet size
+
+        :param packet_size: Data packet length in bytes
+        """
+        self.packet_size = packet_size
+        self.transfers = 0
+        self.failures = 0
+        self.frames = 0
+        self.frame_errors = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self):
+        """
+        Get received payload bytes per second, including the time lost on failures
+        """
+        return self.bytes / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def frame_error_rate(self):
+        return self.frame_errors / self.frames if self.frames else 0.0
+
+    def __str__(self):
+        return "%4d bytes  %8.0f B/s  %4d transfers  %3d failed  %6.2f%% frame errors" % (
+            self.packet_size, self.throughput, self.transfers, self.failures, self.frame_error_rate * 100)
+
+
+def _set_packet(session, packet_size):
+    if session.system.set_packet(packet_size):
+        raise session.system.last_error
+    if session.parameters().packet_size != packet_size:
+        raise Errors.StatusError("Sensor didn't accept packet size %d" % packet_size)
+
+
+def measure(session, packet_size, repeat=5, image_repeat=1, buffer_id=1):
+    """
+    Switch the sensor to packet size and time template and image uploads
+
+    :param session: Session.Session of the sensor
+    :param packet_size: Data packet length in bytes
+    :param repeat: Number of template uploads
+    :param image_repeat: Number of image uploads. Needs finger on the sensor. 0 to skip
+    :param buffer_id: CharBuffer used for the template. Its content is lost
+    :return: TuningResult
+    :raise Errors.Error: If the packet size can't be set
+    """
+    _set_packet(session, packet_size)
+    session.models.write_model(buffer_id, _TEMPLATE)
+
+    transfers = [(session.models.read_model, (buffer_id,), Finger.TEMPLATE_SIZE)] * repeat
+    if image_repeat and not session.models.generate_model():
+        image = bytearray(Finger.IMAGE_SIZE)
+        transfers += [(session.image.read_image, (image,), Finger.IMAGE_SIZE)] * image_repeat
+
+    result = TuningResult(packet_size)
+    decoder = session.com.decoder
+
+    # Every frame error must be seen, so nothing is repeated
+    saved, session.com.retry = session.com.retry, Retry.NEVER
+    try:
+        for function, args, size in transfers:
+            checksum_errors = decoder.checksum_errors
+            result.transfers += 1
+            result.frames += 1 + size // packet_size
+
+            start = time.perf_counter()
+            failed = False
+            try:
+                function(*args)
+                result.bytes += size
+            except Errors.Error:
+                failed = True
+                result.failures += 1
+                session.com.drain()
+            result.elapsed += time.perf_counter() - start
+
+            errors = decoder.checksum_errors - checksum_errors
+            if failed and not errors:
+                # Frame lost without checksum error, e.g. damaged header
+                errors = 1
+            result.frame_errors += errors
+    finally:
+        session.com.retry = saved
+
+    return result
+
+
+def tune(session, sizes=PACKET_SIZES, repeat=5, image_repeat=1, max_error_rate=0.01, buffer_id=1):
+    """
+    Measure every packet size and leave the sensor at the best one.
+    The best size has the highest throughput among the sizes with frame
+    error rate up to max_error_rate, or the lowest error rate if none qualifies.
+    The sensor keeps the setting, and the session parameters are updated.
+
+    :param session: Session.Session of the sensor
+    :param sizes: Packet sizes to try
+    :param repeat: Number of template uploads per size
+    :param image_repeat: Number of image uploads per size. 0 to skip
+    :param max_error_rate: Highest acceptable frame error rate
+    :param buffer_id: CharBuffer used for the template. Its content is lost
+    :return: Tuple (best TuningResult, list of all TuningResult)
+    :raise Errors.Error: If there is problem with the communication
+    """
+    results = [measure(session, size, repeat=repeat, image_repeat=image_repeat, buffer_id=buffer_id)
+               for size in sizes]
+
+    reliable = [result for result in results if result.frame_error_rate <= max_error_rate]
+    if reliable:
+        best = max(reliable, key=lambda result: result.throughput)
+    else:
+        best = min(results, key=lambda result: (result.frame_error_rate, -result.throughput))
+
+    _set_packet(session, best.packet_size)
+    return best, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Select data packet length by measured throughput and errors",
+                                     prog="FingerPrint-tuning")
+
+    parser.add_argument("-p", "--port",
+                        action="store",
+                        help="Communication port or pyserial URL to use")
+    parser.add_argument("--simulate",
+                        action="store_true",
+                        help="Run against the virtual sensor from Simulator.py")
+    parser.add_argument("--baudrate",
+                        action="store",
+                        type=int,
+                        default=57600,
+                        help="Communication speed. Default: 57600")
+    parser.add_argument("--repeat",
+                        action="store",
+                        type=int,
+                        default=5,
+                        help="Template uploads for each packet size. Default: 5")
+    parser.add_argument("--image-repeat",
+                        action="store",
+                        type=int,
+                        default=1,
+                        help="Image uploads for each packet size, needs finger on the sensor. Default: 1")
+    parser.add_argument("--max-error-rate",
+                        action="store",
+                        type=float,
+                        default=0.01,
+                        help="Highest acceptable frame error rate. Default: 0.01")
+    parser.add_argument("--byte-error-rate",
+                        action="store",
+                        type=float,
+                        default=0.0,
+                        help="Simulated probability of corrupted byte. Default: 0.0")
+    parser.add_argument("--params-cache",
+                        action="store",
+                        metavar="FILE",
+                        help="Store the new sensor parameters in FILE")
+    parser.add_argument("--password",
+                        action="store",
+                        type=lambda value: int(value, 16),
+                        default=0x00000000,
+                        help="Sensor password. Default: 0x00000000")
+    parser.add_argument("--address",
+                        action="store",
+                        type=lambda value: int(value, 16),
+                        default=0xFFFFFFFF,
+                        help="Sensor address. Default: 0xffffffff")
+
+    args = parser.parse_args()
+
+    if args.port is None and not args.simulate:
+        parser.error("either --port or --simulate is required")
+
+    with contextlib.ExitStack() as stack:
+        port = args.port
+        if args.simulate:
+            import Simulator
+
+            sensor = Simulator.VirtualSensor(address=args.address,
+                                             password=args.password,
+                                             baud_rate=args.baudrate,
+                                             byte_error_rate=args.byte_error_rate)
+            port = stack.enter_context(Simulator.PtyServer(sensor)).url
+
+        try:
+            session = stack.enter_context(Session.Session(port, baud=args.baudrate, password=args.password,
+                                                          address=args.address, params_cache=args.params_cache))
+        except IOError as err:
+            print(err)
+            return 1
+
+        try:
+            if session.system.verify_password():
+                return 1
+            best, results = tune(session, repeat=args.repeat, image_repeat=args.image_repeat,
+                                 max_error_rate=args.max_error_rate)
+        except Errors.Error as err:
+            print(err.msg)
+            return 1
+
+    for result in results:
+        print(result)
+    print("Selected packet size: %d bytes" % best.packet_size)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
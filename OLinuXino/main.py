@@ -6,18 +6,58 @@ __version__ = "2.0"
 __maintainer__ = __author__
 __email__ = "support@olimex.com"
 
+import time
+
+# Start of the imports, reported by --timing
+_import_start = time.perf_counter()
+
+# Modules needed by single options (Archive, Baudrate, Capture, Mirror, Presence)
+# are imported by the options, so short commands start faster
+import Batch
+import Errors
 import Finger
+import Session
 
 import logging
 import argparse
+import os
 import sys
-import time
+
+_import_end = time.perf_counter()
 
 
 def parser_hex(value):
     return int(value, 16)
 
 
+def process_age():
+    """
+    Get time since the interpreter process was started. Resolution is one clock tick
+
+    :return: Time in seconds, None if it isn't known on this system
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the command name. Start time is field 22
+            start = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def report_timing(timing):
+    """
+    Print startup phases to stderr, one per line, for example "timing import 21.50 ms"
+
+    :param timing: List of (phase, seconds) pairs. Phases with None are not known
+    """
+    for phase, seconds in timing:
+        if seconds is not None:
+            sys.stderr.write("timing %-12s %8.2f ms\n" % (phase, seconds * 1000))
+
+
 def main():
     # Add epilog
     __epilog = "For suggestions use <" + __email__ + ">"
@@ -35,8 +75,7 @@ def main():
     # Register common arguments
     parser.add_argument("-p", "--port",
                         action="store",
-                        required=True,
-                        help="Communication port to use")
+                        help="Communication port or pyserial URL to use. Required unless --replay is given")
     parser.add_argument("--baudrate",
                         action="store",
                         type=int,
@@ -45,6 +84,40 @@ def main():
     parser.add_argument("--settings",
                         action="store_true",
                         help="Read current sensor settings")
+    parser.add_argument("--low-latency",
+                        action="store_true",
+                        help="Don't flush the port and wait 10 ms before every command")
+    parser.add_argument("--auto-baud",
+                        action="store_true",
+                        help="Find the sensor speed and switch to the fastest working one up to 115200")
+    parser.add_argument("--params-cache",
+                        action="store",
+                        metavar="FILE",
+                        help="Keep sensor parameters in FILE between runs. Default: read them when needed")
+    parser.add_argument("--batch",
+                        action="store",
+                        metavar="FILE",
+                        help="Run commands from FILE, one per line, on this connection. Use - for stdin. "
+                             "Commands: " + ", ".join(Batch.COMMANDS))
+    parser.add_argument("--keep-going",
+                        action="store_true",
+                        help="Continue the batch after failed command")
+    parser.add_argument("--record",
+                        action="store",
+                        metavar="FILE",
+                        help="Record all traffic with the sensor to capture FILE")
+    parser.add_argument("--replay",
+                        action="store",
+                        metavar="FILE",
+                        help="Talk to traffic recorded in capture FILE instead of the sensor")
+    parser.add_argument("--replay-speed",
+                        action="store",
+                        type=float,
+                        default=1.0,
+                        help="Replay speed factor, 0 answers at once. Default: 1")
+    parser.add_argument("--timing",
+                        action="store_true",
+                        help="Print interpreter start, import, port open, handshake and command time")
     parser.add_argument("-v", "--verbose",
                         action="store_true",
                         help="Enables verbose output")
@@ -67,6 +140,15 @@ def main():
                               nargs=2,
                               metavar=("BUFFER", "PAGE"),
                               help="Transfer model from buffer# to page#")
+    models_group.add_argument("--model-store-free",
+                              action="store",
+                              type=int,
+                              choices=[1, 2],
+                              metavar="BUFFER",
+                              help="Transfer model from buffer# to the first free page")
+    models_group.add_argument("--used-pages",
+                              action="store_true",
+                              help="Print the ranges of used model pages")
     models_group.add_argument("--model-delete",
                               action="store",
                               type=int,
@@ -92,6 +174,11 @@ def main():
     models_group.add_argument("--model-generate",
                               action="store_true",
                               help="Generate fingerprint image")
+    models_group.add_argument("--wait-finger",
+                              action="store",
+                              type=float,
+                              metavar="SECONDS",
+                              help="Wait up to SECONDS for finger and take its image")
     models_group.add_argument("--model-chars",
                               action="store",
                               type=int,
@@ -116,6 +203,18 @@ def main():
     models_group.add_argument("--empty",
                               action="store_true",
                               help="Empty model database")
+    models_group.add_argument("--mirror",
+                              action="store",
+                              metavar="DIRECTORY",
+                              help="Synchronize local copy of the model database in DIRECTORY. Uses CharBuffer1")
+    models_group.add_argument("--export-db",
+                              action="store",
+                              metavar="FILE",
+                              help="Export all models into single archive FILE. Uses CharBuffer1")
+    models_group.add_argument("--import-db",
+                              action="store",
+                              metavar="FILE",
+                              help="Store all models from archive FILE at their pages. Uses CharBuffer1")
 
     # Register common argument group
     sensor_group = parser.add_argument_group("Sensor",
@@ -147,15 +246,36 @@ def main():
                               help="Sensor address. Default: 0xffffffff")
 
     # Register argument group
-    image_group = parser.add_argument_group("Fingerprint image",
-                                            "Actions with ImageBuffer").add_mutually_exclusive_group()
+    image_arguments = parser.add_argument_group("Fingerprint image",
+                                                "Actions with ImageBuffer")
+    image_group = image_arguments.add_mutually_exclusive_group()
     image_group.add_argument("--image-upload",
                              action="store",
                              metavar="FILE",
                              help="Upload fingerprint image from sensor to host PC")
+    image_arguments.add_argument("--image-format",
+                                 action="store",
+                                 choices=Finger.IMAGE_FORMATS,
+                                 default="bmp",
+                                 help="Format of the uploaded image. Default: bmp")
 
     # Parse arguments
     args = parser.parse_args()
+    if args.port is None and args.replay is None:
+        parser.error("the following arguments are required: -p/--port")
+
+    # Check the whole script before connecting
+    steps = None
+    if args.batch is not None:
+        try:
+            if args.batch == "-":
+                steps = Batch.parse(sys.stdin)
+            else:
+                with open(args.batch) as f:
+                    steps = Batch.parse(f)
+        except (OSError, ValueError) as err:
+            print(err)
+            return 1
 
     # Configure logging
     if args.verbose:
@@ -163,29 +283,88 @@ def main():
     else:
         logging.basicConfig(format="%(message)s", level=logging.INFO)
 
-    # Start communication with the sensor
-    sensor = Finger.System(args.port,
-                           baud=args.baudrate,
-                           password=args.password,
-                           address=args.address)
-
-    model = Finger.Models(args.port,
-                          baud=args.baudrate,
-                          password=args.password,
-                          address=args.address)
-
-    image = Finger.Image(args.port,
-                         baud=args.baudrate,
-                         password=args.password,
-                         address=args.address)
-
-    # Check is there is someone
+    # Start communication with the sensor. One connection is shared by all operations
+    port_start = time.perf_counter()
+    try:
+        if args.replay is not None:
+            import Capture
+            session = Capture.replay_session(args.replay, speed=args.replay_speed, password=args.password)
+        else:
+            session = Session.Session(args.port,
+                                      baud=args.baudrate,
+                                      password=args.password,
+                                      address=args.address,
+                                      low_latency=args.low_latency,
+                                      params_cache=args.params_cache)
+        if args.record is not None:
+            import Capture
+            Capture.record(session, args.record)
+    except (IOError, ValueError) as err:
+        print(err)
+        return 1
+    port_end = time.perf_counter()
+
+    with session:
+        ret = connect(args, session)
+        handshake_end = time.perf_counter()
+
+        if not ret:
+            if steps is not None:
+                ret = run_batch(args, session, steps)
+            else:
+                ret = run(args, session)
+        command_end = time.perf_counter()
+
+    if args.timing:
+        end = time.perf_counter()
+        age = process_age()
+        report_timing([
+            ("interpreter", None if age is None else max(0.0, age - (end - _import_start))),
+            ("import", _import_end - _import_start),
+            ("port open", port_end - port_start),
+            ("handshake", handshake_end - port_end),
+            ("command", command_end - handshake_end),
+            ("close", end - command_end),
+            ("total", age if age is not None else end - _import_start),
+        ])
+    return ret
+
+
+def connect(args, session):
+    # Find the speed if asked and verify the password
     logging.debug("Connecting with sensor")
     logging.debug("----------------------")
-    if sensor.verify_password():
+    if args.auto_baud:
+        import Baudrate
+        try:
+            logging.debug("Speed: %d bps" % Baudrate.negotiate(session))
+        except Errors.Error as err:
+            sys.stderr.write(err.msg + "\n")
+            return 1
+
+    if session.system.verify_password():
         return 1
-    else:
-        logging.debug("Response: OK")
+    logging.debug("Response: OK")
+    return 0
+
+
+def run_batch(args, session, steps):
+    def report(step):
+        print(Batch.format_step(step))
+        sys.stdout.flush()
+
+    start = time.perf_counter()
+    failed = Batch.execute(session, steps, keep_going=args.keep_going, report=report)
+    executed = sum(1 for step in steps if step.ok is not None)
+
+    print("%d of %d commands OK in %.2f s" % (executed - failed, len(steps), time.perf_counter() - start))
+    return 1 if failed or executed != len(steps) else 0
+
+
+def run(args, session):
+    sensor = session.system
+    model = session.models
+    image = session.image
 
     # Check if settings flag is set
     if args.settings:
@@ -228,6 +407,17 @@ def main():
     if args.model_store is not None:
         model.store_model(args.model_store[0], args.model_store[1])
 
+    try:
+        if args.model_store_free is not None:
+            sys.stderr.write("Stored at page %d\n" % model.store_free(args.model_store_free))
+
+        if args.used_pages:
+            occupancy = session.occupancy()
+            sys.stderr.write("Used %d of %d pages: %s\n" % (len(occupancy), occupancy.size, occupancy))
+    except Errors.Error as err:
+        sys.stderr.write(err.msg + "\n")
+        return 1
+
     if args.model_delete is not None:
         model.delete_model(args.model_delete[0], args.model_delete[1])
 
@@ -235,16 +425,26 @@ def main():
         model.load_model(args.model_load[0], args.model_load[1])
 
     if args.model_upload is not None:
-        sensor.read_system_params()
         model.upload_model(args.model_upload[0], args.model_upload[1])
 
     if args.model_download is not None:
-        sensor.read_system_params()
         model.download_model(args.model_download[0], args.model_download[1])
 
     if args.model_generate:
         model.generate_model()
 
+    if args.wait_finger is not None:
+        import Presence
+        try:
+            event = Presence.FingerWatcher(session).wait(timeout=args.wait_finger)
+        except Errors.Error as err:
+            sys.stderr.write(err.msg + "\n")
+            return 1
+        if event is None:
+            sys.stderr.write("No finger placed in %g s\n" % args.wait_finger)
+            return 1
+        logging.debug("Image taken %s" % event)
+
     if args.model_chars is not None:
         model.generate_characteristics(args.model_chars)
 
@@ -255,12 +455,31 @@ def main():
         model.search_model(args.model_search[0], args.model_search[1], args.model_search[2])
 
     if args.image_upload is not None:
-        sensor.read_system_params()
-        image.upload_image(args.image_upload[0])
+        image.upload_image(args.image_upload, args.image_format)
 
     if args.empty:
         model.empty_database()
 
+    try:
+        if args.mirror is not None:
+            import Mirror
+            sys.stderr.write("Mirror: %s\n" % Mirror.TemplateMirror(session, args.mirror).sync())
+
+        if args.export_db is not None:
+            import Archive
+            sys.stderr.write("Exported %d models\n" % Archive.export_database(session, args.export_db))
+
+        if args.import_db is not None:
+            import Archive
+            sys.stderr.write("Imported %d models\n" % Archive.import_database(session, args.import_db))
+
+    except Errors.Error as err:
+        sys.stderr.write(err.msg + "\n")
+        return 1
+    except ValueError as err:
+        sys.stderr.write("%s\n" % err)
+        return 1
+
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -0,0 +1,92 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import Archive
+import Errors
+import Session
+import Simulator
+
+
+class ArchiveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file = os.path.join(self.directory, "database.arc")
+
+        self.sensor = Simulator.VirtualSensor(wire_delay=False, latency_scale=0)
+        for page in (1, 5, 9):
+            self.sensor.enroll(page, page)
+        self.server = Simulator.PtyServer(self.sensor).start()
+        self.session = Session.Session(self.server.url)
+
+    def tearDown(self):
+        self.session.close()
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        templates = dict(self.sensor.templates)
+        self.assertEqual(Archive.export_database(self.session, self.file), 3)
+        self.assertEqual(os.listdir(self.directory), ["database.arc"])
+
+        with Archive.Archive(self.file) as archive:
+            self.assertEqual(archive.pages, [1, 5, 9])
+            self.assertEqual(archive.params.database_size, self.sensor.database_size)
+
+        self.session.models.empty_database()
+        self.assertEqual(Archive.import_database(self.session, self.file), 3)
+        self.assertEqual(self.sensor.templates, templates)
+
+    def test_failed_export(self):
+        read_model = self.session.models.read_model
+
+        calls = []
+
+        def failing(buffer_id):
+            # Second template is lost
+            calls.append(buffer_id)
+            if len(calls) == 2:
+                raise Errors.ReadError("Zero bytes read. Check your sensor connection")
+            return read_model(buffer_id)
+
+        self.session.models.read_model = failing
+        with self.assertRaises(Errors.ReadError):
+            Archive.export_database(self.session, self.file)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_failed_export_keeps_old_archive(self):
+        Archive.export_database(self.session, self.file)
+        with open(self.file, "rb") as f:
+            data = f.read()
+
+        self.session.models.read_model = lambda buffer_id: b""
+        with self.assertRaises(ValueError):
+            Archive.export_database(self.session, self.file)
+        with open(self.file, "rb") as f:
+            self.assertEqual(f.read(), data)
+        self.assertEqual(os.listdir(self.directory), ["database.arc"])
+
+    def test_damaged_index(self):
+        Archive.export_database(self.session, self.file)
+        with open(self.file, "r+b") as f:
+            # Second index entry gets the page id of the first one
+            f.seek(Archive._header.size + Archive._index_entry.size)
+            f.write(struct.pack("<H", 1))
+
+        with self.assertRaises(ValueError):
+            Archive.Archive(self.file)
+
+    def test_truncated(self):
+        Archive.export_database(self.session, self.file)
+        with open(self.file, "r+b") as f:
+            f.truncate(os.path.getsize(self.file) - 1)
+
+        with self.assertRaises(ValueError):
+            Archive.Archive(self.file)
+
+
+if __name__ == '__main__':
+    unittest.main()
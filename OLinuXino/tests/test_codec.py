@@ -0,0 +1,79 @@
+import unittest
+
+import Codec
+
+ADDRESS = 0xffffffff
+
+
+def frames(*packets):
+    encoder = Codec.FrameEncoder(ADDRESS)
+    return [bytes(encoder.encode(packet_type, data)) for packet_type, data in packets]
+
+
+class FrameDecoderTest(unittest.TestCase):
+
+    def test_split_feed(self):
+        frame, = frames((0x07, b"\x00\x01\x02"))
+        decoder = Codec.FrameDecoder()
+        for i in range(len(frame)):
+            self.assertIsNone(decoder.next_frame())
+            decoder.feed(frame[i:i + 1])
+        self.assertEqual(decoder.next_frame(), (ADDRESS, 0x07, b"\x00\x01\x02"))
+        self.assertEqual(decoder.pending, 0)
+
+    def test_garbage_before_frame(self):
+        frame, = frames((0x07, b"\x00"))
+        decoder = Codec.FrameDecoder()
+        decoder.feed(b"\x12\x34\xef" + frame)
+        self.assertEqual(decoder.next_frame(), (ADDRESS, 0x07, b"\x00"))
+        self.assertEqual(decoder.discarded, 3)
+
+    def test_resync_after_bad_checksum(self):
+        first, second = frames((0x02, b"abcd"), (0x08, b"efgh"))
+        first = bytearray(first)
+        first[10] ^= 0x01
+        decoder = Codec.FrameDecoder()
+        decoder.feed(bytes(first) + second)
+        self.assertEqual(list(decoder), [(ADDRESS, 0x08, b"efgh")])
+        self.assertEqual(decoder.checksum_errors, 1)
+
+    def test_resync_after_impossible_length(self):
+        frame, = frames((0x07, b"\x00"))
+        decoder = Codec.FrameDecoder()
+        decoder.feed(Codec.START_CODE + b"\xff\xff\xff\xff\x02\xff\xff" + frame)
+        self.assertEqual(list(decoder), [(ADDRESS, 0x07, b"\x00")])
+        self.assertEqual(decoder.checksum_errors, 0)
+        self.assertGreater(decoder.discarded, 0)
+
+    def test_keep_damaged(self):
+        first, second, last = frames((0x02, b"abcd"), (0x02, b"efgh"), (0x08, b"ijkl"))
+        second = bytearray(second)
+        second[10] ^= 0x01
+        last = bytearray(last)
+        last[-1] ^= 0x01
+        decoder = Codec.FrameDecoder()
+        decoder.keep_damaged = True
+
+        # The end of damaged frame is confirmed only by the next start code
+        decoder.feed(first + second)
+        self.assertEqual(decoder.next_frame(), (ADDRESS, 0x02, b"abcd"))
+        self.assertIsNone(decoder.next_frame())
+
+        decoder.feed(last)
+        self.assertEqual(list(decoder), [(ADDRESS, 0x02, None), (ADDRESS, 0x08, None)])
+        self.assertEqual(decoder.damaged, 2)
+        self.assertEqual(decoder.discarded, 0)
+
+    def test_damaged_with_wrong_length_is_skipped(self):
+        first, second = frames((0x02, b"abcd"), (0x08, b"efgh"))
+        first = bytearray(first)
+        first[8] += 1
+        decoder = Codec.FrameDecoder()
+        decoder.keep_damaged = True
+        decoder.feed(bytes(first) + second)
+        self.assertEqual(list(decoder), [(ADDRESS, 0x08, b"efgh")])
+        self.assertEqual(decoder.damaged, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import time
+import unittest
+
+import Controller
+import Simulator
+
+
+class ControllerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sensors = [Simulator.VirtualSensor(wire_delay=False, latency_scale=0) for _ in range(3)]
+        self.servers = [Simulator.TcpServer(sensor).start() for sensor in self.sensors]
+        self.ports = [server.url for server in self.servers]
+        self.controller = Controller.Controller(self.ports)
+
+    def tearDown(self):
+        self.controller.close()
+        for server in self.servers:
+            server.stop()
+
+    def test_fan_out(self):
+        self.sensors[1].enroll(3, 1)
+        results = self.controller.get_model_count()
+        self.assertEqual([results[port].value for port in self.ports], [0, 1, 0])
+        self.assertTrue(all(result.ok for result in results.values()))
+
+    def test_dead_port(self):
+        # Server closes the connection of the second sensor
+        self.servers[1].stop()
+        time.sleep(0.3)
+
+        results = self.controller.get_model_count()
+        self.assertEqual(list(results), self.ports)
+        self.assertTrue(results[self.ports[0]].ok)
+        self.assertFalse(results[self.ports[1]].ok)
+        self.assertIsNotNone(results[self.ports[1]].error)
+        self.assertTrue(results[self.ports[2]].ok)
+
+        results = self.controller.read_system_params()
+        self.assertEqual(results[self.ports[0]].value.database_size, self.sensors[0].database_size)
+        self.assertFalse(results[self.ports[1]].ok)
+
+    def test_sharded_search(self):
+        probe = Simulator.VirtualSensor.template_for(7)
+        self.sensors[2].enroll(20, 7)
+        shards = [Controller.Shard(port, 0, 100) for port in self.ports]
+
+        best, results = self.controller.sharded_search(probe, shards)
+        self.assertEqual((best.port, best.page), (self.ports[2], 20))
+        self.assertTrue(all(result.ok for result in results.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+import Occupancy
+import Session
+import Simulator
+
+
+class OccupancyMapTest(unittest.TestCase):
+
+    def test_next_free(self):
+        occupancy = Occupancy.OccupancyMap(20)
+        occupancy.mark(0, 10)
+        self.assertEqual(occupancy.next_free(), 10)
+        occupancy.mark(10)
+        self.assertEqual(occupancy.next_free(), 11)
+        occupancy.mark(3, 1, used=False)
+        self.assertEqual(occupancy.next_free(), 3)
+        self.assertEqual(occupancy.next_free(4), 11)
+
+    def test_full(self):
+        occupancy = Occupancy.OccupancyMap(13)
+        occupancy.mark(0, None)
+        self.assertEqual(len(occupancy), 13)
+        self.assertIsNone(occupancy.next_free())
+
+    def test_bitmap_layout(self):
+        occupancy = Occupancy.OccupancyMap(12, b"\x05\xff")
+        self.assertEqual(list(occupancy), [0, 2, 8, 9, 10, 11])
+        self.assertEqual(occupancy.ranges(), [(0, 1), (2, 1), (8, 4)])
+
+    def test_mark_range(self):
+        occupancy = Occupancy.OccupancyMap(10)
+        with self.assertRaises(ValueError):
+            occupancy.mark(-1)
+        with self.assertRaises(ValueError):
+            occupancy.mark(8, 3)
+        self.assertEqual(len(occupancy), 0)
+
+
+class SessionOccupancyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sensor = Simulator.VirtualSensor(database_size=300, wire_delay=False, latency_scale=0)
+        self.sensor.enroll(5, 1)
+        self.server = Simulator.PtyServer(self.sensor).start()
+        self.session = Session.Session(self.server.url)
+
+    def tearDown(self):
+        self.session.close()
+        self.server.stop()
+
+    def test_store_free(self):
+        self.session.models.generate_model()
+        self.session.models.generate_characteristics(1)
+        self.assertEqual(list(self.session.occupancy()), [5])
+        self.assertEqual(self.session.models.store_free(1), 0)
+        self.assertEqual(self.session.models.store_free(1), 1)
+        self.assertEqual(sorted(self.sensor.templates), [0, 1, 5])
+        self.assertEqual(list(self.session.occupancy()), [0, 1, 5])
+
+    def test_mark_pages_range(self):
+        occupancy = self.session.occupancy()
+        with self.assertRaises(ValueError):
+            self.session.mark_pages(-1, 1, True)
+        self.assertIs(self.session.occupancy(), occupancy)
+
+        self.session.mark_pages(10, None, True)
+        self.assertEqual(len(self.session.occupancy()), 291)
+
+        # Pages past the map mean it was read with wrong size
+        self.session.mark_pages(299, 2, True)
+        self.assertIsNot(self.session.occupancy(), occupancy)
+        self.assertEqual(list(self.session.occupancy()), [5])
+
+
+if __name__ == '__main__':
+    unittest.main()
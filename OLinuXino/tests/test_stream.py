@@ -0,0 +1,88 @@
+import unittest
+
+import Errors
+import Finger
+import Retry
+import Session
+import Simulator
+import StatusCodes
+
+
+class NoisySensor(Simulator.VirtualSensor):
+
+    def __init__(self, damage, **kwargs):
+
+        """
+        Virtual sensor corrupting chosen data frames of the uploads
+
+        :param damage: Dictionary (upload number, frame number) -> byte offset in the frame to corrupt
+        """
+        super().__init__(wire_delay=False, latency_scale=0, **kwargs)
+        self.damage = damage
+        self.uploads = 0
+        self._frame = 0
+
+    def _up_image(self, args):
+        self.uploads += 1
+        self._frame = 0
+        return super()._up_image(args)
+
+    def line_noise(self, frame):
+        if frame[6] not in (StatusCodes.PacketType.Data.value, StatusCodes.PacketType.EndData.value):
+            return frame
+        offset = self.damage.get((self.uploads, self._frame))
+        self._frame += 1
+        if offset is None:
+            return frame
+        frame = bytearray(frame)
+        frame[offset] ^= 0x10
+        return bytes(frame)
+
+
+class ReadStreamTest(unittest.TestCase):
+
+    def upload(self, damage, retry=None):
+        sensor = NoisySensor(damage)
+        server = Simulator.PtyServer(sensor).start()
+        self.addCleanup(server.stop)
+        session = Session.Session(server.url)
+        self.addCleanup(session.close)
+        if retry is not None:
+            session.com.retry = retry
+
+        self.assertTrue(session.models.capture())
+        received = []
+        image = session.image.read_image(callback=lambda offset, data: received.append(offset))
+
+        self.assertEqual(bytes(image), Simulator.VirtualSensor.image_for(sensor.finger))
+        self.assertEqual(sorted(received), list(range(0, Finger.IMAGE_SIZE, sensor.packet_size)))
+        return sensor, session
+
+    def test_clean(self):
+        sensor, session = self.upload({})
+        self.assertEqual(sensor.uploads, 1)
+        self.assertEqual(sum(session.com.metrics.restarts.values()), 0)
+
+    def test_damaged_data(self):
+        # Checksum errors keep the frame position, the second pass fills the gaps
+        sensor, session = self.upload({(1, 3): 20, (1, 50): 100, (1, 143): 30})
+        self.assertEqual(sensor.uploads, 2)
+        self.assertEqual(session.com.decoder.damaged, 3)
+
+    def test_damaged_prefix(self):
+        # Damage in frames received before doesn't stop the next pass
+        sensor, session = self.upload({(1, 80): 20, (2, 3): 20, (2, 10): 20})
+        self.assertEqual(sensor.uploads, 2)
+
+    def test_lost_start_code(self):
+        # Position unknown after the frame, the rest comes from the next pass
+        sensor, session = self.upload({(1, 40): 0, (2, 90): 1})
+        self.assertEqual(sensor.uploads, 3)
+
+    def test_no_retry(self):
+        with self.assertRaises(Errors.ReadError):
+            self.upload({(1, 3): 20}, retry=Retry.NEVER)
+
+
+if __name__ == '__main__':
+    unittest.main()